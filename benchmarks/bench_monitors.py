@@ -0,0 +1,292 @@
+"""
+通过本地模拟交易所离线压测 TickerSpreadMonitor 和 OrderbookSpreadMonitor，
+统计持续吞吐、单次更新处理耗时分位数、top() 耗时、界面快照发布耗时和每个交易对的内存占用
+
+$ python -m benchmarks.bench_monitors --panel ticker --symbols 2000 --rate 0 --duration 10
+"""
+
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+
+import click
+
+from monitors.fake_exchange import register_fake_exchange
+from monitors.snapshot import SnapshotBuffer
+from monitors.spread import TickerSpreadMonitor, OrderbookSpreadMonitor
+
+MONITORS = {
+    "ticker": TickerSpreadMonitor,
+    "orderbook": OrderbookSpreadMonitor,
+}
+
+
+def percentiles(samples, points=(50, 90, 99, 99.9)):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        f"p{point:g}": samples[min(len(samples) - 1, int(len(samples) * point / 100))]
+        for point in points
+    }
+
+
+class LatencyProbe:
+    """
+    包装监控方法，记录每次调用的耗时（纳秒）
+    :param limit: 最多保留的样本数
+    """
+
+    def __init__(self, limit=1_000_000):
+        self.samples = []
+        self.limit = limit
+        self.calls = 0
+
+    def wrap(self, func):
+        samples, limit = self.samples, self.limit
+        perf_counter_ns = time.perf_counter_ns
+
+        def wrapper(*args):
+            start = perf_counter_ns()
+            result = func(*args)
+            if len(samples) < limit:
+                samples.append(perf_counter_ns() - start)
+            self.calls += 1
+            return result
+
+        return wrapper
+
+
+def create_monitor(panel, markets, **params):
+    return MONITORS[panel](*markets, **params)
+
+
+async def run_throughput(
+    panel, markets, duration, warmup, snapshot_interval=0, prefetch=0, **params
+):
+    """
+    :param snapshot_interval: 同时按该间隔发布界面快照（秒），0 为不发布
+    :param prefetch: 快照预取的排名行数
+    """
+    monitor = create_monitor(panel, markets, **params)
+    process_name = "process_ticker" if panel == "ticker" else "process_order_book"
+    process = LatencyProbe()
+    recompute = LatencyProbe()
+    publish = LatencyProbe()
+    snapshots = None
+
+    await monitor.load_markets()
+    monitor.start()
+    try:
+        await asyncio.sleep(warmup)
+        setattr(monitor, process_name, process.wrap(getattr(monitor, process_name)))
+        if monitor.conflator is not None:
+            monitor.conflator.recompute = recompute.wrap(monitor.conflator.recompute)
+        if snapshot_interval:
+            snapshots = SnapshotBuffer(monitor, snapshot_interval, prefetch=prefetch)
+            # 首次发布复制全部行，单独计时，之后只复制变化的行
+            start = time.perf_counter_ns()
+            snapshots.publish()
+            first_publish = time.perf_counter_ns() - start
+            first_copied = snapshots.copied
+            snapshots.publish = publish.wrap(snapshots.publish)
+            await asyncio.sleep(snapshot_interval)
+            snapshots.start()
+
+        started = time.perf_counter()
+        await asyncio.sleep(duration)
+        elapsed = time.perf_counter() - started
+    finally:
+        if snapshots is not None:
+            await snapshots.close()
+        await monitor.stop()
+
+    result = {
+        "pairs": len(monitor.routing),
+        "updates_per_second": process.calls / elapsed,
+        "process_ns": percentiles(process.samples),
+    }
+    if recompute.calls:
+        result["recompute_ns"] = percentiles(recompute.samples)
+        result["conflation"] = monitor.conflator.stats()
+    if publish.calls:
+        result["snapshot"] = {
+            "rows": len(snapshots.front),
+            "first_ns": first_publish,
+            "publish_ns": percentiles(publish.samples, points=(50, 99)),
+            "copied_per_publish": (snapshots.copied - first_copied) / publish.calls,
+        }
+    return result, monitor
+
+
+def measure_top(monitor, top_n, repeat=1000):
+    result = {}
+    for key in monitor.rank_keys:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            monitor.top(top_n, key=key)
+            samples.append(time.perf_counter_ns() - start)
+        result[key] = percentiles(samples, points=(50, 99))
+    return result
+
+
+async def measure_memory(panel, markets, **params):
+    """
+    每个交易对两侧各推送一次行情后，统计路由表、交易对数据和排序索引占用的内存，
+    不含交易所自身的市场目录
+    """
+    monitor = create_monitor(panel, markets, **params)
+    await monitor.exchange_a.load_markets()
+    await monitor.exchange_b.load_markets()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        await monitor.load_markets()
+
+        for exchange, index in ((monitor.exchange_a, "a"), (monitor.exchange_b, "b")):
+            for symbol in monitor.routes[index]:
+                if panel == "ticker":
+                    ticker = (await exchange.watch_tickers([symbol]))[symbol]
+                    monitor.process_ticker(symbol, ticker, index, 0)
+                else:
+                    order_book = await exchange.watch_order_book_for_symbols([symbol])
+                    monitor.process_order_book(order_book, index, 0)
+        monitor.flush()
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    await monitor.stop()
+    return used / max(len(monitor.routing), 1)
+
+
+def print_report(panel, result):
+    print(f"[{panel}] pairs={result['pairs']}")
+    print(f"  sustained updates/s: {result['updates_per_second']:.0f}")
+    print(
+        "  process latency (us): "
+        + " ".join(f"{k}={v / 1e3:.2f}" for k, v in result["process_ns"].items())
+    )
+    if "recompute_ns" in result:
+        print(
+            "  recompute latency (us): "
+            + " ".join(f"{k}={v / 1e3:.2f}" for k, v in result["recompute_ns"].items())
+        )
+        print(f"  conflation: {result['conflation']}")
+    for key, stats in result["top_ns"].items():
+        print(
+            f"  top({result['top_n']}, {key}) (us): "
+            + " ".join(f"{k}={v / 1e3:.2f}" for k, v in stats.items())
+        )
+    if "snapshot" in result:
+        snapshot = result["snapshot"]
+        print(
+            f"  snapshot publish (us): first={snapshot['first_ns'] / 1e3:.2f} "
+            + " ".join(f"{k}={v / 1e3:.2f}" for k, v in snapshot["publish_ns"].items())
+            + f" rows={snapshot['rows']}"
+            + f" copied/publish={snapshot['copied_per_publish']:.0f}"
+        )
+    print(f"  memory per pair: {result['memory_per_pair']:.0f} bytes")
+
+
+@click.command()
+@click.option(
+    "--panel",
+    type=click.Choice(["ticker", "orderbook", "both"]),
+    default="both",
+    show_default=True,
+)
+@click.option("--symbols", "symbol_count", default=1000, show_default=True)
+@click.option(
+    "--rate",
+    type=float,
+    default=0,
+    show_default=True,
+    help="Updates per second per subscription batch, 0 for unthrottled",
+)
+@click.option("--burst", type=float, default=1, show_default=True)
+@click.option("--clock-skew", type=float, default=0, show_default=True, help="ms")
+@click.option("--duration", type=float, default=5, show_default=True, help="seconds")
+@click.option("--warmup", type=float, default=1, show_default=True, help="seconds")
+@click.option("--topn", "top_n", default=20, show_default=True)
+@click.option(
+    "--backend",
+    type=click.Choice(["dict", "columnar"]),
+    default="dict",
+    show_default=True,
+)
+@click.option(
+    "--conflation",
+    default=None,
+    help="Conflation mode passed to the monitor: tick, manual or a window in ms",
+)
+@click.option(
+    "--feed-workers",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Worker processes per market for the throughput run",
+)
+@click.option(
+    "--snapshot-interval",
+    type=float,
+    default=0.5,
+    show_default=True,
+    help="Publish TUI snapshots at this interval during the run, 0 to disable",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print results as JSON")
+def main(
+    panel,
+    symbol_count,
+    rate,
+    burst,
+    clock_skew,
+    duration,
+    warmup,
+    top_n,
+    backend,
+    conflation,
+    feed_workers,
+    snapshot_interval,
+    as_json,
+):
+    register_fake_exchange(
+        "fake", symbol_count=symbol_count, rate=rate, burst=burst, clock_skew=clock_skew
+    )
+    markets = ("fake.spot", "fake.swap.linear")
+    if conflation not in (None, "tick", "manual"):
+        conflation = float(conflation)
+    params = {"backend": backend, "conflation": conflation}
+
+    results = {}
+    for name in ("ticker", "orderbook") if panel == "both" else (panel,):
+        result, monitor = asyncio.run(
+            run_throughput(
+                name,
+                markets,
+                duration,
+                warmup,
+                snapshot_interval=snapshot_interval,
+                prefetch=top_n * 5,
+                feed_workers=feed_workers,
+                **params,
+            )
+        )
+        result["top_n"] = top_n
+        result["top_ns"] = measure_top(monitor, top_n)
+        result["memory_per_pair"] = asyncio.run(measure_memory(name, markets, **params))
+        results[name] = result
+
+    if as_json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print_report(name, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+对比字符串路由（原实现）与编译后整数路由的单次行情处理开销
+
+$ python -m benchmarks.bench_routing --symbols 2000 --ticks 200000
+"""
+
+import asyncio
+import random
+import time
+
+import click
+
+from monitors.spread import TickerSpreadMonitor
+
+
+class LegacyTickerSpreadMonitor(TickerSpreadMonitor):
+    """按交易对名称路由的原实现，仅用于基准对比"""
+
+    async def process_ticker(self, symbol, ticker, index, time_diff, now=None):
+        if symbol not in self.symbol_map[index]:
+            return
+
+        pair_map = self.symbol_map[index][symbol]
+        pair_names = pair_map["pair_names"]
+        for pair_name in pair_names:
+            if pair_name not in self.pair_data:
+                self.pair_data[pair_name] = {
+                    "pair_name": pair_name,
+                    "spread": 0,
+                    "spread_pct": 0,
+                    "price_a": 0,
+                    "price_b": 0,
+                    "elapsed_time_a": 0,
+                    "elapsed_time_b": 0,
+                }
+            self.pair_data[pair_name][f"price_{index}"] = ticker["last"]
+            self.pair_data[pair_name][f"elapsed_time_{index}"] = time.time() * 1e3 - (
+                ticker["timestamp"] + time_diff
+            )
+
+            await self.legacy_calculate_spread(pair_name)
+
+    async def legacy_calculate_spread(self, pair_key):
+        data = self.pair_data[pair_key]
+        if data["price_a"] and data["price_b"]:
+            min_price = min(data["price_a"], data["price_b"])
+            spread = abs(data["price_a"] - data["price_b"])
+            data["spread"] = spread
+            data["spread_pct"] = spread / min_price
+        self._update_rankings(pair_key, data)
+
+
+def make_pairs(symbol_count, derivatives):
+    return [
+        {
+            "base": f"C{i}",
+            "quote": "USDT",
+            "symbols_a": [f"C{i}/USDT"],
+            "symbols_b": [f"C{i}/USDT:USDT"]
+            + [f"C{i}/USDT:USDT-{d}" for d in range(derivatives)],
+        }
+        for i in range(symbol_count)
+    ]
+
+
+def make_ticks(symbol_map, tick_count, seed=0):
+    rng = random.Random(seed)
+    symbols = [(index, symbol) for index in ("a", "b") for symbol in symbol_map[index]]
+    now = time.time() * 1e3
+    return [
+        (*rng.choice(symbols), {"last": rng.uniform(1, 2), "timestamp": now})
+        for _ in range(tick_count)
+    ]
+
+
+async def run(monitor_cls, pairs, ticks, **params):
+    monitor = monitor_cls("binance.spot", "okx.swap.linear", **params)
+    try:
+        monitor.symbol_map = monitor._build_symbol_map(pairs)
+        monitor._compile_routing()
+        process_ticker = monitor.process_ticker
+
+        start = time.perf_counter()
+        if asyncio.iscoroutinefunction(process_ticker):
+            for index, symbol, ticker in ticks:
+                await process_ticker(symbol, ticker, index, 0)
+        else:
+            for index, symbol, ticker in ticks:
+                process_ticker(symbol, ticker, index, 0)
+        monitor.flush()
+        return (time.perf_counter() - start) / len(ticks)
+    finally:
+        await monitor.exchange_a.close()
+        await monitor.exchange_b.close()
+
+
+@click.command()
+@click.option("--symbols", "symbol_count", default=2000, show_default=True)
+@click.option("--derivatives", default=0, show_default=True, help="Extra B symbols")
+@click.option("--ticks", "tick_count", default=200000, show_default=True)
+@click.option("--columnar", is_flag=True, help="Also run the columnar backend")
+@click.option(
+    "--conflation", is_flag=True, help="Also run with manual conflation (one flush)"
+)
+@click.option(
+    "--no-ranking", is_flag=True, help="Disable ranking indexes to isolate routing"
+)
+def main(symbol_count, derivatives, tick_count, columnar, conflation, no_ranking):
+    pairs = make_pairs(symbol_count, derivatives)
+    symbol_map = TickerSpreadMonitor._build_symbol_map(None, pairs)
+    ticks = make_ticks(symbol_map, tick_count)
+
+    params = {"rank_keys": ()} if no_ranking else {}
+    cases = [
+        ("legacy", LegacyTickerSpreadMonitor, params),
+        ("compiled", TickerSpreadMonitor, params),
+    ]
+    if conflation:
+        cases.append(
+            ("conflated", TickerSpreadMonitor, dict(params, conflation="manual"))
+        )
+    if columnar:
+        cases.append(("columnar", TickerSpreadMonitor, {"backend": "columnar"}))
+
+    baseline = None
+    for name, monitor_cls, params in cases:
+        cost = asyncio.run(run(monitor_cls, pairs, ticks, **params))
+        baseline = baseline or cost
+        print(f"{name:<10} {cost * 1e9:10.1f} ns/tick  x{baseline / cost:.2f}")
+
+
+if __name__ == "__main__":
+    main()
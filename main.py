@@ -1,210 +1,641 @@
+import time
 import asyncio
 import click
 
 from textual.app import App, ComposeResult
-from textual.widgets import DataTable, Header, Footer, Static, Log
+from textual.widgets import (
+    DataTable,
+    Input,
+    Header,
+    Footer,
+    Static,
+    Log,
+    TabbedContent,
+    TabPane,
+)
 from textual.containers import HorizontalScroll
 from monitors.spread import TickerSpreadMonitor, OrderbookSpreadMonitor
+from monitors.matrix import SpreadMatrixMonitor
+from monitors.market_cache import MarketCache
+from monitors.fake_exchange import register_fake_exchange
+from monitors.recorder import StreamRecorder, StreamReplayer
+from monitors.publisher import SpreadPublisher, publish_stdout, serve_http
+from monitors.hub import ExchangeHub
+from monitors.batching import BatchPlanner
+from monitors.metrics import Metrics, serve_metrics
+from monitors.rolling import RollingStats
+from monitors.alerts import AlertEngine, CallbackSink, parse_rule, parse_sink
+from monitors.history import FORMATS as HISTORY_FORMATS, SpreadHistory
+from monitors.profiling import Profiler
+from monitors.supervisor import Supervisor
+from monitors.snapshot import SnapshotBuffer
+from monitors.quotes import parse_quote_rates
 
+MONITORS = {
+    "ticker": TickerSpreadMonitor,
+    "orderbook": OrderbookSpreadMonitor,
+}
+SORT_KEYS = {name: monitor_cls.rank_keys for name, monitor_cls in MONITORS.items()}
+DEPTH_SORT_KEYS = OrderbookSpreadMonitor.depth_rank_keys
+ROLLING_SORT_KEYS = RollingStats.rank_keys
+NET_SORT_KEYS = {
+    name: monitor_cls.cost_rank_keys for name, monitor_cls in MONITORS.items()
+}
+MATRIX_SORT_KEYS = SpreadMatrixMonitor.rank_keys
 
-class TickerSpreadPanel(Static):
-    def compose(self) -> ComposeResult:
-        yield DataTable()
 
-    def _add_or_update_row(self, table: DataTable, index, row):
-        row_key = str(index)
-        if index < table.row_count:
-            table.update_cell(row_key, self.column_keys[0], index)
-            table.update_cell(row_key, self.column_keys[1], row["pair_name"])
-            table.update_cell(
-                row_key, self.column_keys[2], f"{(row['spread_pct'] * 100):4f}%"
-            )
-            table.update_cell(row_key, self.column_keys[3], str(row["spread"]))
-            table.update_cell(row_key, self.column_keys[4], str(row["price_a"]))
-            table.update_cell(row_key, self.column_keys[5], str(row["price_b"]))
-            table.update_cell(
-                row_key, self.column_keys[6], f"{row['elapsed_time_a']:2f}ms"
-            )
-            table.update_cell(
-                row_key, self.column_keys[7], f"{row['elapsed_time_b']:2f}ms"
-            )
-        else:
-            table.add_row(
-                index,
-                row["pair_name"],
-                f"{(row['spread_pct'] * 100):4f}%",
-                str(row["spread"]),
-                str(row["price_a"]),
-                str(row["price_b"]),
-                f"{row['elapsed_time_a']:2f}ms",
-                f"{row['elapsed_time_b']:2f}ms",
-                key=row_key,
-            )
+PANEL_PARAMS = (
+    "top_n",
+    "sort_by",
+    "refresh_interval",
+    "metrics_port",
+    "metrics_footer",
+    "profiler",
+    "frame_budget",
+)
 
-    async def load_data(self):
-        top_n = self.app.monitor_params["top_n"]
-        params = self.app.monitor_params.copy()
-        del params["top_n"]
 
-        monitor = TickerSpreadMonitor(**params)
+async def start_monitor(monitor, replayer=None, profiler=None):
+    """启动实时行情，或在回放模式下从录制日志驱动监控，返回回放任务"""
+    if replayer is None:
+        await monitor.load_markets()
+        if profiler is not None:
+            profiler.instrument(monitor)
+        monitor.start()
+        return None
+    replayer.load_routing(monitor)
+    if profiler is not None:
+        profiler.instrument(monitor)
+    return asyncio.create_task(replayer.run(monitor))
 
-        table = self.query_one(DataTable)
-        try:
-            await monitor.load_markets()
-            monitor.start()
-            while True:
-                await asyncio.sleep(1)
-                data = monitor.top(top_n)
-                for i, row in enumerate(data):
-                    self._add_or_update_row(table, i, row)
-                while table.row_count > len(data):
-                    table.remove_row(str(table.row_count - 1))
-        except BaseException:
-            await monitor.stop()
 
-    async def on_mount(self):
-        self.column_keys = self.query_one(DataTable).add_columns(
-            "序号",
-            "交易对",
-            "价差（%）",
-            "价差",
-            "最新价（A）",
-            "最新价（B）",
-            "实时（A）",
-            "实时（B）",
-        )
+def _pct(value):
+    return f"{(value * 100):4f}%"
+
+
+def _ms(value):
+    return f"{value:2f}ms"
+
+
+def _level(price, volume):
+    return f"{price}/{volume}"
+
+
+def _z(value):
+    return f"{value:.2f}"
 
-        asyncio.create_task(self.load_data())
 
+class SpreadPanel(Static):
+    """
+    价差面板基类：从监控发布的快照中取当前页渲染，可在全部交易对中翻页、排序和筛选，
+    表格只保留当前页的行。保留上一帧每行的原始值，只格式化和写入变化的单元格，
+    排名变化时按序号列移动行而不重写整行。渲染超出帧预算时跳过之后的帧
+    """
+
+    BINDINGS = [
+        ("n", "next_page", "下一页"),
+        ("p", "prev_page", "上一页"),
+        ("s", "cycle_sort", "排序字段"),
+        ("r", "reverse_sort", "升/降序"),
+        ("/", "filter", "筛选"),
+    ]
+
+    monitor_cls = None
+    # (列名, 行字段, 格式化函数)，序号列固定在第一列
+    columns = ()
+    # 净价差列插入在 net_position 之前
+    net_columns = ()
+    net_position = 0
+    rolling_columns = (
+        (
+            "均值/标准差",
+            ("spread_mean", "spread_std"),
+            lambda m, s: f"{_pct(m)}/{_pct(s)}",
+        ),
+        (
+            "最小/最大",
+            ("spread_min", "spread_max"),
+            lambda lo, hi: f"{_pct(lo)}/{_pct(hi)}",
+        ),
+        ("EWMA", ("spread_ewma",), _pct),
+        ("Z", ("spread_z",), _z),
+    )
+
+    def __init__(self, monitor_params, **kwargs):
+        super().__init__(**kwargs)
+        self.monitor_params = monitor_params
+        if monitor_params.get("fee_side"):
+            self.columns = (
+                self.columns[: self.net_position]
+                + self.net_columns
+                + self.columns[self.net_position :]
+            )
+        if monitor_params.get("rolling_size") or monitor_params.get("rolling_seconds"):
+            self.columns = self.columns + self.rolling_columns
 
-class OrderbookSpreadPanel(Static):
     def compose(self) -> ComposeResult:
         yield DataTable()
+        yield Input(placeholder="筛选交易对，回车确认，留空清除")
 
-    def _add_or_update_row(self, table: DataTable, index, row):
-        row_key = str(index)
-        if index < table.row_count:
-            table.update_cell(row_key, self.column_keys[0], index)
-            table.update_cell(row_key, self.column_keys[1], row["pair_name"])
-            table.update_cell(
-                row_key, self.column_keys[2], f"{(row['spread_pct'] * 100):4f}%"
-            )
-            table.update_cell(
-                row_key,
-                self.column_keys[3],
-                f"{(row['buy_a_sell_b_spread_pct'] * 100):4f}%",
-            )
-            table.update_cell(
-                row_key,
-                self.column_keys[4],
-                f"{(row['buy_b_sell_a_spread_pct'] * 100):4f}%",
-            )
-            table.update_cell(
-                row_key,
-                self.column_keys[5],
-                f"{row['bid_price_a']}/{row['bid_volume_a']}",
-            )
-            table.update_cell(
-                row_key,
-                self.column_keys[6],
-                f"{row['ask_price_a']}/{row['ask_volume_a']}",
-            )
-            table.update_cell(
-                row_key,
-                self.column_keys[7],
-                f"{row['bid_price_b']}/{row['bid_volume_b']}",
-            )
-            table.update_cell(
-                row_key,
-                self.column_keys[8],
-                f"{row['ask_price_b']}/{row['ask_volume_b']}",
-            )
-            table.update_cell(
-                row_key,
-                self.column_keys[9],
-                f"{row['elapsed_time_a']:2f}ms/{row['elapsed_time_b']:2f}ms",
-            )
-        else:
-            table.add_row(
-                index,
-                row["pair_name"],
-                f"{row['spread_pct'] * 100:4f}%",
-                f"{(row['buy_a_sell_b_spread_pct'] * 100):4f}%",
-                f"{(row['buy_b_sell_a_spread_pct'] * 100):4f}%",
-                f"{row['bid_price_a']}/{row['bid_volume_a']}",
-                f"{row['ask_price_a']}/{row['ask_volume_a']}",
-                f"{row['bid_price_b']}/{row['bid_volume_b']}",
-                f"{row['ask_price_b']}/{row['ask_volume_b']}",
-                f"{row['elapsed_time_a']:2f}ms/{row['elapsed_time_b']:2f}ms",
-                key=row_key,
+    def render_rows(self, table: DataTable, data, offset=0):
+        """
+        将当前页数据差量写入表格，行以交易对为键
+        :param offset: 当前页第一行的排名
+        :return: 本帧统计 cells/added/removed/moved
+        """
+        rendered = self.rendered
+        stats = {"cells": 0, "added": 0, "removed": 0, "moved": 0}
+        order = []
+        for rank, row in enumerate(data, offset):
+            pair_name = row["pair_name"]
+            order.append(pair_name)
+            values = [rank]
+            values.extend(
+                tuple(row[f] for f in fields) for _, fields, _ in self.columns
             )
+            last = rendered.get(pair_name)
+            if last is None:
+                table.add_row(
+                    rank,
+                    *(
+                        fmt(*value)
+                        for (_, _, fmt), value in zip(self.columns, values[1:])
+                    ),
+                    key=pair_name,
+                )
+                stats["cells"] += len(values)
+                stats["added"] += 1
+            else:
+                if last[0] != rank:
+                    table.update_cell(pair_name, self.column_keys[0], rank)
+                    stats["cells"] += 1
+                    stats["moved"] += 1
+                for i, (_, _, fmt) in enumerate(self.columns, 1):
+                    if values[i] != last[i]:
+                        table.update_cell(
+                            pair_name, self.column_keys[i], fmt(*values[i])
+                        )
+                        stats["cells"] += 1
+            rendered[pair_name] = values
+
+        if len(rendered) > len(order):
+            current = set(order)
+            for pair_name in [p for p in rendered if p not in current]:
+                table.remove_row(pair_name)
+                del rendered[pair_name]
+                stats["removed"] += 1
+        if order != self.order:
+            table.sort(self.column_keys[0])
+            self.order = order
+        return stats
+
+    def _view_changed(self):
+        self.view_dirty = True
+        self.view_event.set()
+
+    def action_next_page(self):
+        page_size = self.monitor_params["top_n"]
+        if self.row_offset + page_size < self.row_total:
+            self.row_offset += page_size
+            self._view_changed()
+
+    def action_prev_page(self):
+        if self.row_offset:
+            self.row_offset = max(0, self.row_offset - self.monitor_params["top_n"])
+            self._view_changed()
+
+    def action_cycle_sort(self):
+        keys = self.monitor.rank_keys
+        self.sort_key = keys[(keys.index(self.sort_key) + 1) % len(keys)]
+        self.row_offset = 0
+        self._view_changed()
+
+    def action_reverse_sort(self):
+        self.descending = not self.descending
+        self.row_offset = 0
+        self._view_changed()
+
+    def action_filter(self):
+        box = self.query_one(Input)
+        box.display = True
+        box.focus()
+
+    def on_input_submitted(self, event: Input.Submitted):
+        self.filter_query = event.value.strip()
+        self.row_offset = 0
+        event.input.display = False
+        self.query_one(DataTable).focus()
+        self._view_changed()
+
+    async def _next_frame(self, interval):
+        """等待下一帧，翻页、排序或筛选时立即渲染"""
+        try:
+            await asyncio.wait_for(self.view_event.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        self.view_event.clear()
 
     async def load_data(self):
-        top_n = self.app.monitor_params["top_n"]
-        params = self.app.monitor_params.copy()
-        del params["top_n"]
+        top_n = self.monitor_params["top_n"]
+        refresh_interval = self.monitor_params["refresh_interval"]
+        budget = (self.monitor_params.get("frame_budget") or 0) / 1e3
+        params = {
+            key: value
+            for key, value in self.monitor_params.items()
+            if key not in PANEL_PARAMS
+        }
 
-        monitor = OrderbookSpreadMonitor(**params)
+        monitor = self.monitor = self.monitor_cls(**params)
+        # 默认排序的前 5 页从排名索引读取，之后的页和其他排序方式才对快照排序
+        snapshots = self.snapshots = SnapshotBuffer(
+            monitor, refresh_interval, prefetch=top_n * 5
+        )
+        profiler = self.monitor_params.get("profiler")
+        if profiler is not None:
+            profiler.patch(self, "render_rows")
+            profiler.patch(snapshots, "publish", "snapshot")
 
         table = self.query_one(DataTable)
+        last_seq = None
+        skip = 0
         try:
-            await monitor.load_markets()
-            monitor.start()
+            await self.app.start_monitor(monitor)
+            snapshots.start()
             while True:
-                await asyncio.sleep(1)
-                data = monitor.top(top_n)
-                for i, row in enumerate(data):
-                    self._add_or_update_row(table, i, row)
-                while table.row_count > len(data):
-                    table.remove_row(str(table.row_count - 1))
+                await self._next_frame(refresh_interval)
+                snapshot = snapshots.front
+                if snapshot is None or not self.app.is_active_panel(self):
+                    continue
+                if not self.view_dirty:
+                    if snapshot.seq == last_seq:
+                        continue
+                    if skip:
+                        # 上一帧超出预算，跳过快照更新带来的帧，操作触发的帧不跳过
+                        skip -= 1
+                        self.frames_skipped += 1
+                        continue
+                self.view_dirty = False
+                last_seq = snapshot.seq
+                snapshots.want(self.sort_key)
+                started = time.perf_counter()
+                self.row_total, data = snapshot.page(
+                    self.sort_key,
+                    self.descending,
+                    self.filter_query,
+                    self.row_offset,
+                    top_n,
+                )
+                if self.row_offset and self.row_offset >= self.row_total:
+                    # 筛选或交易对减少后当前页越界，回到最后一页
+                    self.row_offset = max(0, self.row_total - 1) // top_n * top_n
+                    self.row_total, data = snapshot.page(
+                        self.sort_key,
+                        self.descending,
+                        self.filter_query,
+                        self.row_offset,
+                        top_n,
+                    )
+                self.frame_stats = self.render_rows(table, data, self.row_offset)
+                elapsed = time.perf_counter() - started
+                if budget:
+                    skip = int(elapsed // budget)
+                if monitor.metrics is not None:
+                    monitor.metrics.observe("render_ms", elapsed * 1e3)
+                self.frames += 1
+                self.cells_written += self.frame_stats["cells"]
+                if data and "first_row" not in monitor.startup:
+                    self.app.notify(
+                        f"首行渲染耗时 {monitor.mark_first_row():.2f}s，"
+                        f"市场加载 {monitor.startup.get('load_markets', 0):.2f}s"
+                    )
+                sub_title = (
+                    f"{self.row_offset + bool(data)}-{self.row_offset + len(data)}/"
+                    f"{self.row_total} 行，按 {self.sort_key}"
+                    f"{'降序' if self.descending else '升序'}"
+                )
+                if self.filter_query:
+                    sub_title += f"，筛选 {self.filter_query}"
+                sub_title += (
+                    f"，写入 {self.frame_stats['cells']} 单元格/帧，"
+                    f"跳过 {self.frames_skipped} 帧"
+                )
+                if monitor.conflator is not None:
+                    stats = monitor.conflator.stats()
+                    sub_title += f"，合并更新 {stats['coalesced']}/{stats['updates']}"
+                self.app.sub_title = sub_title
         except BaseException:
+            await snapshots.close()
             await monitor.stop()
 
     async def on_mount(self):
+        self.rendered = {}
+        self.order = []
+        self.frames = 0
+        self.frames_skipped = 0
+        self.cells_written = 0
+        self.frame_stats = {}
+        self.row_offset = 0
+        self.row_total = 0
+        self.sort_key = self.monitor_params["sort_by"]
+        self.descending = True
+        self.filter_query = ""
+        self.view_dirty = False
+        self.view_event = asyncio.Event()
+        self.query_one(Input).display = False
         self.column_keys = self.query_one(DataTable).add_columns(
-            "序号",
-            "交易对",
-            "价差",
-            "买A卖B",
-            "买B卖A",
-            "买一价/量（A）",
-            "卖一价/量（A）",
-            "买一价/量（B）",
-            "卖一价/量（B）",
-            "实时（A/B）",
+            "序号", *(label for label, _, _ in self.columns)
         )
+
         asyncio.create_task(self.load_data())
 
 
+class TickerSpreadPanel(SpreadPanel):
+    monitor_cls = TickerSpreadMonitor
+    columns = (
+        ("交易对", ("pair_name",), str),
+        ("价差（%）", ("spread_pct",), _pct),
+        ("价差", ("spread",), str),
+        ("最新价（A）", ("price_a",), str),
+        ("最新价（B）", ("price_b",), str),
+        ("实时（A）", ("elapsed_time_a",), _ms),
+        ("实时（B）", ("elapsed_time_b",), _ms),
+    )
+    net_columns = (("净价差（%）", ("net_spread_pct",), _pct),)
+    net_position = 2
+
+
+class OrderbookSpreadPanel(SpreadPanel):
+    monitor_cls = OrderbookSpreadMonitor
+    columns = (
+        ("交易对", ("pair_name",), str),
+        ("价差", ("spread_pct",), _pct),
+        ("买A卖B", ("buy_a_sell_b_spread_pct",), _pct),
+        ("买B卖A", ("buy_b_sell_a_spread_pct",), _pct),
+        ("买一价/量（A）", ("bid_price_a", "bid_volume_a"), _level),
+        ("卖一价/量（A）", ("ask_price_a", "ask_volume_a"), _level),
+        ("买一价/量（B）", ("bid_price_b", "bid_volume_b"), _level),
+        ("卖一价/量（B）", ("ask_price_b", "ask_volume_b"), _level),
+        (
+            "实时（A/B）",
+            ("elapsed_time_a", "elapsed_time_b"),
+            lambda a, b: f"{a:2f}ms/{b:2f}ms",
+        ),
+    )
+    net_columns = (
+        ("净价差", ("net_spread_pct",), _pct),
+        ("净买A卖B", ("net_buy_a_sell_b_spread_pct",), _pct),
+        ("净买B卖A", ("net_buy_b_sell_a_spread_pct",), _pct),
+    )
+    net_position = 4
+    depth_columns = (
+        ("可成交买A卖B", ("exec_buy_a_sell_b_spread_pct",), _pct),
+        ("可成交买B卖A", ("exec_buy_b_sell_a_spread_pct",), _pct),
+        ("均价 买/卖（A）", ("vwap_bid_a", "vwap_ask_a"), _level),
+        ("均价 买/卖（B）", ("vwap_bid_b", "vwap_ask_b"), _level),
+    )
+
+    def __init__(self, monitor_params, **kwargs):
+        super().__init__(monitor_params, **kwargs)
+        if monitor_params.get("depth_notional") or monitor_params.get("depth_quantity"):
+            self.columns = self.columns[:4] + self.depth_columns + self.columns[4:]
+
+
+class MatrixSpreadPanel(SpreadPanel):
+    monitor_cls = SpreadMatrixMonitor
+    columns = (
+        ("资产", ("pair_name",), str),
+        ("价差（%）", ("spread_pct",), _pct),
+        ("价差", ("spread",), str),
+        ("买入市场", ("buy_venue",), str),
+        ("卖出市场", ("sell_venue",), str),
+        ("买入价", ("buy_price",), str),
+        ("卖出价", ("sell_price",), str),
+        ("报价市场数", ("venues",), str),
+        ("实时", ("elapsed_time",), _ms),
+    )
+    level_columns = (
+        ("买入价/量", ("buy_price", "buy_volume"), _level),
+        ("卖出价/量", ("sell_price", "sell_volume"), _level),
+    )
+
+    def __init__(self, monitor_params, **kwargs):
+        super().__init__(monitor_params, **kwargs)
+        if monitor_params["stream"] == "order_book":
+            self.columns = self.columns[:5] + self.level_columns + self.columns[7:]
+
+
 class MonitorApp(App):
     CSS = """
-        #content {
+        #content, .content {
             overflow-x: auto;
             overflow-y: auto;
         }
+        #metrics {
+            dock: bottom;
+            height: 1;
+            background: $panel;
+        }
         """
 
-    def __init__(self, monitor_panel, monitor_params):
-        self.TITLE = (
-            f"交易监控: A-{monitor_params['market_a']} B-{monitor_params['market_b']}"
-        )
+    def __init__(self, monitor_panel, monitor_params, replayer=None):
+        if "markets" in monitor_params:
+            self.TITLE = f"交易监控: {' / '.join(monitor_params['markets'])}"
+        else:
+            self.TITLE = (
+                f"交易监控: A-{monitor_params['market_a']} "
+                f"B-{monitor_params['market_b']}"
+            )
         super().__init__()
 
         self.monitor_panel = monitor_panel
         self.monitor_params = monitor_params
+        self.replayer = replayer
+        self.replay_task = None
+        # market_b 以逗号分隔多个市场时，每个市场一个标签页，共享交易所连接
+        self.markets_b = monitor_params.get("market_b", "").split(",")
+        self.hub = None
+        if len(self.markets_b) > 1:
+            self.hub = ExchangeHub(
+                batching=monitor_params.get("batching"),
+                metrics=monitor_params.get("metrics"),
+                passive_clock=monitor_params.get("passive_clock", False),
+                supervisor=monitor_params.get("supervisor"),
+            )
+        self.metrics_runner = None
+        self.metrics_task = None
+        self.alerts = monitor_params.get("alerts")
+        if self.alerts is not None:
+            self.alerts.sinks.append(CallbackSink(self.notify_alert))
+        self.history = monitor_params.get("history")
+
+    async def start_monitor(self, monitor):
+        self.replay_task = await start_monitor(
+            monitor, self.replayer, self.monitor_params.get("profiler")
+        )
 
-    def create_monitor_panel(self, id):
+    def create_monitor_panel(self, monitor_params, **kwargs):
+        if "markets" in monitor_params:
+            return MatrixSpreadPanel(monitor_params, **kwargs)
         if self.monitor_panel == "ticker":
-            return TickerSpreadPanel(id=id)
+            return TickerSpreadPanel(monitor_params, **kwargs)
         elif self.monitor_panel == "orderbook":
-            return OrderbookSpreadPanel(id=id)
+            return OrderbookSpreadPanel(monitor_params, **kwargs)
         else:
             raise ValueError(f"Unsupported panel type: {self.monitor_panel}")
 
+    def is_active_panel(self, panel):
+        """多标签页时只有当前标签页的面板更新标题栏"""
+        if self.hub is None:
+            return True
+        return self.query_one(TabbedContent).active == panel.parent.id
+
     def compose(self) -> ComposeResult:
         yield Header()
         yield Footer()
-        yield self.create_monitor_panel(id="content")
+        if self.monitor_params.get("metrics_footer"):
+            yield Static(id="metrics")
+        if self.hub is None:
+            yield self.create_monitor_panel(self.monitor_params, id="content")
+            return
+        with TabbedContent():
+            for i, market_b in enumerate(self.markets_b):
+                with TabPane(market_b, id=f"market-{i}"):
+                    yield self.create_monitor_panel(
+                        dict(self.monitor_params, market_b=market_b, hub=self.hub),
+                        classes="content",
+                    )
+
+    def notify_alert(self, event):
+        self.notify(
+            f"{event['pair_name']} {event['rule']} {event['state']}: {event['value']}",
+            severity="warning" if event["state"] == "firing" else "information",
+        )
+
+    async def on_mount(self):
+        if self.alerts is not None:
+            self.alerts.start()
+        if self.history is not None:
+            self.history.start()
+        if self.monitor_params.get("profiler") is not None:
+            self.monitor_params["profiler"].start()
+        metrics = self.monitor_params.get("metrics")
+        if metrics is None:
+            return
+        self.metrics_task = asyncio.create_task(metrics.watch_event_loop())
+        if self.monitor_params.get("metrics_port"):
+            self.metrics_runner = await serve_metrics(
+                metrics, port=self.monitor_params["metrics_port"]
+            )
+        if self.monitor_params.get("metrics_footer"):
+            footer = self.query_one("#metrics", Static)
+            self.set_interval(1, lambda: footer.update(metrics.summary()))
+
+    async def on_unmount(self):
+        if self.metrics_task is not None:
+            self.metrics_task.cancel()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        if self.hub is not None:
+            await self.hub.close()
+        if self.alerts is not None:
+            await self.alerts.close()
+        if self.history is not None:
+            await self.history.close()
+
+
+async def run_headless(
+    monitor_panel, monitor_params, replayer=None, listen=None, client_interval=None
+):
+    """
+    无界面运行监控，将 top-N 快照和差量输出为 NDJSON 或通过本地 WebSocket 发布
+    :param listen: host:port，为空时输出到标准输出
+    :param client_interval: 每个订阅方的最短发送间隔（秒），默认与刷新间隔一致
+    """
+    params = {
+        key: value for key, value in monitor_params.items() if key not in PANEL_PARAMS
+    }
+    if "markets" in params:
+        monitor = SpreadMatrixMonitor(**params)
+    else:
+        monitor = MONITORS[monitor_panel](**params)
+    publisher = SpreadPublisher(
+        monitor,
+        top_n=monitor_params["top_n"],
+        sort_by=monitor_params["sort_by"],
+        interval=monitor_params["refresh_interval"],
+    )
+    client_interval = client_interval or publisher.interval
+
+    runner = None
+    metrics_runner = None
+    metrics_task = None
+    metrics = monitor_params.get("metrics")
+    alerts = monitor_params.get("alerts")
+    history = monitor_params.get("history")
+    try:
+        if alerts is not None:
+            alerts.start()
+        if history is not None:
+            history.start()
+        if monitor_params.get("profiler") is not None:
+            monitor_params["profiler"].start()
+        if metrics is not None:
+            metrics_task = asyncio.create_task(metrics.watch_event_loop())
+            if monitor_params.get("metrics_port"):
+                metrics_runner = await serve_metrics(
+                    metrics, port=monitor_params["metrics_port"]
+                )
+        await start_monitor(monitor, replayer, monitor_params.get("profiler"))
+        if listen:
+            host, _, port = listen.rpartition(":")
+            runner = await serve_http(
+                publisher, host or "127.0.0.1", int(port), min_interval=client_interval
+            )
+            await publisher.run()
+        else:
+            await asyncio.gather(
+                publisher.run(), publish_stdout(publisher, client_interval)
+            )
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if metrics_task is not None:
+            metrics_task.cancel()
+        await monitor.stop()
+        if alerts is not None:
+            await alerts.close()
+        if history is not None:
+            await history.close()
+
+
+def parse_alert_rules(ctx, param, value):
+    try:
+        return [parse_rule(spec) for spec in value]
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def parse_quote_rate_option(ctx, param, value):
+    try:
+        return parse_quote_rates(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def parse_conflation(ctx, param, value):
+    if value is None or value == "off":
+        return None
+    if value in ("tick", "manual"):
+        return value
+    try:
+        window = float(value)
+    except ValueError:
+        window = 0
+    if window <= 0:
+        raise click.BadParameter("expected off, tick, manual or a window in ms")
+    return window
 
 
 @click.command()
@@ -227,7 +658,14 @@ class MonitorApp(App):
     type=click.STRING,
     default="okx.swap.linear",
     required=True,
-    help="Market A structure: exchange.type[.subtype], e.g. binance.spot, okx.future.linear",
+    help="Market B structure: exchange.type[.subtype], e.g. binance.spot, okx.future.linear. "
+    "Comma-separate several markets to compare each against market A in tabs",
+)
+@click.option(
+    "--markets",
+    default=None,
+    help="Comma-separated markets (two or more) for a spread matrix that ranks "
+    "the best buy/sell venue per asset, replaces --market-a/--market-b",
 )
 @click.option(
     "--quote-currency", default="USDT", show_default=True, help="Base quote currency"
@@ -237,6 +675,21 @@ class MonitorApp(App):
     default=None,
     help="Filter symbols, comma-separated (e.g. BTC-USDT,ETH-USDT)",
 )
+@click.option(
+    "--cross-quotes",
+    default=None,
+    help="Also compare markets quoted in these currencies, comma-separated "
+    "(e.g. USDC,USD), converted to --quote-currency with live rates "
+    "from QUOTE/REF spot markets",
+)
+@click.option(
+    "--quote-rate",
+    "quote_rates",
+    multiple=True,
+    callback=parse_quote_rate_option,
+    help="Fixed conversion rate QUOTE=RATE for --cross-quotes, repeatable "
+    "(e.g. USD=1), used instead of a rate market",
+)
 @click.option(
     "--topn",
     type=int,
@@ -244,16 +697,670 @@ class MonitorApp(App):
     show_default=True,
     help="Number of top items to monitor",
 )
-def main(monitor_panel, market_a, market_b, quote_currency, symbols, topn):
+@click.option(
+    "--refresh-interval",
+    type=click.FloatRange(min=0.01),
+    default=1.0,
+    show_default=True,
+    help="Panel refresh interval in seconds",
+)
+@click.option(
+    "--frame-budget",
+    type=click.FloatRange(min=0),
+    default=50,
+    show_default=True,
+    help="Render time budget per frame in ms, frames after a slower one are skipped "
+    "so rendering never crowds out market data, 0 to disable",
+)
+@click.option(
+    "--sort-by",
+    default="spread_pct",
+    show_default=True,
+    help="Ranking key, ticker: spread_pct/spread, "
+    "orderbook: spread_pct/buy_a_sell_b_spread_pct/buy_b_sell_a_spread_pct, "
+    "with --depth-*: exec_spread_pct/exec_buy_a_sell_b_spread_pct/exec_buy_b_sell_a_spread_pct, "
+    "with --rolling-*: spread_z, "
+    "with --net-spread: net_spread_pct (orderbook also "
+    "net_buy_a_sell_b_spread_pct/net_buy_b_sell_a_spread_pct)",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(["dict", "columnar"], case_sensitive=False),
+    default="dict",
+    show_default=True,
+    help="Pair storage backend; dict is faster, columnar keeps prices in numpy arrays and requires numpy",
+)
+@click.option(
+    "--conflation",
+    default="off",
+    show_default=True,
+    callback=parse_conflation,
+    help="Coalesce spread recomputation: off, tick, manual or a window in ms",
+)
+@click.option(
+    "--depth-notional",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Orderbook panel: executable spread for this notional in quote currency",
+)
+@click.option(
+    "--depth-quantity",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Orderbook panel: executable spread for this quantity in base currency",
+)
+@click.option(
+    "--rolling-window",
+    type=click.IntRange(min=2),
+    default=None,
+    help="Keep rolling spread_pct statistics over the last N updates per pair "
+    "(mean, std, min/max, EWMA and a rankable spread_z)",
+)
+@click.option(
+    "--rolling-seconds",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Limit the rolling window to this many seconds, "
+    "holding at most --rolling-window (default 1024) updates",
+)
+@click.option(
+    "--net-spread",
+    is_flag=True,
+    default=False,
+    help="Compute a rankable net_spread_pct after taker/maker fees on both legs "
+    "and one funding period on perpetual swaps",
+)
+@click.option(
+    "--fee-side",
+    type=click.Choice(["taker", "maker"], case_sensitive=False),
+    default="taker",
+    show_default=True,
+    help="Fee rate used for the net spread",
+)
+@click.option(
+    "--cost-fixture",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON file with fee and funding rates per exchange, "
+    "overriding market metadata and funding requests (implies --net-spread)",
+)
+@click.option(
+    "--funding-interval",
+    type=click.FloatRange(min=1),
+    default=300,
+    show_default=True,
+    help="Seconds between batched funding rate requests per exchange",
+)
+@click.option(
+    "--feed-workers",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Worker processes per market subscribing to updates, 0 to subscribe in-process",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Symbols per subscription for every exchange, "
+    "defaults to known per-exchange limits",
+)
+@click.option(
+    "--adaptive-batching/--no-adaptive-batching",
+    default=True,
+    show_default=True,
+    help="Move hot symbols and slow batches into their own subscriptions",
+)
+@click.option(
+    "--watchdog",
+    type=click.FloatRange(min=0),
+    default=60,
+    show_default=True,
+    help="Resubscribe a batch after this many seconds without updates, 0 to disable. "
+    "Pairs of a stalled or failed batch leave the ranking until they update again",
+)
+@click.option(
+    "--reconnect-backoff",
+    type=click.FloatRange(min=0, min_open=True),
+    default=60,
+    show_default=True,
+    help="Upper bound in seconds of the jittered exponential backoff between retries",
+)
+@click.option(
+    "--alert",
+    "alert_rules",
+    multiple=True,
+    callback=parse_alert_rules,
+    help="Alert rule KEY>THRESHOLD[:CLEAR] or KEY<THRESHOLD[:CLEAR], repeatable. "
+    "KEY is a ranking key or stale (ms), CLEAR sets the hysteresis level, "
+    "e.g. spread_pct>0.005:0.004, stale>3000:1000",
+)
+@click.option(
+    "--alert-sink",
+    "alert_sinks",
+    multiple=True,
+    help="Alert output, repeatable: stdout, file:PATH, http(s)://URL, "
+    "tcp://HOST:PORT or unix:PATH",
+)
+@click.option(
+    "--alert-cooldown",
+    type=click.FloatRange(min=0),
+    default=60,
+    show_default=True,
+    help="Minimum seconds between two alerts of one rule for one pair",
+)
+@click.option(
+    "--passive-clock",
+    is_flag=True,
+    help="Track exchange clock drift from message timestamps "
+    "and calibrate with fetch_time only every few minutes",
+)
+@click.option(
+    "--market-cache/--no-market-cache",
+    default=True,
+    show_default=True,
+    help="Cache market catalogs on disk for faster startup",
+)
+@click.option(
+    "--market-cache-ttl",
+    type=int,
+    default=3600,
+    show_default=True,
+    help="Market cache TTL in seconds",
+)
+@click.option(
+    "--refresh-markets/--no-refresh-markets",
+    default=True,
+    show_default=True,
+    help="Refresh cached market catalogs in the background",
+)
+@click.option(
+    "--market-refresh-interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Reload market catalogs every N seconds, subscribing to new listings "
+    "and dropping delisted symbols without a restart",
+)
+@click.option(
+    "--stale-ttl",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Drop pairs from the ranking and free their state "
+    "when either side has had no update for N seconds",
+)
+@click.option(
+    "--record",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Append raw ticker/orderbook updates to a binary stream log",
+)
+@click.option(
+    "--replay",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Replay a recorded stream log instead of connecting to exchanges",
+)
+@click.option(
+    "--replay-speed",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1.0,
+    show_default=True,
+    help="Replay speed multiplier, inf for as fast as possible",
+)
+@click.option(
+    "--history",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Persist spread rows to time- and size-rolled files in this directory",
+)
+@click.option(
+    "--history-format",
+    type=click.Choice(list(HISTORY_FORMATS)),
+    default="sqlite",
+    show_default=True,
+    help="History file format, parquet and arrow (IPC) require pyarrow",
+)
+@click.option(
+    "--history-interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Sample every pair every N seconds instead of recording each update",
+)
+@click.option(
+    "--history-compression",
+    default=None,
+    help="zstd/snappy/gzip/lz4/brotli for parquet, zstd/lz4 for arrow, "
+    "gzip of rolled files for sqlite, or none [default: zstd, sqlite none]",
+)
+@click.option(
+    "--history-roll-seconds",
+    type=click.FloatRange(min=0, min_open=True),
+    default=3600,
+    show_default=True,
+    help="Start a new history file after N seconds",
+)
+@click.option(
+    "--history-roll-mb",
+    type=click.FloatRange(min=0, min_open=True),
+    default=256,
+    show_default=True,
+    help="Start a new history file once the current one exceeds N MB",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Time receive/parse, process, calculate_spread, top and render stages "
+    "and print a breakdown on exit",
+)
+@click.option(
+    "--profile-sample-every",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Time only one in N calls per stage, e.g. 100 to leave profiling on",
+)
+@click.option(
+    "--profile-stacks",
+    type=click.FloatRange(min=0),
+    default=0,
+    show_default=True,
+    help="Run a sampling profiler for the first N seconds "
+    "and write folded stacks for flamegraphs",
+)
+@click.option(
+    "--profile-hz",
+    type=click.FloatRange(min=1, max=1000),
+    default=100,
+    show_default=True,
+    help="Stack samples per second",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False),
+    default="seekopt-profile",
+    show_default=True,
+    help="Write PATH.txt (summary) and PATH.folded (stacks) on exit",
+)
+@click.option(
+    "--headless",
+    is_flag=True,
+    help="Run without the TUI and publish snapshots/deltas as NDJSON or over WebSocket",
+)
+@click.option(
+    "--listen",
+    default=None,
+    help="Serve headless output on HOST:PORT (/ws and /snapshot) instead of stdout",
+)
+@click.option(
+    "--client-interval",
+    type=click.FloatRange(min=0.01),
+    default=None,
+    help="Minimum seconds between messages per headless client, "
+    "defaults to --refresh-interval",
+)
+@click.option(
+    "--metrics-port",
+    type=click.IntRange(min=1, max=65535),
+    default=None,
+    help="Serve latency histograms and counters in Prometheus text format "
+    "on 127.0.0.1:PORT/metrics",
+)
+@click.option(
+    "--metrics-footer",
+    is_flag=True,
+    help="Show latency percentiles and error counts in a TUI footer",
+)
+@click.option(
+    "--metrics-per-symbol/--no-metrics-per-symbol",
+    default=True,
+    show_default=True,
+    help="Keep a delay histogram per symbol in addition to per exchange",
+)
+def main(
+    monitor_panel,
+    market_a,
+    market_b,
+    markets,
+    quote_currency,
+    symbols,
+    cross_quotes,
+    quote_rates,
+    topn,
+    refresh_interval,
+    frame_budget,
+    sort_by,
+    backend,
+    conflation,
+    depth_notional,
+    depth_quantity,
+    rolling_window,
+    rolling_seconds,
+    net_spread,
+    fee_side,
+    cost_fixture,
+    funding_interval,
+    feed_workers,
+    batch_size,
+    adaptive_batching,
+    watchdog,
+    reconnect_backoff,
+    alert_rules,
+    alert_sinks,
+    alert_cooldown,
+    passive_clock,
+    market_cache,
+    market_cache_ttl,
+    refresh_markets,
+    market_refresh_interval,
+    stale_ttl,
+    record,
+    replay,
+    replay_speed,
+    history,
+    history_format,
+    history_interval,
+    history_compression,
+    history_roll_seconds,
+    history_roll_mb,
+    profile,
+    profile_sample_every,
+    profile_stacks,
+    profile_hz,
+    profile_output,
+    headless,
+    listen,
+    client_interval,
+    metrics_port,
+    metrics_footer,
+    metrics_per_symbol,
+):
+    depth = depth_notional is not None or depth_quantity is not None
+    if depth and monitor_panel.lower() != "orderbook":
+        raise click.BadParameter(
+            "only the orderbook panel computes executable spreads",
+            param_hint="--depth-notional/--depth-quantity",
+        )
+    if depth_notional is not None and depth_quantity is not None:
+        raise click.BadParameter(
+            "use either --depth-notional or --depth-quantity",
+            param_hint="--depth-notional/--depth-quantity",
+        )
+    if depth and (backend != "dict" or feed_workers):
+        raise click.BadParameter(
+            "executable spreads require --backend dict without --feed-workers",
+            param_hint="--depth-notional/--depth-quantity",
+        )
+    if sort_by in DEPTH_SORT_KEYS and not depth:
+        raise click.BadParameter(
+            f"{sort_by} requires --depth-notional or --depth-quantity",
+            param_hint="--sort-by",
+        )
+    rolling = rolling_window is not None or rolling_seconds is not None
+    if rolling and backend != "dict":
+        raise click.BadParameter(
+            "rolling statistics require --backend dict",
+            param_hint="--rolling-window/--rolling-seconds",
+        )
+    if sort_by in ROLLING_SORT_KEYS and not rolling:
+        raise click.BadParameter(
+            f"{sort_by} requires --rolling-window or --rolling-seconds",
+            param_hint="--sort-by",
+        )
+    net_spread = net_spread or cost_fixture is not None
+    if net_spread and backend != "dict":
+        raise click.BadParameter(
+            "net spreads require --backend dict", param_hint="--net-spread"
+        )
+    if not net_spread and any(sort_by in keys for keys in NET_SORT_KEYS.values()):
+        raise click.BadParameter(
+            f"{sort_by} requires --net-spread", param_hint="--sort-by"
+        )
+    cross_quotes = (
+        tuple(
+            quote.strip().upper() for quote in cross_quotes.split(",") if quote.strip()
+        )
+        if cross_quotes
+        else ()
+    )
+    unknown = set(quote_rates) - set(cross_quotes)
+    if unknown:
+        raise click.BadParameter(
+            f"{', '.join(sorted(unknown))} not in --cross-quotes",
+            param_hint="--quote-rate",
+        )
+    if cross_quotes:
+        unsupported = [
+            name
+            for name, used in (
+                ("--symbols", symbols),
+                ("--backend columnar", backend != "dict"),
+                ("--depth-*", depth),
+                ("--feed-workers", feed_workers),
+                ("--replay", replay),
+            )
+            if used
+        ]
+        if unsupported:
+            raise click.BadParameter(
+                f"not supported with {', '.join(unsupported)}",
+                param_hint="--cross-quotes",
+            )
+    rank_keys = (
+        SORT_KEYS[monitor_panel.lower()]
+        + (DEPTH_SORT_KEYS if depth else ())
+        + (ROLLING_SORT_KEYS if rolling else ())
+        + (NET_SORT_KEYS[monitor_panel.lower()] if net_spread else ())
+    )
+    if markets:
+        markets = [market.strip() for market in markets.split(",") if market.strip()]
+        if len(markets) < 2 or len(set(markets)) != len(markets):
+            raise click.BadParameter(
+                "expected two or more distinct markets", param_hint="--markets"
+            )
+        unsupported = [
+            name
+            for name, used in (
+                ("--backend columnar", backend != "dict"),
+                ("--conflation", conflation is not None),
+                ("--depth-*", depth),
+                ("--rolling-*", rolling),
+                ("--net-spread", net_spread),
+                ("--cross-quotes", cross_quotes),
+                ("--feed-workers", feed_workers),
+                ("--alert", alert_rules),
+                ("--market-refresh-interval", market_refresh_interval),
+                ("--stale-ttl", stale_ttl),
+                ("--record", record),
+                ("--replay", replay),
+                ("--history", history),
+            )
+            if used
+        ]
+        if unsupported:
+            raise click.BadParameter(
+                f"not supported with {', '.join(unsupported)}", param_hint="--markets"
+            )
+        rank_keys = MATRIX_SORT_KEYS
+    if sort_by not in rank_keys:
+        raise click.BadParameter(
+            f"{sort_by} is not supported by {monitor_panel} panel",
+            param_hint="--sort-by",
+        )
+    for rule in alert_rules:
+        if rule.key != "stale" and rule.key not in rank_keys:
+            raise click.BadParameter(
+                f"{rule.key} is not supported by {monitor_panel} panel",
+                param_hint="--alert",
+            )
+        rule.cooldown = alert_cooldown
+    if alert_rules and backend != "dict":
+        raise click.BadParameter("alerts require --backend dict", param_hint="--alert")
+    if alert_sinks and not alert_rules:
+        raise click.BadParameter("requires --alert", param_hint="--alert-sink")
+    if "stdout" in alert_sinks and headless and not listen:
+        raise click.BadParameter(
+            "stdout carries headless output, use --listen or another sink",
+            param_hint="--alert-sink",
+        )
+    if market_refresh_interval and feed_workers:
+        raise click.BadParameter(
+            "market refresh is not supported with --feed-workers",
+            param_hint="--market-refresh-interval",
+        )
+    if history and history_interval is None and backend != "dict":
+        raise click.BadParameter(
+            "recording each update requires --backend dict, "
+            "use --history-interval with the columnar backend",
+            param_hint="--history",
+        )
+    if (
+        "," in market_b
+        and not markets
+        and (headless or record or replay or feed_workers)
+    ):
+        raise click.BadParameter(
+            "--headless, --record, --replay and --feed-workers support a single market",
+            param_hint="--market-b",
+        )
+    register_fake_exchange()
     symbols = set(symbols.split(",")) if symbols else None
+    try:
+        sinks = [parse_sink(spec) for spec in alert_sinks]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--alert-sink")
+    try:
+        history = (
+            SpreadHistory(
+                history,
+                history_format,
+                interval=history_interval,
+                compression=history_compression,
+                roll_seconds=history_roll_seconds,
+                roll_bytes=int(history_roll_mb * (1 << 20)),
+            )
+            if history
+            else None
+        )
+    except (ValueError, ImportError) as e:
+        raise click.BadParameter(str(e), param_hint="--history")
+    metrics = (
+        Metrics(per_symbol=metrics_per_symbol)
+        if metrics_port or (metrics_footer and not headless)
+        else None
+    )
+    profiler = (
+        Profiler(
+            sample_every=profile_sample_every,
+            stack_seconds=profile_stacks,
+            stack_hz=profile_hz,
+            output=profile_output,
+            metrics=metrics,
+        )
+        if profile
+        else None
+    )
     monitor_params = {
         "market_a": market_a,
         "market_b": market_b,
         "quote_currency": quote_currency,
         "symbols": symbols,
+        "backend": backend,
+        "conflation": conflation,
+        "feed_workers": feed_workers,
+        "batching": (
+            BatchPlanner.fixed(batch_size, adaptive=adaptive_batching)
+            if batch_size
+            else BatchPlanner(adaptive=adaptive_batching)
+        ),
+        "supervisor": Supervisor(
+            watchdog=watchdog,
+            backoff_base=min(1.0, reconnect_backoff),
+            backoff_cap=reconnect_backoff,
+        ),
+        "market_cache": MarketCache(ttl=market_cache_ttl) if market_cache else None,
+        "refresh_markets": refresh_markets,
+        "market_refresh": market_refresh_interval,
+        "stale_ttl": stale_ttl,
+        "passive_clock": passive_clock,
+        "recorder": StreamRecorder(record) if record else None,
+        "metrics": metrics,
+        "alerts": AlertEngine(alert_rules, sinks) if alert_rules else None,
+        "history": history,
+        **(
+            {"depth_notional": depth_notional, "depth_quantity": depth_quantity}
+            if depth
+            else {}
+        ),
+        **(
+            {"rolling_size": rolling_window, "rolling_seconds": rolling_seconds}
+            if rolling
+            else {}
+        ),
+        **(
+            {
+                "fee_side": fee_side.lower(),
+                "cost_fixture": cost_fixture,
+                "funding_interval": funding_interval,
+            }
+            if net_spread
+            else {}
+        ),
+        **(
+            {"cross_quotes": cross_quotes, "quote_rates": quote_rates}
+            if cross_quotes
+            else {}
+        ),
         "top_n": topn,
+        "sort_by": sort_by,
+        "refresh_interval": refresh_interval,
+        "frame_budget": frame_budget,
+        "metrics_port": metrics_port,
+        "metrics_footer": metrics_footer,
+        "profiler": profiler,
     }
-    MonitorApp(monitor_panel, monitor_params=monitor_params).run()
+    if markets:
+        monitor_params = {
+            "markets": markets,
+            "stream": (
+                "order_book" if monitor_panel.lower() == "orderbook" else "tickers"
+            ),
+            "quote_currency": quote_currency,
+            "symbols": symbols,
+            "batching": monitor_params["batching"],
+            "supervisor": monitor_params["supervisor"],
+            "market_cache": monitor_params["market_cache"],
+            "refresh_markets": refresh_markets,
+            "passive_clock": passive_clock,
+            "metrics": metrics,
+            **{key: monitor_params[key] for key in PANEL_PARAMS},
+        }
+    replayer = StreamReplayer(replay, replay_speed) if replay else None
+    if replayer is not None:
+        try:
+            replayer.check_monitor(MONITORS[monitor_panel.lower()])
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--replay")
+    try:
+        if headless:
+            try:
+                asyncio.run(
+                    run_headless(
+                        monitor_panel.lower(),
+                        monitor_params,
+                        replayer=replayer,
+                        listen=listen,
+                        client_interval=client_interval,
+                    )
+                )
+            except KeyboardInterrupt:
+                pass
+        else:
+            MonitorApp(
+                monitor_panel, monitor_params=monitor_params, replayer=replayer
+            ).run()
+    finally:
+        if profiler is not None:
+            profiler.dump()
 
 
 if __name__ == "__main__":
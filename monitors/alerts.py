@@ -0,0 +1,323 @@
+import re
+import sys
+import json
+import math
+import time
+import asyncio
+import traceback
+
+import aiohttp
+
+from monitors.publisher import _value
+
+RULE_PATTERN = re.compile(r"^(\w+)\s*([<>])\s*([-+0-9.eE]+)(?::([-+0-9.eE]+))?$")
+# 过期规则的取值：两侧中较大的交易所时间到本地接收延迟，随后按距上次更新的时间增长
+STALE_KEY = "stale"
+
+
+class AlertRule:
+    """
+    阈值告警规则，按 (市场, 交易对) 保存状态，每次更新 O(1) 判断
+    :param key: 行字段（spread_pct、buy_a_sell_b_spread_pct 等），或 stale（毫秒）
+    :param threshold: 触发阈值
+    :param clear: 恢复阈值，above 时需不高于 threshold，两者之差即回差，默认等于 threshold
+    :param above: True 为高于阈值触发，False 为低于阈值触发
+    :param cooldown: 同一交易对两次触发的最短间隔（秒）
+    """
+
+    def __init__(self, key, threshold, clear=None, above=True, cooldown=60.0):
+        if clear is None:
+            clear = threshold
+        if (clear > threshold) if above else (clear < threshold):
+            raise ValueError(
+                f"Clear level {clear} must not be beyond threshold {threshold}"
+            )
+        self.key = key
+        self.threshold = threshold
+        self.clear = clear
+        self.above = above
+        self.cooldown = cooldown
+        self.stale = key == STALE_KEY
+        op = ">" if above else "<"
+        self.name = f"{key}{op}{threshold:g}" + (
+            f":{clear:g}" if clear != threshold else ""
+        )
+        # (市场, 交易对) -> [是否触发中, 上次触发时间, 最近取值, 取值时间]
+        self.states = {}
+
+    def value(self, data):
+        if self.stale:
+            return max(data["elapsed_time_a"], data["elapsed_time_b"])
+        return data[self.key]
+
+    def update(self, key, value, now):
+        """
+        :return: "firing"、"resolved" 或 None
+        """
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = [False, -math.inf, value, now]
+        else:
+            state[2] = value
+            state[3] = now
+        if not state[0]:
+            if (value > self.threshold) if self.above else (value < self.threshold):
+                if now - state[1] >= self.cooldown:
+                    state[0] = True
+                    state[1] = now
+                    return "firing"
+        elif (value < self.clear) if self.above else (value > self.clear):
+            state[0] = False
+            return "resolved"
+        return None
+
+
+def parse_rule(spec, cooldown=60.0):
+    """
+    解析 KEY>THRESHOLD[:CLEAR] 或 KEY<THRESHOLD[:CLEAR]，
+    例如 spread_pct>0.005:0.004、stale>3000:1000
+    """
+    match = RULE_PATTERN.match(spec.strip())
+    if match is None:
+        raise ValueError(f"Invalid alert rule: {spec}")
+    key, op, threshold, clear = match.groups()
+    return AlertRule(
+        key,
+        float(threshold),
+        None if clear is None else float(clear),
+        above=op == ">",
+        cooldown=cooldown,
+    )
+
+
+class StdoutSink:
+    """以 NDJSON 输出到标准输出"""
+
+    async def send(self, event):
+        sys.stdout.write(json.dumps(event) + "\n")
+        sys.stdout.flush()
+
+    async def close(self):
+        pass
+
+
+class FileSink:
+    """以 NDJSON 追加写入日志文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+
+    async def send(self, event):
+        self.file.write(json.dumps(event) + "\n")
+        self.file.flush()
+
+    async def close(self):
+        self.file.close()
+
+
+class WebhookSink:
+    """以 JSON POST 到 HTTP 地址"""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+
+    async def send(self, event):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        async with self.session.post(self.url, json=event) as response:
+            response.raise_for_status()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class SocketSink:
+    """
+    以 NDJSON 写入本地 TCP 或 Unix 套接字，断开后下一条告警时重连
+    :param address: host:port 或 Unix 套接字路径
+    """
+
+    def __init__(self, address, unix=False):
+        self.address = address
+        self.unix = unix
+        self.writer = None
+
+    async def send(self, event):
+        if self.writer is None:
+            if self.unix:
+                _, self.writer = await asyncio.open_unix_connection(self.address)
+            else:
+                host, _, port = self.address.rpartition(":")
+                _, self.writer = await asyncio.open_connection(
+                    host or "127.0.0.1", int(port)
+                )
+        try:
+            self.writer.write((json.dumps(event) + "\n").encode())
+            await self.writer.drain()
+        except Exception:
+            self.writer.close()
+            self.writer = None
+            raise
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class CallbackSink:
+    """调用普通函数，例如在界面中弹出通知"""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    async def send(self, event):
+        self.callback(event)
+
+    async def close(self):
+        pass
+
+
+def parse_sink(spec):
+    """
+    解析告警输出：stdout、file:PATH、http(s)://URL、tcp://HOST:PORT、unix:PATH
+    """
+    if spec == "stdout":
+        return StdoutSink()
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:") :])
+    if spec.startswith(("http://", "https://")):
+        return WebhookSink(spec)
+    if spec.startswith("tcp://"):
+        return SocketSink(spec[len("tcp://") :])
+    if spec.startswith("unix:"):
+        return SocketSink(spec[len("unix:") :], unix=True)
+    raise ValueError(f"Invalid alert sink: {spec}")
+
+
+class AlertEngine:
+    """
+    告警引擎：价差计算后逐条更新判断规则，触发和恢复事件放入有界队列，
+    由后台任务依次发送到各输出，发送慢或失败不会阻塞行情协程，队列满时丢弃并计数。
+    多个监控可共享同一实例，状态按 (市场, 交易对) 区分
+    :param rules: AlertRule 列表
+    :param sinks: 输出列表，每个输出提供 send(event) 和 close() 协程
+    :param queue_size: 待发送事件的队列容量
+    :param sweep_interval: 检查无更新交易对是否过期的间隔（秒）
+    """
+
+    def __init__(self, rules, sinks=(), queue_size=1000, sweep_interval=1.0):
+        self.rules = list(rules)
+        self.stale_rules = [rule for rule in self.rules if rule.stale]
+        self.sinks = list(sinks)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sweep_interval = sweep_interval
+        self.tasks = []
+        self.fired = 0
+        self.resolved = 0
+        self.dropped = 0
+        self.sent = 0
+        self.errors = 0
+
+    def keys(self):
+        """规则用到的行字段"""
+        return {rule.key for rule in self.rules if not rule.stale}
+
+    def evaluate(self, market, pair_name, data):
+        """在 calculate_spread 中调用，判断该交易对的全部规则"""
+        now = time.time()
+        key = (market, pair_name)
+        for rule in self.rules:
+            value = rule.value(data)
+            state = rule.update(key, value, now)
+            if state is not None:
+                self._emit(state, rule, market, pair_name, value, now)
+
+    def discard(self, market, pair_name):
+        """交易对移除后释放规则状态"""
+        key = (market, pair_name)
+        for rule in self.rules:
+            rule.states.pop(key, None)
+
+    def _emit(self, state, rule, market, pair_name, value, now):
+        if state == "firing":
+            self.fired += 1
+        else:
+            self.resolved += 1
+        event = {
+            "state": state,
+            "rule": rule.name,
+            "key": rule.key,
+            "market": market,
+            "pair_name": pair_name,
+            "value": _value(value),
+            "threshold": rule.threshold if state == "firing" else rule.clear,
+            "ts": int(now * 1e3),
+        }
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def sweep(self):
+        """没有新更新的交易对，按上次延迟加上距上次更新的时间判断是否过期"""
+        now = time.time()
+        for rule in self.stale_rules:
+            for key, state in rule.states.items():
+                if state[0]:
+                    continue
+                value = state[2] + (now - state[3]) * 1e3
+                if value > rule.threshold and now - state[1] >= rule.cooldown:
+                    state[0] = True
+                    state[1] = now
+                    self._emit("firing", rule, *key, value, now)
+
+    def start(self):
+        """启动发送和过期检查任务，重复调用无副作用"""
+        if self.tasks:
+            return
+        self.tasks.append(asyncio.create_task(self.run()))
+        if self.stale_rules:
+            self.tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def run(self):
+        while True:
+            await self._dispatch(await self.queue.get())
+
+    async def _dispatch(self, event):
+        for sink in self.sinks:
+            try:
+                await sink.send(event)
+                self.sent += 1
+            except Exception:
+                self.errors += 1
+                print(f"Alert sink error: {traceback.format_exc()}")
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def stats(self):
+        return {
+            "fired": self.fired,
+            "resolved": self.resolved,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "errors": self.errors,
+            "queued": self.queue.qsize(),
+        }
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        # 发送关闭前已入队的事件
+        while not self.queue.empty():
+            await self._dispatch(self.queue.get_nowait())
+        for sink in self.sinks:
+            await sink.close()
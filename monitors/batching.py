@@ -0,0 +1,292 @@
+import time
+import statistics
+
+# 数据流 -> 交易所取消订阅的方法名
+UNWATCH_METHODS = {
+    "tickers": "un_watch_tickers",
+    "order_book": "un_watch_order_book_for_symbols",
+}
+
+# 已知的每个订阅任务交易对上限，按交易所（ccxt name 小写）和数据流
+BATCH_LIMITS = {
+    "binance": {"tickers": 200, "order_book": 100},
+    "okx": {"tickers": 100, "order_book": 100},
+    "bybit": {"tickers": 10, "order_book": 10},
+}
+
+
+class Batch:
+    """
+    一个订阅任务负责的交易对及其统计，symbols 列表会在重新分配时原地修改，
+    订阅循环下一次调用 watch_* 时生效
+    """
+
+    def __init__(self, exchange_name, index, stream, symbols):
+        self.exchange_name = exchange_name
+        self.index = index
+        self.stream = stream
+        self.symbols = list(symbols)
+        self.created = time.time()
+        self.messages = 0
+        self.updates = 0
+        self.errors = 0
+        self.rate = 0.0
+        self.latency = None
+        self.last_message = None
+        # 中断状态：开始时间、已结束中断的累计时长（秒）、重连和静默超时次数
+        self.down_since = None
+        self.gap = 0.0
+        self.reconnects = 0
+        self.stalls = 0
+        # 由重新分配拆出的批次使用独立连接（connection 为独立的交易所实例），
+        # 连续 quiet 个统计窗口不再热门或延迟恢复后合并回普通批次
+        self.split = False
+        self.connection = None
+        self.quiet = 0
+        # 当前统计窗口内各交易对的更新次数
+        self.counts = {}
+        self.window_start = time.time()
+
+    def observe(self, symbols, latency=None, alpha=0.1):
+        """
+        记录一次推送
+        :param symbols: 本次推送包含的交易对
+        :param latency: 交易所时间到本地接收的延迟（毫秒）
+        """
+        counts = self.counts
+        for symbol in symbols:
+            counts[symbol] = counts.get(symbol, 0) + 1
+            self.updates += 1
+        self.messages += 1
+        self.last_message = time.time()
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += alpha * (latency - self.latency)
+
+    def mark_down(self, now=None):
+        """
+        标记批次中断，已中断时不重复计时
+        :return: 是否为新的中断
+        """
+        if self.down_since is not None:
+            return False
+        self.down_since = time.time() if now is None else now
+        return True
+
+    def mark_up(self, now=None):
+        """
+        批次恢复推送，累计中断时长
+        :return: 本次中断时长（秒），未中断时为 None
+        """
+        if self.down_since is None:
+            return None
+        gap = (time.time() if now is None else now) - self.down_since
+        self.gap += gap
+        self.down_since = None
+        return gap
+
+    def gap_seconds(self, now=None):
+        """累计中断时长，包括仍在进行的中断"""
+        if self.down_since is None:
+            return self.gap
+        return self.gap + (time.time() if now is None else now) - self.down_since
+
+    def reset_window(self):
+        now = time.time()
+        elapsed = now - self.window_start
+        if elapsed > 0:
+            self.rate = sum(self.counts.values()) / elapsed
+        self.window_start = now
+        counts, self.counts = self.counts, {}
+        return counts, elapsed
+
+    def stats(self):
+        return {
+            "exchange": self.exchange_name,
+            "index": self.index,
+            "stream": self.stream,
+            "symbols": len(self.symbols),
+            "messages": self.messages,
+            "updates": self.updates,
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+            "stalls": self.stalls,
+            "split": self.split,
+            "down": self.down_since is not None,
+            "gap": self.gap_seconds(),
+            "rate": self.rate,
+            "latency": self.latency,
+            "idle": (
+                None if self.last_message is None else time.time() - self.last_message
+            ),
+        }
+
+
+async def release_symbols(exchange, stream, symbols):
+    """
+    取消交易所对已移到其他批次的交易对的订阅，不支持 un_watch_* 时跳过，
+    这些交易对的推送仍会到达原连接，由 ccxt 缓存后丢弃
+    """
+    method = UNWATCH_METHODS[stream]
+    name = "".join(
+        part.capitalize() if i else part for i, part in enumerate(method.split("_"))
+    )
+    if not symbols or not getattr(exchange, "has", {}).get(name):
+        return False
+    try:
+        await getattr(exchange, method)(list(symbols))
+    except Exception as e:
+        print(f"Unwatch error({exchange.name}): {str(e)}")
+        return False
+    return True
+
+
+class BatchPlanner:
+    """
+    订阅批次规划：按交易所和数据流的已知上限切分交易对，
+    运行中按测得的更新速率和延迟，把热门交易对拆到独立连接，延迟过高的批次一分为二，
+    拆出的批次安静下来后合并回普通批次，长时间运行批次数量不会只增不减
+    :param limits: 覆盖 BATCH_LIMITS 的上限
+    :param default_size: 未知交易所的批次大小
+    :param adaptive: 是否在运行中重新分配
+    :param interval: 重新分配的统计窗口（秒）
+    :param hot_share: 单个交易对占批次更新数的比例超过该值时视为热门
+    :param hot_rate: 热门交易对的最低更新速率（次/秒）
+    :param min_latency: 触发拆分的最低延迟（毫秒）
+    :param merge_after: 拆出的批次连续多少个统计窗口安静后合并回普通批次
+    """
+
+    def __init__(
+        self,
+        limits=None,
+        default_size=50,
+        adaptive=True,
+        interval=10,
+        hot_share=0.5,
+        hot_rate=5,
+        min_latency=100,
+        merge_after=6,
+    ):
+        self.limits = {**BATCH_LIMITS, **(limits or {})}
+        self.default_size = default_size
+        self.override = False
+        self.adaptive = adaptive
+        self.interval = interval
+        self.hot_share = hot_share
+        self.hot_rate = hot_rate
+        self.min_latency = min_latency
+        self.merge_after = merge_after
+
+    @classmethod
+    def fixed(cls, batch_size, **kwargs):
+        """所有交易所使用同一批次大小"""
+        planner = cls(default_size=batch_size, **kwargs)
+        planner.override = True
+        return planner
+
+    def size(self, exchange_name, stream):
+        if self.override:
+            return self.default_size
+        return self.limits.get(exchange_name, {}).get(stream, self.default_size)
+
+    def plan(self, exchange_name, index, stream, symbols):
+        size = self.size(exchange_name, stream)
+        return [
+            Batch(exchange_name, index, stream, symbols[i : i + size])
+            for i in range(0, len(symbols), size)
+        ]
+
+    def _split(self, batch, symbols):
+        split = Batch(batch.exchange_name, batch.index, batch.stream, symbols)
+        split.split = True
+        return split
+
+    def _is_quiet(self, batch):
+        """单个交易对的批次更新速率低于热门阈值，多个交易对的批次延迟恢复正常"""
+        if len(batch.symbols) == 1:
+            return batch.rate < self.hot_rate
+        return batch.latency is None or batch.latency <= self.min_latency
+
+    def merge(self, batches):
+        """
+        把连续 merge_after 个窗口安静的拆出批次并入同一交易所、来源和数据流中
+        仍有空位且交易对最少的普通批次，被并入的批次清空
+        :return: [(清空的批次, 移走的交易对)]
+        """
+        moves = []
+        for batch in batches:
+            if not batch.split or not batch.symbols:
+                continue
+            batch.quiet = batch.quiet + 1 if self._is_quiet(batch) else 0
+            if batch.quiet < self.merge_after:
+                continue
+            size = self.size(batch.exchange_name, batch.stream)
+            targets = [
+                target
+                for target in batches
+                if not target.split
+                and target.symbols
+                and (target.exchange_name, target.index, target.stream)
+                == (batch.exchange_name, batch.index, batch.stream)
+                and len(target.symbols) + len(batch.symbols) <= size
+            ]
+            if not targets:
+                continue
+            target = min(targets, key=lambda target: len(target.symbols))
+            target.symbols.extend(batch.symbols)
+            moves.append((batch, list(batch.symbols)))
+            batch.symbols.clear()
+        return moves
+
+    def rebalance(self, batches):
+        """
+        根据上一个统计窗口重新分配，原地修改已有批次
+        :return: (需要新建订阅任务的批次, [(原批次, 移走的交易对)])，
+                 调用方为新批次建立独立连接，并取消原连接上移走的交易对的订阅
+        """
+        windows = [(batch, *batch.reset_window()) for batch in batches]
+        if not self.adaptive:
+            return [], []
+
+        moves = self.merge(batches)
+        created = []
+        for batch, counts, elapsed in windows:
+            if len(batch.symbols) < 2 or not counts or elapsed <= 0:
+                continue
+            total = sum(counts.values())
+            hot = sorted(
+                (
+                    symbol
+                    for symbol, count in counts.items()
+                    if count / total >= self.hot_share
+                    and count / elapsed >= self.hot_rate
+                    and symbol in batch.symbols
+                ),
+                key=counts.get,
+                reverse=True,
+            )
+            for symbol in hot[: len(batch.symbols) - 1]:
+                batch.symbols.remove(symbol)
+                created.append(self._split(batch, [symbol]))
+                moves.append((batch, [symbol]))
+
+        # 延迟明显高于同类批次的拆成两半
+        groups = {}
+        for batch in batches:
+            if batch.latency is not None and batch.symbols:
+                groups.setdefault((batch.exchange_name, batch.stream), []).append(batch)
+        for group in groups.values():
+            median = statistics.median(batch.latency for batch in group)
+            for batch in group:
+                if len(batch.symbols) >= 2 and batch.latency > max(
+                    self.min_latency, 2 * median
+                ):
+                    half = len(batch.symbols) // 2
+                    moved = batch.symbols[half:]
+                    del batch.symbols[half:]
+                    batch.latency = None
+                    created.append(self._split(batch, moved))
+                    moves.append((batch, moved))
+        return created, moves
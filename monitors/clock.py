@@ -0,0 +1,192 @@
+import math
+import time
+import asyncio
+import traceback
+from collections import deque
+
+# 漂移估计的上限（毫秒/毫秒），避免样本太少时外推出离谱的偏移
+MAX_DRIFT = 5e-4
+
+
+def _slope(points):
+    """加权最小二乘斜率，points 为 (x, y, weight)"""
+    total = sum(w for _, _, w in points)
+    if total <= 0:
+        return 0.0
+    mean_x = sum(x * w for x, _, w in points) / total
+    mean_y = sum(y * w for _, y, w in points) / total
+    var = sum(w * (x - mean_x) ** 2 for x, _, w in points)
+    if var <= 0:
+        return 0.0
+    cov = sum(w * (x - mean_x) * (y - mean_y) for x, y, w in points)
+    return max(-MAX_DRIFT, min(MAX_DRIFT, cov / var))
+
+
+class ClockEstimator:
+    """
+    NTP 风格的交易所时钟偏移估计：每轮连续请求 burst 次 fetch_time，只保留 RTT 最低的样本，
+    用最近 window 轮中 RTT 较低的一半按 1/RTT² 加权拟合偏移和漂移，并给出偏移的误差范围。
+    预测与新样本一致时请求间隔逐步加倍到 max_interval。
+    passive 模式下用行情消息的本地接收时间与交易所时间戳之差的分桶下界跟踪漂移，
+    REST 请求只用于校准绝对偏移，按 max_interval 进行
+    :param burst: 每轮请求次数
+    :param burst_gap: 同一轮内两次请求的间隔（秒）
+    :param interval: 两轮请求的初始间隔（秒）
+    :param max_interval: 两轮请求的最长间隔（秒）
+    :param window: 保留的轮数
+    :param passive: 是否使用行情时间戳跟踪漂移
+    :param bucket: 行情时间戳下界的分桶长度（秒）
+    :param buckets: 保留的分桶数量
+    """
+
+    def __init__(
+        self,
+        burst=4,
+        burst_gap=0.2,
+        interval=30,
+        max_interval=300,
+        window=8,
+        passive=False,
+        bucket=10,
+        buckets=30,
+    ):
+        self.burst = burst
+        self.burst_gap = burst_gap
+        self.interval = interval
+        self.max_interval = max_interval
+        self.current_interval = interval
+        self.passive = passive
+        self.bucket = bucket * 1e3
+        # 每轮最佳样本 (本地中点时间, 偏移, RTT)，单位毫秒
+        self.samples = deque(maxlen=window)
+        # 行情时间戳分桶下界 (分桶中点时间, min(接收时间 - 交易所时间))
+        self.floors = deque(maxlen=buckets)
+        self._bucket_start = None
+        self._bucket_min = math.inf
+        self.ref_time = None
+        self.ref_offset = 0.0
+        self.drift = 0.0
+        self.residual = 0.0
+        self.min_rtt = None
+        self.requests = 0
+
+    def observe(self, recv_time, timestamp):
+        """记录一条行情的本地接收时间和交易所时间戳（毫秒）"""
+        if timestamp is None:
+            return
+        if self._bucket_start is None:
+            self._bucket_start = recv_time
+        elif recv_time - self._bucket_start >= self.bucket:
+            self.floors.append(((self._bucket_start + recv_time) / 2, self._bucket_min))
+            self._bucket_start = recv_time
+            self._bucket_min = math.inf
+        value = recv_time - timestamp
+        if value < self._bucket_min:
+            self._bucket_min = value
+
+    async def measure(self, exchange):
+        """请求一轮 fetch_time，返回 RTT 最低的样本"""
+        best = None
+        for i in range(self.burst):
+            if i:
+                await asyncio.sleep(self.burst_gap)
+            start_time = time.time() * 1e3
+            server_time = await exchange.fetch_time()
+            end_time = time.time() * 1e3
+            self.requests += 1
+            if server_time is None:
+                continue
+            rtt = end_time - start_time
+            if best is None or rtt < best[2]:
+                middle = (start_time + end_time) / 2
+                best = (middle, middle - server_time, rtt)
+        return best
+
+    def add(self, sample):
+        """加入一轮样本并重新拟合，返回加入前对该样本的预测偏差（毫秒）"""
+        error = None
+        if self.ref_time is not None:
+            error = sample[1] - self.offset(sample[0])
+        self.samples.append(sample)
+        self._fit()
+        return error
+
+    def _fit(self):
+        samples = sorted(self.samples, key=lambda s: s[2])
+        samples = samples[: max(2, (len(samples) + 1) // 2)]
+        self.min_rtt = samples[0][2]
+        points = [(t, offset, 1 / max(rtt, 0.1) ** 2) for t, offset, rtt in samples]
+        if self.passive and len(self.floors) >= 3:
+            self.drift = _slope([(t, floor, 1.0) for t, floor in self.floors])
+        else:
+            self.drift = _slope(points)
+
+        self.ref_time = max(t for t, _, _ in points)
+        total = sum(w for _, _, w in points)
+        self.ref_offset = (
+            sum(
+                w * (offset - self.drift * (t - self.ref_time))
+                for t, offset, w in points
+            )
+            / total
+        )
+        self.residual = math.sqrt(
+            sum(w * (offset - self.offset(t)) ** 2 for t, offset, w in points) / total
+        )
+
+    def offset(self, now):
+        """本地时间减交易所时间（毫秒），即 time_diff"""
+        return self.ref_offset + self.drift * (now - self.ref_time)
+
+    def uncertainty(self, now):
+        """偏移误差范围（毫秒）：最低 RTT 的一半，加上拟合残差和漂移外推"""
+        return (
+            self.min_rtt / 2
+            + self.residual
+            + abs(self.drift) * abs(now - self.ref_time) / 2
+        )
+
+    def estimate(self, now):
+        return {
+            "latency": self.min_rtt / 2,
+            "time_diff": self.offset(now),
+            "uncertainty": self.uncertainty(now),
+            "drift_ppm": self.drift * 1e6,
+            "rtt": self.min_rtt,
+            "samples": len(self.samples),
+            "requests": self.requests,
+        }
+
+    async def run(self, exchange, publish, publish_interval=1.0):
+        """
+        持续校时
+        :param publish: 回调，接收 (estimate, now)，在每轮请求后和两轮之间每 publish_interval 秒调用
+        """
+        while True:
+            try:
+                sample = await self.measure(exchange)
+                if sample is not None:
+                    error = self.add(sample)
+                    if error is not None and abs(error) <= max(sample[2] / 2, 1):
+                        self.current_interval = min(
+                            self.current_interval * 2, self.max_interval
+                        )
+                    else:
+                        self.current_interval = self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                print(f"Excpetion: {traceback.format_exc()}")
+
+            interval = self.current_interval
+            if self.passive and self.ref_time is not None:
+                interval = self.max_interval
+            deadline = time.time() + interval
+            while True:
+                if self.ref_time is not None:
+                    now = time.time() * 1e3
+                    publish(self.estimate(now), now)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(publish_interval, remaining))
@@ -0,0 +1,297 @@
+from collections.abc import Mapping
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，仅列式存储需要
+    np = None
+
+
+SIDES = {"a": 0, "b": 1}
+
+
+class ColumnarPairView(Mapping):
+    """
+    列式存储的只读字典视图，按 pair_name 返回与字典存储相同结构的行
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, pair_name):
+        slot = self.store.slots[pair_name]
+        if not self.store.seen[slot]:
+            raise KeyError(pair_name)
+        return self.store.row(slot)
+
+    def __iter__(self):
+        pair_names = self.store.pair_names
+        for slot in np.flatnonzero(self.store.seen):
+            yield pair_names[slot]
+
+    def __len__(self):
+        return int(np.count_nonzero(self.store.seen))
+
+    def values(self):
+        store = self.store
+        return store.rows(np.flatnonzero(store.seen).tolist())
+
+    def items(self):
+        return [(row["pair_name"], row) for row in self.values()]
+
+    def rows(self, pair_names):
+        """按名称批量构造行，不存在或尚未更新的交易对为 None"""
+        store = self.store
+        slots, seen = store.slots, store.seen
+        found = [slots.get(pair_name) for pair_name in pair_names]
+        found = [slot if slot is not None and seen[slot] else None for slot in found]
+        rows = iter(store.rows([slot for slot in found if slot is not None]))
+        return [None if slot is None else next(rows) for slot in found]
+
+
+class ColumnarPairStore:
+    """
+    列式交易对存储，按整数交易对 ID 将价格、数量、时间戳保存在连续的 NumPy 数组中，
+    更新时只记录变化的交易对，由 recompute 对这些交易对做一次向量化价差计算，
+    并把新的价差写入监控的增量排名索引，top 与字典存储一样只读取索引的前 n 项
+    :param routing: 编译后的路由表，交易对 ID 与字典存储的槽位一致
+    :param rankings: 排序字段 -> RankingIndex，字段需为价差列
+    :param excluded: 不写入排名的交易对（监控中批次中断的 suspended）
+    """
+
+    side_columns = ()
+    spread_columns = ()
+    compact_after = 1024
+
+    def __init__(self, routing, rankings=None, excluded=None):
+        if np is None:
+            raise ImportError("Columnar backend requires numpy, run: pip install numpy")
+
+        self._set_routing(routing)
+        size = len(self.pair_names)
+        for column in self.side_columns:
+            setattr(self, column, np.zeros((2, size)))
+        for column in self.spread_columns:
+            setattr(self, column, np.zeros(size))
+        self.seen = np.zeros(size, dtype=bool)
+        # 自上次重算以来更新过的槽位数组，重算时合并，不扫描全部交易对
+        self.pending = []
+        self.rankings = rankings or {}
+        self.excluded = {} if excluded is None else excluded
+        unknown = [key for key in self.rankings if key not in self.spread_columns]
+        if unknown:
+            raise ValueError(f"Columnar store cannot rank by {', '.join(unknown)}")
+
+        self.view = ColumnarPairView(self)
+
+    def _set_routing(self, routing):
+        self.pair_names = routing.pair_names
+        self.slots = routing.slots
+        self.routes = {
+            index: {
+                symbol: np.array(slots, dtype=np.intp)
+                for symbol, slots in routing.routes[index].items()
+            }
+            for index in SIDES
+        }
+
+    def resize(self, routing):
+        """切换到保留槽位的新路由表，交易对数增加时扩展数组"""
+        old_size = len(self.pair_names)
+        self._set_routing(routing)
+        size = len(self.pair_names)
+        if size <= old_size:
+            return
+        for column in self.side_columns:
+            array = np.zeros((2, size))
+            array[:, :old_size] = getattr(self, column)
+            setattr(self, column, array)
+        for column in self.spread_columns + ("seen",):
+            old = getattr(self, column)
+            array = np.zeros(size, dtype=old.dtype)
+            array[:old_size] = old
+            setattr(self, column, array)
+
+    def evict(self, slot):
+        """清空交易对的数据，之后再次更新时从零开始"""
+        self.seen[slot] = False
+        for column in self.side_columns:
+            getattr(self, column)[:, slot] = 0
+        for column in self.spread_columns:
+            getattr(self, column)[slot] = 0
+
+    def _mark(self, slots):
+        self.seen[slots] = True
+        pending = self.pending
+        pending.append(slots)
+        # 长时间无人读取排名时合并去重，待重算的槽位不超过交易对数量
+        if len(pending) >= self.compact_after:
+            self.pending = [np.unique(np.concatenate(pending))]
+
+    def recompute(self):
+        pending = self.pending
+        if not pending:
+            return 0
+        self.pending = []
+        ids = pending[0] if len(pending) == 1 else np.unique(np.concatenate(pending))
+        # 重算前已清空的交易对不再计算
+        ids = ids[self.seen[ids]]
+        if len(ids):
+            self._compute(ids)
+            self._rank(ids)
+        return len(ids)
+
+    def _rank(self, ids):
+        if not self.rankings:
+            return
+        pair_names, excluded = self.pair_names, self.excluded
+        slots = ids.tolist()
+        names = [pair_names[slot] for slot in slots]
+        for key, ranking in self.rankings.items():
+            update = ranking.update
+            for pair_name, value in zip(names, getattr(self, key)[ids].tolist()):
+                if pair_name not in excluded:
+                    update(pair_name, value)
+
+    def _compute(self, ids):
+        raise NotImplementedError("Method is not implemented")
+
+    def row_columns(self):
+        """行字典的字段：[(字段, 列名, 侧)]，侧为 None 表示价差列"""
+        raise NotImplementedError("Method is not implemented")
+
+    def row(self, slot):
+        return self.rows([slot])[0]
+
+    def rows(self, slots):
+        """批量构造行字典，每列只取一次值"""
+        if not slots:
+            return []
+        ids = np.array(slots, dtype=np.intp)
+        columns = self.row_columns()
+        values = []
+        for _, column, side in columns:
+            array = getattr(self, column)
+            values.append((array if side is None else array[side]).take(ids).tolist())
+        fields = ("pair_name",) + tuple(field for field, _, _ in columns)
+        pair_names = self.pair_names
+        names = [pair_names[slot] for slot in slots]
+        return [dict(zip(fields, row)) for row in zip(names, *values)]
+
+    def column(self, key):
+        if key in self.spread_columns:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def top(self, n, key="spread_pct"):
+        """未建立排名索引的字段按全部交易对选出前 n 项"""
+        ids = np.flatnonzero(self.seen)
+        if not len(ids) or n <= 0:
+            return []
+        values = -self.column(key)[ids]
+        if n < len(ids):
+            part = np.argpartition(values, n - 1)[:n]
+            ids, values = ids[part], values[part]
+        order = np.lexsort((ids, values))
+        return self.rows(ids[order].tolist())
+
+
+class ColumnarTickerStore(ColumnarPairStore):
+    side_columns = ("price", "timestamp", "elapsed_time")
+    spread_columns = ("spread", "spread_pct")
+
+    def update(self, index, symbol, price, timestamp, elapsed_time):
+        slots = self.routes[index].get(symbol)
+        if slots is None:
+            return
+        side = SIDES[index]
+        self.price[side, slots] = price
+        self.timestamp[side, slots] = timestamp
+        self.elapsed_time[side, slots] = elapsed_time
+        self._mark(slots)
+
+    def _compute(self, ids):
+        price_a = self.price[0, ids]
+        price_b = self.price[1, ids]
+        valid = (price_a != 0) & (price_b != 0)
+        valid &= np.isfinite(price_a) & np.isfinite(price_b)
+        ids, price_a, price_b = ids[valid], price_a[valid], price_b[valid]
+
+        spread = np.abs(price_a - price_b)
+        self.spread[ids] = spread
+        self.spread_pct[ids] = spread / np.minimum(price_a, price_b)
+
+    def row_columns(self):
+        return [
+            ("spread", "spread", None),
+            ("spread_pct", "spread_pct", None),
+            ("price_a", "price", 0),
+            ("price_b", "price", 1),
+            ("elapsed_time_a", "elapsed_time", 0),
+            ("elapsed_time_b", "elapsed_time", 1),
+        ]
+
+
+class ColumnarOrderbookStore(ColumnarPairStore):
+    side_columns = (
+        "bid_price",
+        "bid_volume",
+        "ask_price",
+        "ask_volume",
+        "timestamp",
+        "elapsed_time",
+    )
+    spread_columns = (
+        "spread_pct",
+        "buy_a_sell_b_spread",
+        "buy_a_sell_b_spread_pct",
+        "buy_b_sell_a_spread",
+        "buy_b_sell_a_spread_pct",
+    )
+
+    def update(self, index, symbol, bid, ask, timestamp, elapsed_time):
+        """
+        :param bid: 买一 [价格, 数量]，为空时不更新
+        :param ask: 卖一 [价格, 数量]，为空时不更新
+        """
+        slots = self.routes[index].get(symbol)
+        if slots is None:
+            return
+        side = SIDES[index]
+        if bid:
+            self.bid_price[side, slots] = bid[0]
+            self.bid_volume[side, slots] = bid[1]
+        if ask:
+            self.ask_price[side, slots] = ask[0]
+            self.ask_volume[side, slots] = ask[1]
+        self.timestamp[side, slots] = timestamp
+        self.elapsed_time[side, slots] = elapsed_time
+        self._mark(slots)
+
+    def _compute(self, ids):
+        bid_a, ask_a = self.bid_price[0, ids], self.ask_price[0, ids]
+        bid_b, ask_b = self.bid_price[1, ids], self.ask_price[1, ids]
+        valid = (bid_a != 0) & (ask_a != 0) & (bid_b != 0) & (ask_b != 0)
+        ids = ids[valid]
+        bid_a, ask_a, bid_b, ask_b = (
+            bid_a[valid],
+            ask_a[valid],
+            bid_b[valid],
+            ask_b[valid],
+        )
+
+        buy_b_sell_a = bid_a - ask_b
+        buy_a_sell_b = bid_b - ask_a
+        self.buy_b_sell_a_spread[ids] = buy_b_sell_a
+        self.buy_b_sell_a_spread_pct[ids] = buy_b_sell_a / ask_b
+        self.buy_a_sell_b_spread[ids] = buy_a_sell_b
+        self.buy_a_sell_b_spread_pct[ids] = buy_a_sell_b / ask_a
+        self.spread_pct[ids] = np.maximum(
+            self.buy_b_sell_a_spread_pct[ids], self.buy_a_sell_b_spread_pct[ids]
+        )
+
+    def row_columns(self):
+        columns = [(column, column, None) for column in self.spread_columns]
+        for index, side in SIDES.items():
+            for column in self.side_columns:
+                columns.append((f"{column}_{index}", column, side))
+        return columns
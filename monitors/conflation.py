@@ -0,0 +1,72 @@
+import asyncio
+
+
+class Conflator:
+    """
+    合并价差计算：更新到达时只标记脏交易对，按窗口对每个脏交易对统一计算一次
+    :param recompute: 计算回调，接收脏槽位集合，返回实际计算的交易对数量
+    :param mode: "tick" 同一事件循环轮次内合并；"manual" 仅在 flush 时计算；
+                 数值为合并窗口（毫秒）
+    """
+
+    def __init__(self, recompute, mode="tick"):
+        if mode not in ("tick", "manual") and not (
+            isinstance(mode, (int, float)) and mode > 0
+        ):
+            raise ValueError(f"Unsupported conflation mode: {mode}")
+        self.recompute = recompute
+        self.mode = mode
+        self.dirty = set()
+        self.updates = 0
+        self.recomputes = 0
+        self.flushes = 0
+        self._scheduled = False
+
+    @property
+    def window(self):
+        """合并窗口（秒），非定时模式返回 None"""
+        if isinstance(self.mode, str):
+            return None
+        return self.mode / 1e3
+
+    def mark(self, slots):
+        self.dirty.update(slots)
+        self.updates += len(slots)
+        if self.mode == "tick" and not self._scheduled:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._scheduled = True
+            loop.call_soon(self._flush_soon)
+
+    def _flush_soon(self):
+        self._scheduled = False
+        self.flush()
+
+    def flush(self):
+        dirty, self.dirty = self.dirty, set()
+        count = self.recompute(dirty)
+        self.recomputes += count
+        self.flushes += 1
+        return count
+
+    async def run(self):
+        """定时窗口模式下的后台合并任务"""
+        interval = self.window
+        while True:
+            await asyncio.sleep(interval)
+            if self.dirty:
+                self.flush()
+
+    @property
+    def coalesced(self):
+        return self.updates - self.recomputes
+
+    def stats(self):
+        return {
+            "updates": self.updates,
+            "recomputes": self.recomputes,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+        }
@@ -0,0 +1,165 @@
+import json
+import asyncio
+import traceback
+
+SIDES = ("a", "b")
+
+
+def _side(monitor, index):
+    if index == "a":
+        return monitor.exchange_a, monitor.exchange_a_name
+    return monitor.exchange_b, monitor.exchange_b_name
+
+
+class CostTable:
+    """
+    按交易对槽位预先计算的交易成本：两侧手续费之和，以及两侧资金费率之差，
+    价差计算时只需一次减法得到净价差。
+    手续费和合约参数在 load_markets 后从 ccxt 市场元数据读取，
+    资金费率由每个交易所一个后台任务批量刷新。
+    合约面值和正反向只影响按张数计的数量，按比例表示的净价差不受影响，保留在表中用于核对
+    :param fee_side: 使用 taker 或 maker 费率
+    :param fixture: 本地 JSON 文件，按交易所提供手续费和资金费率，覆盖市场元数据，
+                    提供了资金费率的交易所不再请求，用于离线测试
+    :param funding_interval: 资金费率刷新间隔（秒）
+    """
+
+    def __init__(self, fee_side="taker", fixture=None, funding_interval=300):
+        if fee_side not in ("taker", "maker"):
+            raise ValueError(f"Unsupported fee side: {fee_side}")
+        self.fee_side = fee_side
+        self.funding_interval = funding_interval
+        self.fixture = {"fees": {}, "funding": {}}
+        if fixture is not None:
+            with open(fixture, encoding="utf-8") as f:
+                self.fixture.update(json.load(f))
+        # 来源 -> 交易对 -> {fee, contract_size, inverse, swap}
+        self.symbols = {"a": {}, "b": {}}
+        # 来源 -> 交易对 -> 最近一次资金费率，非永续合约为 0
+        self.funding = {"a": {}, "b": {}}
+        # 槽位 -> 手续费之和、A 侧资金费率减 B 侧资金费率
+        self.fees = []
+        self.funding_diff = []
+        self.refreshes = 0
+        self.errors = 0
+
+    def _fixture(self, section, exchange_name, symbol):
+        values = self.fixture[section].get(exchange_name)
+        if not values:
+            return None
+        return values.get(symbol, values.get("*"))
+
+    def build(self, monitor):
+        """按当前路由表重建每个槽位的成本，市场目录刷新后再次调用"""
+        for index in SIDES:
+            exchange, exchange_name = _side(monitor, index)
+            markets = exchange.markets or {}
+            entries = {}
+            for symbol in monitor.symbol_map[index]:
+                market = markets.get(symbol, {})
+                fee = market.get(self.fee_side) or 0.0
+                override = self._fixture("fees", exchange_name, symbol)
+                if override is not None:
+                    fee = override.get(self.fee_side, fee)
+                entries[symbol] = {
+                    "fee": fee,
+                    "contract_size": market.get("contractSize") or 1,
+                    "inverse": bool(market.get("inverse")),
+                    "swap": bool(market.get("swap")),
+                }
+                funding = self._fixture("funding", exchange_name, symbol)
+                if funding is not None and entries[symbol]["swap"]:
+                    self.funding[index][symbol] = funding
+            self.symbols[index] = entries
+            self.funding[index] = {
+                symbol: rate
+                for symbol, rate in self.funding[index].items()
+                if symbol in entries
+            }
+
+        self.fees = [0.0] * len(monitor.routing)
+        self.funding_diff = [0.0] * len(monitor.routing)
+        for slot, symbols in enumerate(monitor.routing.pair_symbols):
+            if symbols is None:
+                continue
+            symbol_a, symbol_b = symbols
+            self.fees[slot] = (
+                self.symbols["a"][symbol_a]["fee"] + self.symbols["b"][symbol_b]["fee"]
+            )
+            self._update_slot(slot, symbol_a, symbol_b)
+
+    def _update_slot(self, slot, symbol_a, symbol_b):
+        funding_a = self.funding["a"].get(symbol_a, 0.0)
+        funding_b = self.funding["b"].get(symbol_b, 0.0)
+        self.funding_diff[slot] = funding_a - funding_b
+
+    def update_funding(self, monitor, index, rates):
+        """
+        写入一侧的资金费率并更新相关槽位
+        :param rates: 交易对 -> 资金费率
+        """
+        self.funding[index].update(rates)
+        routes = monitor.routes[index]
+        pair_symbols = monitor.routing.pair_symbols
+        for symbol in rates:
+            for slot in routes.get(symbol, ()):
+                symbols = pair_symbols[slot]
+                if symbols is not None:
+                    self._update_slot(slot, *symbols)
+
+    def funding_sides(self, monitor):
+        """
+        需要在线刷新资金费率的交易所：id(交易所) -> (交易所, [(来源, 永续合约列表)])，
+        同一交易所的两侧合并为一次请求
+        """
+        requests = {}
+        for index in SIDES:
+            exchange, exchange_name = _side(monitor, index)
+            if self.fixture["funding"].get(exchange_name):
+                continue
+            if not getattr(exchange, "has", {}).get("fetchFundingRates"):
+                continue
+            symbols = [
+                symbol for symbol, entry in self.symbols[index].items() if entry["swap"]
+            ]
+            if symbols:
+                requests.setdefault(id(exchange), (exchange, []))[1].append(
+                    (index, symbols)
+                )
+        return requests
+
+    def exchange_sides(self, monitor, exchange):
+        """一个交易所需要刷新的 [(来源, 永续合约列表)]"""
+        return self.funding_sides(monitor).get(id(exchange), (None, []))[1]
+
+    def apply_rates(self, monitor, sides, rates):
+        """
+        把一次批量请求的结果写入各侧
+        :param rates: fetch_funding_rates 的返回值
+        """
+        for index, side_symbols in sides:
+            self.update_funding(
+                monitor,
+                index,
+                {
+                    symbol: rates[symbol]["fundingRate"] or 0.0
+                    for symbol in side_symbols
+                    if symbol in rates
+                },
+            )
+        self.refreshes += 1
+
+    async def run(self, monitor, exchange):
+        """按间隔批量请求一个交易所的资金费率，交易对列表每次按当前市场重新计算"""
+        while True:
+            try:
+                sides = self.exchange_sides(monitor, exchange)
+                symbols = sorted({s for _, side_symbols in sides for s in side_symbols})
+                rates = await exchange.fetch_funding_rates(symbols) if symbols else {}
+                self.apply_rates(monitor, sides, rates)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                print(f"Fetch funding rates error: {traceback.format_exc()}")
+            await asyncio.sleep(self.funding_interval)
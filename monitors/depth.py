@@ -0,0 +1,87 @@
+NAN = float("nan")
+
+
+def walk_levels(levels, target, notional=True, contract_size=1, inverse=False):
+    """
+    按档位吃单直到满足目标数量
+    :param levels: [[price, amount], ...]，按成交优先级排列
+    :param target: 目标金额（计价币）或目标数量（基础币）
+    :param notional: target 是否为金额
+    :param contract_size: 合约面值，现货为 1
+    :param inverse: 是否为反向合约（面值以计价币计）
+    :return: (成交均价, 用到的档位数)，深度不足时均价为 None，价格非正的档位跳过
+    """
+    remaining = target
+    cost = 0.0
+    quantity = 0.0
+    for i, level in enumerate(levels):
+        price, amount = level[0], level[1]
+        if not price > 0:
+            # 价格为 0、负数或缺失的档位无法成交，跳过以免除零
+            continue
+        if inverse:
+            quote = amount * contract_size
+            base = quote / price
+        else:
+            base = amount * contract_size
+            quote = base * price
+        take = quote if notional else base
+        if take >= remaining:
+            fraction = remaining / take
+            return (cost + quote * fraction) / (quantity + base * fraction), i + 1
+        remaining -= take
+        cost += quote
+        quantity += base
+    return None, len(levels)
+
+
+class DepthWalker:
+    """
+    计算目标金额/数量下的成交均价，并按 (来源, 交易对, 方向) 缓存上一次用到的档位，
+    这些档位没有变化时直接复用上一次结果
+    :param notional: 目标金额（计价币），与 quantity 二选一
+    :param quantity: 目标数量（基础币）
+    """
+
+    def __init__(self, notional=None, quantity=None):
+        if (notional is None) == (quantity is None):
+            raise ValueError("Exactly one of notional or quantity is required")
+        self.notional = notional is not None
+        self.target = notional if self.notional else quantity
+        # (index, symbol, side) -> (用到的档位副本, 是否用完全部档位, 成交均价)
+        self.cache = {}
+        self.walks = 0
+        self.reused = 0
+        self.levels = 0
+
+    def vwap(self, key, levels, contract_size=1, inverse=False):
+        cached = self.cache.get(key)
+        if cached is not None:
+            prefix, exhausted, price = cached
+            if levels[: len(prefix)] == prefix and (
+                not exhausted or len(levels) == len(prefix)
+            ):
+                self.reused += 1
+                return price
+
+        price, used = walk_levels(
+            levels, self.target, self.notional, contract_size, inverse
+        )
+        self.walks += 1
+        self.levels += used
+        self.cache[key] = (
+            [list(level) for level in levels[:used]],
+            price is None,
+            price,
+        )
+        return price
+
+    def discard(self, key):
+        self.cache.pop(key, None)
+
+    def stats(self):
+        return {
+            "walks": self.walks,
+            "reused": self.reused,
+            "levels_per_walk": self.levels / self.walks if self.walks else 0,
+        }
@@ -0,0 +1,258 @@
+import asyncio
+import functools
+import random
+import time
+import zlib
+
+from monitors.spread import register_exchange
+
+
+class FakeExchange:
+    """
+    本地模拟交易所，实现监控用到的 ccxt.pro 接口，离线生成市场目录和行情流
+    :param name: 交易所名称
+    :param symbol_count: 每种市场类型的币种数量
+    :param rate: 每个订阅批次每秒推送的更新数，0 为不限速
+    :param burst: 平均每次推送包含的更新数，越大越集中
+    :param clock_skew: 交易所时钟相对本地的偏移（毫秒）
+    :param latency: 模拟的单程网络延迟（毫秒）
+    :param volatility: 每次更新的价格相对波动
+    :param seed: 随机种子，同一种子下各实例的币种基准价格一致
+    """
+
+    instances = 0
+    has = {"fetchFundingRates": True}
+
+    def __init__(
+        self,
+        name="fake",
+        symbol_count=100,
+        rate=100,
+        burst=1,
+        clock_skew=0,
+        latency=0,
+        volatility=0.0005,
+        seed=0,
+    ):
+        self.id = name
+        self.name = name
+        self.symbol_count = symbol_count
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock_skew = clock_skew
+        self.latency = latency
+        self.volatility = volatility
+        self.seed = seed
+        # 同名实例（如 A/B 两侧）使用不同的随机序列，基准价格仍由 seed 决定
+        FakeExchange.instances += 1
+        self.random = random.Random(
+            zlib.crc32(f"{name}-{seed}-{FakeExchange.instances}".encode())
+        )
+        self.markets = {}
+        self.currencies = {}
+        self.prices = {}
+        self.messages = 0
+        self._pending = 0
+
+    def _base_price(self, base):
+        if base == "USDC":
+            # 稳定币汇率市场在 1 附近波动
+            return 1.0
+        return 1 + zlib.crc32(f"{base}-{self.seed}".encode()) % 100000 / 100
+
+    def _create_markets(self):
+        markets = {}
+        for i in range(self.symbol_count):
+            base = f"C{i:05d}"
+            for quote in ("USDT", "USDC"):
+                markets[f"{base}/{quote}"] = {
+                    "id": f"{base}{quote}",
+                    "symbol": f"{base}/{quote}",
+                    "base": base,
+                    "quote": quote,
+                    "settle": None,
+                    "type": "spot",
+                    "spot": True,
+                    "margin": True,
+                    "swap": False,
+                    "future": False,
+                    "contract": False,
+                    "linear": None,
+                    "inverse": None,
+                    "contractSize": None,
+                    "taker": 0.001,
+                    "maker": 0.001,
+                    "active": True,
+                }
+                markets[f"{base}/{quote}:{quote}"] = {
+                    "id": f"{base}{quote}-SWAP",
+                    "symbol": f"{base}/{quote}:{quote}",
+                    "base": base,
+                    "quote": quote,
+                    "settle": quote,
+                    "type": "swap",
+                    "spot": False,
+                    "margin": False,
+                    "swap": True,
+                    "future": False,
+                    "contract": True,
+                    "linear": True,
+                    "inverse": False,
+                    "contractSize": 1,
+                    "taker": 0.0005,
+                    "maker": 0.0002,
+                    "active": True,
+                }
+            markets[f"{base}/USD:{base}"] = {
+                "id": f"{base}USD-SWAP",
+                "symbol": f"{base}/USD:{base}",
+                "base": base,
+                "quote": "USD",
+                "settle": base,
+                "type": "swap",
+                "spot": False,
+                "margin": False,
+                "swap": True,
+                "future": False,
+                "contract": True,
+                "linear": False,
+                "inverse": True,
+                "contractSize": 10,
+                "taker": 0.0005,
+                "maker": 0.0002,
+                "active": True,
+            }
+        markets["USDC/USDT"] = {
+            "id": "USDCUSDT",
+            "symbol": "USDC/USDT",
+            "base": "USDC",
+            "quote": "USDT",
+            "settle": None,
+            "type": "spot",
+            "spot": True,
+            "margin": False,
+            "swap": False,
+            "future": False,
+            "contract": False,
+            "linear": None,
+            "inverse": None,
+            "contractSize": None,
+            "taker": 0.001,
+            "maker": 0.001,
+            "active": True,
+        }
+        return markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = markets
+        self.currencies = currencies or {}
+        for symbol, market in markets.items():
+            if symbol not in self.prices:
+                noise = 1 + self.random.uniform(-0.002, 0.002)
+                self.prices[symbol] = self._base_price(market["base"]) * noise
+        return self.markets
+
+    async def load_markets(self, reload=False, params={}):
+        if not self.markets or reload:
+            self.set_markets(self._create_markets())
+        return self.markets
+
+    def milliseconds(self):
+        return time.time() * 1e3 + self.clock_skew
+
+    async def fetch_time(self, params={}):
+        await asyncio.sleep(self.latency / 1e3)
+        server_time = self.milliseconds()
+        await asyncio.sleep(self.latency / 1e3)
+        return server_time
+
+    async def _wait(self):
+        """按速率和突发系数等待下一批更新，返回本批更新数"""
+        if self._pending:
+            self._pending -= 1
+            await asyncio.sleep(0)
+            return 1
+
+        count = 1
+        if self.burst > 1:
+            count = min(
+                int(self.random.expovariate(1 / self.burst)) + 1, int(self.burst * 10)
+            )
+        if self.rate:
+            await asyncio.sleep(self.random.expovariate(self.rate / count))
+        else:
+            await asyncio.sleep(0)
+        self.messages += count
+        return count
+
+    def _tick(self, symbol):
+        price = self.prices[symbol] * (1 + self.random.gauss(0, self.volatility))
+        self.prices[symbol] = price
+        return price
+
+    async def watch_tickers(self, symbols=None, params={}):
+        # 与 ccxt 一致，在调用时确定订阅的交易对，批次列表之后的修改不影响本次调用
+        symbols = list(symbols or self.markets)
+        count = await self._wait()
+        timestamp = self.milliseconds() - self.latency
+        tickers = {}
+        for _ in range(count):
+            symbol = self.random.choice(symbols)
+            price = self._tick(symbol)
+            tickers[symbol] = {
+                "symbol": symbol,
+                "timestamp": timestamp,
+                "last": price,
+                "bid": price * 0.9999,
+                "ask": price * 1.0001,
+            }
+        return tickers
+
+    async def watch_order_book_for_symbols(self, symbols, limit=None, params={}):
+        # 订单簿每次只返回一个交易对，突发的其余更新在后续调用中立即返回
+        symbols = list(symbols)
+        self._pending += await self._wait() - 1
+        symbol = self.random.choice(symbols)
+        price = self._tick(symbol)
+        depth = limit or 5
+        step = price * 0.0001
+        return {
+            "symbol": symbol,
+            "timestamp": self.milliseconds() - self.latency,
+            "bids": [
+                [price - step * (i + 1), self.random.uniform(0.1, 10)]
+                for i in range(depth)
+            ],
+            "asks": [
+                [price + step * (i + 1), self.random.uniform(0.1, 10)]
+                for i in range(depth)
+            ],
+            "nonce": self.messages,
+        }
+
+    async def fetch_funding_rates(self, symbols=None, params={}):
+        """永续合约的资金费率，由 seed 和交易对决定，每次请求不变"""
+        await asyncio.sleep(self.latency / 1e3)
+        rates = {}
+        for symbol in symbols or list(self.markets):
+            if not self.markets[symbol]["swap"]:
+                continue
+            key = f"{symbol}-{self.name}-{self.seed}".encode()
+            rates[symbol] = {
+                "symbol": symbol,
+                "fundingRate": (zlib.crc32(key) % 2001 - 1000) / 1e6,
+                "timestamp": self.milliseconds(),
+            }
+        return rates
+
+    async def close(self):
+        pass
+
+
+def register_fake_exchange(name="fake", **options):
+    """
+    注册模拟交易所，之后可以用 <name>.spot、<name>.swap.linear 等市场参数创建监控
+    :param options: FakeExchange 参数
+    """
+    # 工厂需可 pickle，多进程接入时传给子进程
+    register_exchange(name, functools.partial(FakeExchange, name, **options))
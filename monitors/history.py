@@ -0,0 +1,312 @@
+import os
+import gzip
+import time
+import queue
+import shutil
+import sqlite3
+import asyncio
+import operator
+import threading
+
+FORMATS = {
+    "sqlite": ("sqlite", ("none", "gzip")),
+    "parquet": ("parquet", ("none", "zstd", "snappy", "gzip", "lz4", "brotli")),
+    "arrow": ("arrow", ("none", "zstd", "lz4")),
+}
+DEFAULT_COMPRESSION = {"sqlite": "none", "parquet": "zstd", "arrow": "zstd"}
+
+
+def _require_pyarrow(fmt):
+    try:
+        import pyarrow
+    except ImportError:  # pyarrow 为可选依赖，仅 parquet/arrow 格式需要
+        raise ImportError(
+            f"{fmt} history requires pyarrow, run: pip install pyarrow"
+        ) from None
+    return pyarrow
+
+
+class SqliteSegment:
+    """单个 SQLite 文件，交易对名称只在 pairs 表中保存一次，spreads 表按整数 ID 引用"""
+
+    def __init__(self, path, fields, compression):
+        self.path = path
+        self.compression = compression
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=OFF")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute(
+            "CREATE TABLE pairs (id INTEGER PRIMARY KEY, market TEXT, pair_name TEXT)"
+        )
+        columns = ", ".join(f'"{field}" REAL' for field in fields)
+        self.db.execute(
+            f"CREATE TABLE spreads (ts INTEGER, pair_id INTEGER, {columns})"
+        )
+        names = ", ".join(f'"{field}"' for field in fields)
+        self.db.execute(
+            f"CREATE VIEW spread_history AS SELECT ts, market, pair_name, {names} "
+            "FROM spreads JOIN pairs ON pairs.id = spreads.pair_id"
+        )
+        self.insert = f"INSERT INTO spreads VALUES (?, ?{', ?' * len(fields)})"
+        self.pair_ids = {}
+
+    def write(self, rows):
+        pair_ids = self.pair_ids
+        new_pairs = []
+        values = []
+        for row in rows:
+            key = (row[1], row[2])
+            pair_id = pair_ids.get(key)
+            if pair_id is None:
+                pair_id = pair_ids[key] = len(pair_ids)
+                new_pairs.append((pair_id, *key))
+            values.append((row[0], pair_id, *row[3:]))
+        with self.db:
+            if new_pairs:
+                self.db.executemany("INSERT INTO pairs VALUES (?, ?, ?)", new_pairs)
+            self.db.executemany(self.insert, values)
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def close(self):
+        self.db.close()
+        if self.compression == "gzip":
+            with open(self.path, "rb") as src, gzip.open(
+                self.path + ".gz", "wb"
+            ) as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+
+
+class ArrowSegment:
+    """单个 Parquet 或 Arrow IPC 文件，每批写入一个行组，字符串列按字典编码"""
+
+    def __init__(self, path, fields, compression, fmt):
+        pa = self.pa = _require_pyarrow(fmt)
+        self.path = path
+        self.fields = fields
+        self.schema = pa.schema(
+            [
+                ("ts", pa.timestamp("ms")),
+                ("market", pa.dictionary(pa.int32(), pa.string())),
+                ("pair_name", pa.dictionary(pa.int32(), pa.string())),
+            ]
+            + [(field, pa.float64()) for field in fields]
+        )
+        compression = None if compression == "none" else compression
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+        else:
+            import pyarrow.ipc
+
+            self.writer = pyarrow.ipc.new_file(
+                path,
+                self.schema,
+                options=pyarrow.ipc.IpcWriteOptions(compression=compression),
+            )
+
+    def write(self, rows):
+        pa = self.pa
+        columns = list(zip(*rows))
+        arrays = [pa.array(columns[0], type=pa.timestamp("ms"))]
+        arrays += [pa.array(column).dictionary_encode() for column in columns[1:3]]
+        arrays += [
+            pa.array(column, type=pa.float64(), from_pandas=True)
+            for column in columns[3:]
+        ]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def close(self):
+        self.writer.close()
+
+
+class SpreadHistory:
+    """
+    价差时间序列持久化：行情协程只把行追加到内存缓冲区，缓冲区满或到达刷新间隔时
+    整批交给后台线程写盘，文件按时间和大小滚动。多个监控可共享同一实例，行按市场区分
+    :param directory: 输出目录
+    :param fmt: sqlite、parquet 或 arrow（Arrow IPC），后两者需要 pyarrow
+    :param interval: 采样间隔（秒），为空时记录每次价差更新
+    :param compression: parquet 为 zstd/snappy/gzip/lz4/brotli，arrow 为 zstd/lz4，
+                        sqlite 为 gzip（滚动后压缩已关闭的文件），none 为不压缩
+    :param roll_seconds: 单个文件覆盖的最长时间（秒）
+    :param roll_bytes: 单个文件的大小上限（字节）
+    :param batch_rows: 每批写入的行数
+    :param flush_interval: 缓冲区最长写盘间隔（秒）
+    :param queue_size: 等待写盘的批次上限，写盘跟不上时丢弃并计数
+    :param prefix: 文件名前缀
+    """
+
+    def __init__(
+        self,
+        directory,
+        fmt="sqlite",
+        interval=None,
+        compression=None,
+        roll_seconds=3600,
+        roll_bytes=256 << 20,
+        batch_rows=10000,
+        flush_interval=5.0,
+        queue_size=64,
+        prefix="spreads",
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported history format: {fmt}")
+        if compression is None:
+            compression = DEFAULT_COMPRESSION[fmt]
+        if compression not in FORMATS[fmt][1]:
+            raise ValueError(f"Unsupported compression for {fmt}: {compression}")
+        if fmt != "sqlite":
+            _require_pyarrow(fmt)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fmt = fmt
+        self.interval = interval
+        self.compression = compression
+        self.roll_seconds = roll_seconds
+        self.roll_bytes = roll_bytes
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.prefix = prefix
+        self.fields = None
+        self._values = None
+        self.buffer = []
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.task = None
+        self.segment = None
+        self.segment_started = None
+        self.files = []
+        self.rows = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        # 写盘线程不能打印（会破坏界面），最近一次错误由 stats 给出
+        self.last_error = None
+
+    def _bind(self, data):
+        """由第一行确定字段，之后的行按相同顺序取值，缺少的字段写入空值"""
+        self.fields = tuple(key for key in data if key != "pair_name")
+        self._values = operator.itemgetter("pair_name", *self.fields)
+
+    def record(self, market, data, now=None):
+        """追加一行，只做内存操作，满一批时交给写盘线程"""
+        if self._values is None:
+            self._bind(data)
+        ts = int((time.time() if now is None else now) * 1e3)
+        try:
+            values = self._values(data)
+        except KeyError:
+            values = (data["pair_name"], *(data.get(key) for key in self.fields))
+        self.buffer.append((ts, market, *values))
+        self.rows += 1
+        if len(self.buffer) >= self.batch_rows:
+            self.flush()
+
+    def sample(self, market, rows, now=None):
+        """按固定间隔采样时记录全部交易对的当前行"""
+        now = time.time() if now is None else now
+        for data in rows:
+            self.record(market, data, now)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            self.dropped += len(batch)
+
+    def start(self):
+        """启动写盘线程和定时刷新任务，重复调用无副作用"""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(
+            target=self._writer, name="spread-history", daemon=True
+        )
+        self.thread.start()
+        self.task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def _open(self):
+        name = "{}-{}-{:04d}.{}".format(
+            self.prefix,
+            time.strftime("%Y%m%d-%H%M%S"),
+            len(self.files),
+            FORMATS[self.fmt][0],
+        )
+        path = os.path.join(self.directory, name)
+        if self.fmt == "sqlite":
+            self.segment = SqliteSegment(path, self.fields, self.compression)
+        else:
+            self.segment = ArrowSegment(path, self.fields, self.compression, self.fmt)
+        self.segment_started = time.time()
+        self.files.append(path)
+
+    def _close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def _writer(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            try:
+                if self.segment is not None and (
+                    time.time() - self.segment_started >= self.roll_seconds
+                    or self.segment.size() >= self.roll_bytes
+                ):
+                    self._close_segment()
+                if self.segment is None:
+                    self._open()
+                self.segment.write(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self._write_failed(e)
+        try:
+            self._close_segment()
+        except Exception as e:
+            self._write_failed(e)
+
+    def _write_failed(self, e):
+        self.errors += 1
+        self.last_error = f"{type(e).__name__}: {e}"
+
+    def stats(self):
+        return {
+            "rows": self.rows,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "queued": self.queue.qsize(),
+            "files": len(self.files),
+        }
+
+    async def close(self):
+        """写入剩余的行并关闭当前文件"""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.flush()
+        if self.thread is not None:
+            await asyncio.to_thread(self.queue.put, None)
+            await asyncio.to_thread(self.thread.join)
+            self.thread = None
@@ -0,0 +1,305 @@
+import time
+import asyncio
+import traceback
+from collections import defaultdict
+
+from monitors.spread import create_exchange
+from monitors.batching import BatchPlanner, release_symbols
+from monitors.clock import ClockEstimator
+from monitors.supervisor import Supervisor
+
+
+class ExchangeHub:
+    """
+    进程内共享交易所连接：同名交易所只创建一个实例、只加载一次市场目录、只校时一次，
+    同一 (交易所, 数据流, 深度) 下每个交易对只订阅一次，更新分发给所有关注它的监控
+    :param batching: BatchPlanner 实例，决定每个订阅任务的交易对数量
+    :param metrics: Metrics 实例，记录订阅错误和重连次数
+    :param passive_clock: 用行情时间戳跟踪时钟漂移，减少 fetch_time 请求
+    :param supervisor: Supervisor 实例，订阅批次的重试退避和静默超时，
+                       批次中断时关注这些交易对的所有监控将其移出排名
+    """
+
+    def __init__(
+        self, batching=None, metrics=None, passive_clock=False, supervisor=None
+    ):
+        self.batching = batching or BatchPlanner()
+        self.supervisor = supervisor or Supervisor()
+        self.metrics = metrics
+        self.exchanges = {}
+        self.market_tasks = {}
+        # 交易所 -> 最近一次加载任务的开始时间
+        self.market_times = {}
+        self.latencies = defaultdict(dict)
+        self.clocks = defaultdict(lambda: ClockEstimator(passive=passive_clock))
+        # (交易所, 数据流, 深度) -> 交易对 -> [(monitor, index)]
+        self.listeners = defaultdict(lambda: defaultdict(list))
+        self.watched = defaultdict(set)
+        self.monitors = defaultdict(set)
+        self.sync_tasks = {}
+        self.watch_tasks = []
+        self.batches = []
+        # 交易所 -> 需要资金费率的监控，每个交易所一个刷新任务
+        self.funding_monitors = defaultdict(set)
+        self.funding_tasks = {}
+
+    def exchange(self, name):
+        exchange = self.exchanges.get(name)
+        if exchange is None:
+            exchange = self.exchanges[name] = create_exchange(name)
+        return exchange
+
+    async def load_markets(self, exchange, load, max_age=None):
+        """
+        同一交易所的市场目录只加载一次，其余监控等待同一个加载任务
+        :param load: 实际加载的协程函数，接收交易所实例
+        :param max_age: 重新加载时使用：上一次加载已完成且开始于该秒数之前时发起新的加载，
+                        否则复用，多个监控按同一间隔刷新时每个间隔只加载一次
+        :return: 是否由本次调用发起加载
+        """
+        task = self.market_tasks.get(exchange.id)
+        started = task is None or (
+            max_age is not None
+            and task.done()
+            and time.time() - self.market_times[exchange.id] >= max_age
+        )
+        if started:
+            self.market_times[exchange.id] = time.time()
+            task = self.market_tasks[exchange.id] = asyncio.ensure_future(
+                load(exchange)
+            )
+        try:
+            await asyncio.shield(task)
+        except Exception:
+            # 加载失败时允许后续监控重试
+            if self.market_tasks.get(exchange.id) is task:
+                del self.market_tasks[exchange.id]
+            raise
+        return started
+
+    def subscribe(self, monitor, index, exchange, stream, symbols, limit=None):
+        """
+        登记监控关注的交易对，尚未订阅的交易对按批次新建订阅任务
+        :param stream: "tickers" 或 "order_book"
+        :param limit: 订单簿深度
+        """
+        key = (exchange.id, stream, limit)
+        listeners = self.listeners[key]
+        watched = self.watched[key]
+        new_symbols = []
+        for symbol in symbols:
+            listeners[symbol].append((monitor, index))
+            if symbol not in watched:
+                watched.add(symbol)
+                new_symbols.append(symbol)
+
+        self.monitors[exchange.id].add(monitor)
+        if exchange.id not in self.sync_tasks:
+            self.sync_tasks[exchange.id] = asyncio.create_task(self.sync_time(exchange))
+
+        self.watch_tasks = [task for task in self.watch_tasks if not task.done()]
+        self.batches = [batch for batch in self.batches if batch.symbols]
+        watch = getattr(self, f"watch_{stream}")
+        for batch in self.batching.plan(
+            exchange.name.lower(), None, stream, new_symbols
+        ):
+            self.batches.append(batch)
+            self.watch_tasks.append(asyncio.create_task(watch(exchange, key, batch)))
+
+    def unsubscribe(self, monitor, index=None, symbols=None):
+        """
+        移除监控的订阅，无人关注的批次会在下一次更新后退出
+        :param index: 只移除该侧的订阅
+        :param symbols: 只移除这些交易对，为空时移除全部并不再接收校时
+        """
+        for listeners in self.listeners.values():
+            for symbol in list(listeners) if symbols is None else symbols:
+                if symbol not in listeners:
+                    continue
+                entries = [
+                    entry
+                    for entry in listeners[symbol]
+                    if entry[0] is not monitor
+                    or (index is not None and entry[1] != index)
+                ]
+                if entries:
+                    listeners[symbol] = entries
+                else:
+                    del listeners[symbol]
+        if symbols is None:
+            for monitors in self.monitors.values():
+                monitors.discard(monitor)
+            for monitors in self.funding_monitors.values():
+                monitors.discard(monitor)
+
+    def add_funding(self, monitor, exchange):
+        """登记监控需要该交易所的资金费率，同一交易所的所有监控共用一个刷新任务"""
+        self.funding_monitors[exchange.id].add(monitor)
+        task = self.funding_tasks.get(exchange.id)
+        if task is None or task.done():
+            self.funding_tasks[exchange.id] = asyncio.create_task(
+                self.refresh_funding(exchange)
+            )
+
+    async def refresh_funding(self, exchange):
+        """
+        合并所有监控需要的永续合约，每个间隔请求一次 fetch_funding_rates，
+        结果分发给各监控的 CostTable，间隔取各监控中最短的一个
+        """
+        monitors = self.funding_monitors[exchange.id]
+        while monitors:
+            requests = [
+                (monitor, monitor.costs.exchange_sides(monitor, exchange))
+                for monitor in list(monitors)
+            ]
+            symbols = sorted(
+                {
+                    symbol
+                    for _, sides in requests
+                    for _, side_symbols in sides
+                    for symbol in side_symbols
+                }
+            )
+            try:
+                rates = await exchange.fetch_funding_rates(symbols) if symbols else {}
+                for monitor, sides in requests:
+                    monitor.costs.apply_rates(monitor, sides, rates)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                for monitor, _ in requests:
+                    monitor.costs.errors += 1
+                print(f"Fetch funding rates error: {traceback.format_exc()}")
+            await asyncio.sleep(
+                min(monitor.costs.funding_interval for monitor, _ in requests)
+            )
+
+    def _count_error(self, exchange, key, name="errors_total"):
+        if self.metrics is not None:
+            self.metrics.inc(
+                name, (("exchange", exchange.name.lower()), ("stream", key[1]))
+            )
+
+    def _active(self, key, batch):
+        listeners = self.listeners[key]
+        if any(symbol in listeners for symbol in batch.symbols):
+            return True
+        self.watched[key].difference_update(batch.symbols)
+        batch.symbols.clear()
+        return False
+
+    def _suspend(self, key, symbols):
+        """批次中断：每个关注这些交易对的监控将相关组合移出排名，收到推送后各自恢复"""
+        listeners = self.listeners[key]
+        affected = defaultdict(list)
+        for symbol in symbols:
+            for listener in listeners.get(symbol, ()):
+                affected[listener].append(symbol)
+        for (monitor, index), monitor_symbols in affected.items():
+            monitor._suspend(index, monitor_symbols)
+
+    async def _supervise(self, exchange, key, batch, watch, handle):
+        """在 supervisor 下运行一个共享订阅批次"""
+
+        def on_error(e):
+            self._count_error(exchange, key)
+            print(f"Excpetion({exchange.id}): {str(e)}")
+
+        def on_down(reason):
+            self._suspend(key, batch.symbols)
+            if reason == "stall":
+                self._count_error(exchange, key, "stalls_total")
+
+        def on_up(gap):
+            self._count_error(exchange, key, "reconnects_total")
+            if self.metrics is not None:
+                self.metrics.observe(
+                    "batch_gap_ms",
+                    gap * 1e3,
+                    (("exchange", exchange.name.lower()), ("stream", key[1])),
+                )
+
+        try:
+            await self.supervisor.run(
+                batch,
+                watch,
+                handle,
+                active=lambda: self._active(key, batch),
+                on_error=on_error,
+                on_down=on_down,
+                on_up=on_up,
+                unwatch=lambda: release_symbols(exchange, key[1], batch.symbols),
+            )
+        except asyncio.CancelledError:
+            pass
+
+    async def sync_time(self, exchange):
+        key = exchange.name.lower()
+
+        def publish(estimate, now):
+            self.latencies[key] = estimate
+            for monitor in self.monitors[exchange.id]:
+                monitor.record_time_diff(exchange, estimate["time_diff"], now)
+
+        await self.clocks[key].run(exchange, publish)
+
+    async def watch_tickers(self, exchange, key, batch):
+        listeners = self.listeners[key]
+
+        def handle(tickers):
+            now = time.time() * 1e3
+            batch.observe(tickers)
+            updates = defaultdict(dict)
+            for symbol, ticker in tickers.items():
+                for listener in listeners.get(symbol, ()):
+                    updates[listener][symbol] = ticker
+            for (monitor, index), update in updates.items():
+                monitor.on_tickers(index, update, now)
+
+        await self._supervise(
+            exchange,
+            key,
+            batch,
+            lambda: exchange.watch_tickers(batch.symbols),
+            handle,
+        )
+
+    async def watch_order_book(self, exchange, key, batch):
+        listeners = self.listeners[key]
+        limit = key[2]
+
+        def handle(order_book):
+            now = time.time() * 1e3
+            batch.observe((order_book["symbol"],))
+            for monitor, index in listeners.get(order_book["symbol"], ()):
+                monitor.on_order_book(index, order_book, now)
+
+        await self._supervise(
+            exchange,
+            key,
+            batch,
+            lambda: exchange.watch_order_book_for_symbols(batch.symbols, limit=limit),
+            handle,
+        )
+
+    def stats(self):
+        """每个 (交易所, 数据流, 深度) 的订阅交易对数和关注者数"""
+        return {
+            key: {
+                "symbols": len(self.watched[key]),
+                "listeners": sum(len(entries) for entries in listeners.values()),
+            }
+            for key, listeners in self.listeners.items()
+        }
+
+    async def close(self):
+        tasks = (
+            self.watch_tasks
+            + list(self.sync_tasks.values())
+            + list(self.funding_tasks.values())
+        )
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for exchange in self.exchanges.values():
+            await exchange.close()
@@ -0,0 +1,63 @@
+import os
+import json
+import time
+import ccxt
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "seekopt", "markets"
+)
+
+
+class MarketCache:
+    """
+    交易所市场目录的本地缓存，按交易所保存 markets/currencies，
+    超过有效期、缓存格式或 ccxt 版本变化时失效
+    :param path: 缓存目录
+    :param ttl: 有效期（秒）
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_DIR, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+
+    def _file(self, exchange):
+        return os.path.join(self.path, f"{exchange.id}.json")
+
+    def read(self, exchange):
+        """读取有效的缓存，无缓存或已失效时返回 None"""
+        try:
+            with open(self._file(exchange), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            data.get("version") != CACHE_VERSION
+            or data.get("ccxt_version") != ccxt.__version__
+            or time.time() - data.get("created", 0) > self.ttl
+        ):
+            return None
+        return data
+
+    def load(self, exchange):
+        """从缓存恢复交易所市场，成功返回 True"""
+        data = self.read(exchange)
+        if data is None:
+            return False
+        exchange.set_markets(data["markets"], data["currencies"])
+        return True
+
+    def save(self, exchange):
+        os.makedirs(self.path, exist_ok=True)
+        data = {
+            "version": CACHE_VERSION,
+            "ccxt_version": ccxt.__version__,
+            "created": time.time(),
+            "markets": exchange.markets,
+            "currencies": exchange.currencies,
+        }
+        file = self._file(exchange)
+        tmp_file = f"{file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp_file, file)
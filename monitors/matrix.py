@@ -0,0 +1,393 @@
+import time
+import asyncio
+
+from monitors.ranking import RankingIndex
+from monitors.batching import BatchPlanner
+from monitors.clock import ClockEstimator
+from monitors.depth import NAN
+from monitors.supervisor import Supervisor
+from monitors.spread import (
+    MonitorLifecycle,
+    OrderbookSpreadMonitor,
+    create_exchange,
+    filter_markets,
+    parse_market,
+)
+
+
+def _rescan(values, top):
+    """重新找出最大和次大值的下标，NaN 表示该市场没有报价"""
+    first = second = -1
+    for i, value in enumerate(values):
+        if value != value:
+            continue
+        if first < 0 or value > values[first]:
+            first, second = i, first
+        elif second < 0 or value > values[second]:
+            second = i
+    top[0], top[1] = first, second
+
+
+def _update_top(values, top, venue, old):
+    """
+    市场 venue 的取值由 old 变为 values[venue] 后更新 top（最大和次大值的下标），
+    只有当前前两名变差时才需要扫描全部市场
+    """
+    value = values[venue]
+    first, second = top
+    if venue == first:
+        if value == value and (second < 0 or value >= values[second]):
+            return
+        _rescan(values, top)
+    elif venue == second:
+        if value != value or value < old:
+            _rescan(values, top)
+        elif value > values[first]:
+            top[0], top[1] = venue, first
+    elif value == value:
+        if first < 0 or value > values[first]:
+            top[0], top[1] = venue, first
+        elif second < 0 or value > values[second]:
+            top[1] = venue
+
+
+class SpreadMatrixMonitor(MonitorLifecycle):
+    """
+    多市场价差矩阵：任意数量的 exchange.type[.subtype] 市场，每个资产在每个市场保留一个
+    买一/卖一（ticker 模式为最新价）槽位，并增量维护所有市场中最高买价和最低卖价的前两名。
+    某个市场更新时只与其余市场的当前最优价比较，不遍历市场两两组合，
+    按资产给出最优的 (买入市场, 卖出市场) 组合及其价差
+    :param markets: 市场列表，至少两个
+    :param stream: "tickers" 或 "order_book"
+    :param batching: BatchPlanner 实例，决定订阅批次大小
+    :param supervisor: Supervisor 实例，订阅批次的重试退避和静默超时，
+                       批次中断时清空该市场在这些资产上的报价，不再参与最优组合
+    :param market_cache: MarketCache 实例，None 为不使用缓存
+    :param refresh_markets: 命中缓存时是否在后台刷新市场目录
+    :param metrics: Metrics 实例，记录延迟直方图和错误计数
+    :param passive_clock: 用行情时间戳跟踪时钟漂移，减少 fetch_time 请求
+    """
+
+    rank_keys = ("spread_pct", "spread")
+    empty_row = {
+        "pair_name": None,
+        "spread_pct": NAN,
+        "spread": NAN,
+        "buy_venue": None,
+        "sell_venue": None,
+        "buy_price": NAN,
+        "sell_price": NAN,
+        "buy_volume": NAN,
+        "sell_volume": NAN,
+        "venues": 0,
+        "elapsed_time": NAN,
+    }
+
+    def __init__(
+        self,
+        markets,
+        stream="order_book",
+        symbols=None,
+        quote_currency="USDT",
+        batching=None,
+        supervisor=None,
+        market_cache=None,
+        refresh_markets=True,
+        metrics=None,
+        passive_clock=False,
+    ):
+        if len(markets) < 2:
+            raise ValueError("Spread matrix requires at least two markets")
+        if len(set(markets)) != len(markets):
+            raise ValueError("Spread matrix markets must be distinct")
+        if stream not in ("tickers", "order_book"):
+            raise ValueError(f"Unsupported stream: {stream}")
+        self.created_at = time.time()
+        self.startup = {}
+        self.markets = list(markets)
+        self.stream = stream
+        self.venues = [parse_market(market) for market in self.markets]
+        self.symbols = symbols
+        self.quote_currency = None if symbols is not None else quote_currency
+        self.batching = batching or BatchPlanner()
+        self.batches = []
+        self.batch_tasks = {}
+        self.supervisor = supervisor or Supervisor()
+        self.market_cache = market_cache
+        self.refresh_markets = refresh_markets
+        self.refresh_tasks = []
+        self.metrics = metrics
+        self.store = None
+        self.conflator = None
+
+        # 交易所名称 -> 实例，同一交易所的多个市场共用
+        self.exchanges = {}
+        for exchange_name, _, _ in self.venues:
+            if exchange_name not in self.exchanges:
+                self.exchanges[exchange_name] = create_exchange(exchange_name)
+        self.venue_exchanges = [self.exchanges[name] for name, _, _ in self.venues]
+        self.latency_keys = [exchange.name.lower() for exchange in self.venue_exchanges]
+        self.latencies = {key: {} for key in self.latency_keys}
+        self.clocks = {
+            key: ClockEstimator(passive=passive_clock) for key in self.latencies
+        }
+
+        self.assets = []
+        # 市场下标 -> 交易对 -> 资产槽位
+        self.routes = [{} for _ in self.markets]
+        # 每个资产槽位按市场下标保存报价，卖价取负数，两侧都按最大值维护前两名
+        self.bids = []
+        self.neg_asks = []
+        self.bid_volumes = []
+        self.ask_volumes = []
+        self.elapsed = []
+        self.bid_tops = []
+        self.ask_tops = []
+        self.pair_rows = []
+        self.pair_data = {}
+        self.rankings = {key: RankingIndex(key) for key in self.rank_keys}
+        # 批次中断时直接清空该市场的报价，资产不会整体移出排名
+        self.suspended = {}
+        self.monitor_tasks = []
+        self.running = False
+
+    async def load_markets(self):
+        started = time.time()
+        await asyncio.gather(
+            *(
+                self._fetch_markets(exchange, name)
+                for name, exchange in self.exchanges.items()
+            )
+        )
+        listed = [
+            filter_markets(
+                self.venue_exchanges[venue].markets,
+                type_,
+                subtype,
+                self.quote_currency,
+                self.symbols,
+            )
+            for venue, (_, type_, subtype) in enumerate(self.venues)
+        ]
+        assets = {}
+        for venue, venue_markets in enumerate(listed):
+            for key, symbols in venue_markets.items():
+                # 同一市场有多个合约时取第一个
+                assets.setdefault(key, {})[venue] = sorted(symbols)[0]
+        self._build_slots(
+            {key: symbols for key, symbols in assets.items() if len(symbols) >= 2}
+        )
+        self.startup["load_markets"] = time.time() - started
+
+    def _build_slots(self, assets):
+        """
+        :param assets: (base, quote) -> {市场下标: 交易对}
+        """
+        size = len(self.markets)
+        for (base, quote), symbols in sorted(assets.items()):
+            slot = len(self.assets)
+            self.assets.append(f"{base}/{quote}")
+            for venue, symbol in symbols.items():
+                self.routes[venue][symbol] = slot
+            self.bids.append([NAN] * size)
+            self.neg_asks.append([NAN] * size)
+            self.bid_volumes.append([NAN] * size)
+            self.ask_volumes.append([NAN] * size)
+            self.elapsed.append([NAN] * size)
+            self.bid_tops.append([-1, -1])
+            self.ask_tops.append([-1, -1])
+            self.pair_rows.append(None)
+
+    def _quote(self, slot, venue, bid, ask, elapsed_time):
+        """
+        写入一个市场的报价并重新计算该资产的最优组合
+        :param bid: (价格, 数量)，为空时保留原值
+        :param ask: (价格, 数量)，为空时保留原值
+        """
+        if bid is not None:
+            bids = self.bids[slot]
+            old = bids[venue]
+            bids[venue] = NAN if bid[0] is None else bid[0]
+            self.bid_volumes[slot][venue] = NAN if bid[1] is None else bid[1]
+            _update_top(bids, self.bid_tops[slot], venue, old)
+        if ask is not None:
+            asks = self.neg_asks[slot]
+            old = asks[venue]
+            asks[venue] = NAN if ask[0] is None else -ask[0]
+            self.ask_volumes[slot][venue] = NAN if ask[1] is None else ask[1]
+            _update_top(asks, self.ask_tops[slot], venue, old)
+        self.elapsed[slot][venue] = elapsed_time
+        self.calculate_spread(slot)
+
+    def calculate_spread(self, slot):
+        bids, asks = self.bids[slot], self.neg_asks[slot]
+        bid_first, bid_second = self.bid_tops[slot]
+        ask_first, ask_second = self.ask_tops[slot]
+        sell = buy = -1
+        if bid_first >= 0 and ask_first >= 0:
+            if bid_first != ask_first:
+                sell, buy = bid_first, ask_first
+            else:
+                # 最高买价和最低卖价在同一市场时，取两个次优组合中较好的一个
+                best = -float("inf")
+                for sell_venue, buy_venue in (
+                    (bid_first, ask_second),
+                    (bid_second, ask_first),
+                ):
+                    if sell_venue < 0 or buy_venue < 0:
+                        continue
+                    spread_pct = (bids[sell_venue] + asks[buy_venue]) / -asks[buy_venue]
+                    if spread_pct > best:
+                        best, sell, buy = spread_pct, sell_venue, buy_venue
+
+        data = self.pair_rows[slot]
+        if data is None:
+            pair_name = self.assets[slot]
+            data = self.pair_rows[slot] = dict(self.empty_row, pair_name=pair_name)
+            self.pair_data[pair_name] = data
+        data["venues"] = sum(1 for value in bids if value == value)
+        if sell < 0:
+            data.update(
+                spread_pct=NAN,
+                spread=NAN,
+                buy_venue=None,
+                sell_venue=None,
+                buy_price=NAN,
+                sell_price=NAN,
+                buy_volume=NAN,
+                sell_volume=NAN,
+                elapsed_time=NAN,
+            )
+        else:
+            buy_price, sell_price = -asks[buy], bids[sell]
+            elapsed = self.elapsed[slot]
+            data["spread"] = sell_price - buy_price
+            data["spread_pct"] = (sell_price - buy_price) / buy_price
+            data["buy_venue"] = self.markets[buy]
+            data["sell_venue"] = self.markets[sell]
+            data["buy_price"] = buy_price
+            data["sell_price"] = sell_price
+            data["buy_volume"] = self.ask_volumes[slot][buy]
+            data["sell_volume"] = self.bid_volumes[slot][sell]
+            data["elapsed_time"] = max(elapsed[buy], elapsed[sell])
+        pair_name = data["pair_name"]
+        for key, ranking in self.rankings.items():
+            ranking.update(pair_name, data[key])
+
+    def _elapsed(self, venue, symbol, timestamp, now):
+        if timestamp is None:
+            return NAN
+        key = self.latency_keys[venue]
+        elapsed_time = now - (timestamp + self.latencies[key].get("time_diff", 0))
+        if self.metrics is not None:
+            self.metrics.delay(key, symbol, elapsed_time)
+        clock = self.clocks[key]
+        if clock.passive:
+            clock.observe(now, timestamp)
+        return elapsed_time
+
+    def process_ticker(self, symbol, ticker, venue, now):
+        slot = self.routes[venue].get(symbol)
+        if slot is None:
+            return
+        price = (ticker["last"], NAN)
+        elapsed_time = self._elapsed(venue, symbol, ticker["timestamp"], now)
+        self._quote(slot, venue, price, price, elapsed_time)
+
+    def process_order_book(self, order_book, venue, now):
+        symbol = order_book["symbol"]
+        slot = self.routes[venue].get(symbol)
+        if slot is None:
+            return
+        bids, asks = order_book["bids"], order_book["asks"]
+        elapsed_time = self._elapsed(venue, symbol, order_book["timestamp"], now)
+        self._quote(
+            slot,
+            venue,
+            bids[0][:2] if len(bids) else None,
+            asks[0][:2] if len(asks) else None,
+            elapsed_time,
+        )
+
+    def depth_limit(self, exchange):
+        if self.stream != "order_book":
+            return None
+        return OrderbookSpreadMonitor.support_depths.get(exchange.name.lower(), [None])[
+            0
+        ]
+
+    def _suspend(self, venue, symbols):
+        """
+        订阅批次中断：清空该市场在这些资产上的报价，最优组合改由其余市场给出，
+        收到下一次推送时重新写入
+        """
+        routes = self.routes[venue]
+        for symbol in symbols:
+            slot = routes.get(symbol)
+            if slot is not None:
+                self._quote(slot, venue, (None, None), (None, None), NAN)
+
+    def _report_error(self, venue, e):
+        print(f"Excpetion({self.markets[venue]}): {str(e)}")
+
+    async def monitor(self, venue, batch):
+        exchange = self._batch_exchange(batch)
+        if self.stream == "tickers":
+
+            def watch():
+                return exchange.watch_tickers(batch.symbols)
+
+            def handle(tickers):
+                now = time.time() * 1e3
+                for symbol, ticker in tickers.items():
+                    self.process_ticker(symbol, ticker, venue, now)
+                batch.observe(tickers)
+
+        else:
+            limit = self.depth_limit(exchange)
+
+            def watch():
+                return exchange.watch_order_book_for_symbols(batch.symbols, limit=limit)
+
+            def handle(order_book):
+                now = time.time() * 1e3
+                self.process_order_book(order_book, venue, now)
+                batch.observe((order_book["symbol"],))
+
+        await self._supervise(exchange, venue, batch, watch, handle)
+
+    async def sync_time(self, key, exchange):
+        def publish(estimate, now):
+            self.latencies[key] = estimate
+
+        await self.clocks[key].run(exchange, publish)
+
+    def start(self):
+        self.running = True
+        keys = {}
+        for key, exchange in zip(self.latency_keys, self.venue_exchanges):
+            keys.setdefault(key, exchange)
+        self.monitor_tasks = [
+            asyncio.create_task(self.sync_time(key, exchange))
+            for key, exchange in keys.items()
+        ]
+        for venue, exchange in enumerate(self.venue_exchanges):
+            for batch in self.batching.plan(
+                exchange.name.lower(),
+                self.markets[venue],
+                self.stream,
+                list(self.routes[venue]),
+            ):
+                self._start_batch(batch)
+        if self.batching.adaptive:
+            self.monitor_tasks.append(asyncio.create_task(self._rebalance_batches()))
+
+    def _index_exchange(self, index):
+        return self.venue_exchanges[self.markets.index(index)]
+
+    def _watch_batch(self, batch):
+        return self.monitor(self.markets.index(batch.index), batch)
+
+    async def _close_exchanges(self):
+        for exchange in self.exchanges.values():
+            await exchange.close()
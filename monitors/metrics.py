@@ -0,0 +1,207 @@
+import math
+import time
+import asyncio
+from array import array
+from collections import defaultdict
+
+from aiohttp import web
+
+# 对数分桶：每个 2 的幂区间再等分 SUB_BUCKETS 份，相对误差约 1/(2*SUB_BUCKETS)，
+# 覆盖约 0.001ms 到 4.6 小时，每个直方图占用固定内存
+SUB_BUCKETS = 8
+MIN_EXP = -10
+MAX_EXP = 24
+BUCKETS = (MAX_EXP - MIN_EXP) * SUB_BUCKETS
+MIN_VALUE = 2.0 ** (MIN_EXP - 1)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """HDR 风格的对数分桶直方图，记录毫秒值"""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value):
+        if value != value:
+            return
+        if value <= MIN_VALUE:
+            index = 0
+        else:
+            mantissa, exponent = math.frexp(value)
+            index = (exponent - MIN_EXP) * SUB_BUCKETS + int(
+                (mantissa - 0.5) * 2 * SUB_BUCKETS
+            )
+            if index >= BUCKETS:
+                index = BUCKETS - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @staticmethod
+    def upper_bound(index):
+        exponent, sub = divmod(index, SUB_BUCKETS)
+        return 2.0 ** (exponent + MIN_EXP) * (0.5 + (sub + 1) / (2 * SUB_BUCKETS))
+
+    def quantile(self, q):
+        """分位数（桶上界，不超过最大值），无数据时返回 nan"""
+        if not self.count:
+            return math.nan
+        target = max(1, math.ceil(self.count * q))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(max(self.upper_bound(index), self.min), self.max)
+        return self.max
+
+    def reset(self):
+        self.counts = array("Q", bytes(8 * BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for key, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Metrics:
+    """
+    进程内指标：直方图和计数器，可导出为 Prometheus 文本格式，多个监控可共享同一实例
+    :param per_symbol: 是否按交易对记录延迟直方图
+    """
+
+    def __init__(self, per_symbol=True):
+        self.per_symbol = per_symbol
+        # (name, labels) -> Histogram，labels 为 ((key, value), ...)
+        self.histograms = {}
+        self.counters = defaultdict(int)
+        self._delays = {}
+
+    def histogram(self, name, labels=()):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def observe(self, name, value, labels=()):
+        self.histogram(name, labels).record(value)
+
+    def inc(self, name, labels=(), value=1):
+        self.counters[name, labels] += value
+
+    def delay(self, exchange, symbol, value):
+        """记录交易所时间到本地接收的延迟，按交易所和交易对"""
+        histograms = self._delays.get((exchange, symbol))
+        if histograms is None:
+            histograms = self._delays[exchange, symbol] = (
+                self.histogram("exchange_delay_ms", (("exchange", exchange),)),
+                (
+                    self.histogram(
+                        "symbol_delay_ms", (("exchange", exchange), ("symbol", symbol))
+                    )
+                    if self.per_symbol
+                    else None
+                ),
+                ("updates_total", (("exchange", exchange),)),
+            )
+        exchange_histogram, symbol_histogram, counter = histograms
+        exchange_histogram.record(value)
+        if symbol_histogram is not None:
+            symbol_histogram.record(value)
+        self.counters[counter] += 1
+
+    def forget(self, exchange, symbol):
+        """交易对下架后释放按交易对的延迟直方图"""
+        if self._delays.pop((exchange, symbol), None) is not None:
+            self.histograms.pop(
+                ("symbol_delay_ms", (("exchange", exchange), ("symbol", symbol))), None
+            )
+
+    async def watch_event_loop(self, interval=0.1):
+        """按固定间隔休眠，记录实际唤醒的延后时间作为事件循环延迟"""
+        histogram = self.histogram("event_loop_lag_ms")
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            histogram.record((time.perf_counter() - started - interval) * 1e3)
+
+    def render(self, prefix="seekopt_"):
+        """Prometheus 文本格式，直方图导出为 summary"""
+        lines = []
+        typed = set()
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = prefix + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                lines.append(
+                    f"{metric}{_labels(labels + (('quantile', q),))} {value:.6g}"
+                )
+            lines.append(f"{metric}_sum{_labels(labels)} {histogram.total:.6g}")
+            lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = prefix + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """界面底栏使用的简要统计"""
+        parts = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name == "symbol_delay_ms" or not histogram.count:
+                continue
+            label = "/".join(str(value) for _, value in labels)
+            title = name[:-3] + (f"[{label}]" if label else "")
+            parts.append(
+                f"{title} p50={histogram.quantile(0.5):.2f} "
+                f"p99={histogram.quantile(0.99):.2f}ms"
+            )
+        errors = sum(
+            v for (name, _), v in self.counters.items() if name == "errors_total"
+        )
+        parts.append(f"errors={errors}")
+        return " | ".join(parts)
+
+
+async def serve_metrics(metrics, host="127.0.0.1", port=9108):
+    """启动本地 HTTP 服务，GET /metrics 返回 Prometheus 文本格式"""
+
+    async def handle(request):
+        return web.Response(
+            text=metrics.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
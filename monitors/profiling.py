@@ -0,0 +1,203 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+from monitors.metrics import Metrics
+
+# 被计时的监控方法，对应行情处理、价差计算和排序阶段
+MONITOR_STAGES = (
+    "process_ticker",
+    "process_order_book",
+    "calculate_spread",
+    "top",
+)
+
+
+class StackSampler:
+    """
+    采样式性能分析：后台线程按固定频率读取目标线程的调用栈，
+    汇总为 flamegraph.pl / speedscope 可读取的折叠栈格式
+    :param hz: 每秒采样次数
+    :param seconds: 采样窗口（秒），为空时持续到 stop
+    :param thread_id: 目标线程，默认为创建时的当前线程
+    """
+
+    def __init__(self, hz=100, seconds=None, thread_id=None):
+        self.interval = 1 / hz
+        self.seconds = seconds
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        deadline = None if self.seconds is None else time.time() + self.seconds
+        while not self.stopped.wait(self.interval):
+            if deadline is not None and time.time() >= deadline:
+                break
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                    f":{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            del frame
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def folded(self):
+        """每行一个调用栈，由根到叶以分号分隔，末尾为采样次数"""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def top_functions(self, n=15):
+        """按采样中位于栈顶的次数排序的函数"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+
+class Profiler:
+    """
+    内置性能分析：按阶段计时，并可在固定窗口内运行栈采样。
+    计时通过替换实例方法实现，未启用时没有任何开销；每 sample_every 次调用只计时一次，
+    以较低的采样率常驻生产环境
+    :param sample_every: 每 N 次调用计时一次
+    :param stack_seconds: 栈采样窗口（秒），0 为不采样
+    :param stack_hz: 栈采样频率
+    :param output: 退出时写入的文件前缀，生成 .txt 汇总和 .folded 折叠栈
+    :param metrics: Metrics 实例，阶段耗时直方图同时导出到 Prometheus
+    """
+
+    def __init__(
+        self,
+        sample_every=1,
+        stack_seconds=0,
+        stack_hz=100,
+        output=None,
+        metrics=None,
+    ):
+        self.sample_every = max(1, int(sample_every))
+        self.metrics = metrics or Metrics(per_symbol=False)
+        self.sampler = None
+        if stack_seconds:
+            self.sampler = StackSampler(stack_hz, stack_seconds)
+        self.output = output
+        self.stages = {}
+        self.wrapped = set()
+        self.started = time.time()
+
+    def wrap(self, stage, func):
+        """
+        返回计时的包装函数，同名阶段的耗时记入同一直方图
+        """
+        histogram = self.metrics.histogram("stage_ms", (("stage", stage),))
+        self.stages[stage] = histogram
+        every = self.sample_every
+        perf_counter = time.perf_counter
+        calls = [0]
+
+        def timed(*args, **kwargs):
+            calls[0] += 1
+            if calls[0] < every:
+                return func(*args, **kwargs)
+            calls[0] = 0
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record((perf_counter() - started) * 1e3)
+
+        timed.__wrapped__ = func
+        return timed
+
+    def patch(self, obj, name, stage=None):
+        """将对象的方法替换为计时版本，同一对象只替换一次"""
+        key = (id(obj), name)
+        if key in self.wrapped or not hasattr(obj, name):
+            return
+        self.wrapped.add(key)
+        setattr(obj, name, self.wrap(stage or name, getattr(obj, name)))
+
+    def instrument(self, monitor):
+        """
+        为监控挂载计时，需在 load_markets 之后、start 之前调用：
+        websocket 消息由 handle_message 解析（receive 阶段），订阅连接创建时绑定该方法
+        """
+        for name in MONITOR_STAGES:
+            if hasattr(type(monitor), name):
+                self.patch(monitor, name)
+        if monitor.store is not None:
+            self.patch(monitor.store, "recompute", "calculate_spread")
+        for exchange in monitor.exchanges.values():
+            self.patch(exchange, "handle_message", "receive")
+
+    def start(self):
+        if self.sampler is not None:
+            self.sampler.start()
+
+    def summary(self):
+        elapsed = time.time() - self.started
+        lines = [
+            f"Profile: {elapsed:.1f}s, 1 in {self.sample_every} calls timed",
+            "{:<18}{:>12}{:>10}{:>8}{:>10}{:>10}{:>10}".format(
+                "stage", "calls", "total_s", "cpu%", "mean_ms", "p99_ms", "max_ms"
+            ),
+        ]
+        for stage, histogram in sorted(
+            self.stages.items(), key=lambda item: -item[1].total
+        ):
+            if not histogram.count:
+                continue
+            total = histogram.total * self.sample_every / 1e3
+            lines.append(
+                "{:<18}{:>12}{:>10.2f}{:>8.1f}{:>10.3f}{:>10.3f}{:>10.3f}".format(
+                    stage,
+                    histogram.count * self.sample_every,
+                    total,
+                    total / elapsed * 100 if elapsed else 0,
+                    histogram.total / histogram.count,
+                    histogram.quantile(0.99),
+                    histogram.max,
+                )
+            )
+        if self.sampler is not None and self.sampler.samples:
+            lines.append(f"Stack samples: {self.sampler.samples}, top functions:")
+            for function, count in self.sampler.top_functions():
+                lines.append(f"{count / self.sampler.samples * 100:>6.1f}%  {function}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, stream=None):
+        """停止栈采样，输出汇总，并写入 output 指定的文件"""
+        if self.sampler is not None:
+            self.sampler.stop()
+        summary = self.summary()
+        (stream or sys.__stderr__).write(summary)
+        if self.output:
+            with open(f"{self.output}.txt", "w", encoding="utf-8") as f:
+                f.write(summary)
+            if self.sampler is not None:
+                with open(f"{self.output}.folded", "w", encoding="utf-8") as f:
+                    f.write(self.sampler.folded())
@@ -0,0 +1,194 @@
+import sys
+import json
+import math
+import time
+import asyncio
+
+from aiohttp import web, WSMsgType
+
+
+def _value(value):
+    # NaN/inf 不是合法 JSON，统一输出为 null
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class Subscriber:
+    """
+    单个订阅方的发送状态：首次发送完整快照，之后只发送相对自身上次发送的差量
+    :param send: 发送一行文本的协程函数
+    :param interval: 最短发送间隔（秒），期间的多帧合并为一次差量
+    """
+
+    def __init__(self, send, interval=1.0):
+        self.send = send
+        self.interval = interval
+        self.seq = 0
+        self.rows = None
+        self.order = None
+        self.messages = 0
+
+    def encode(self, frame):
+        """
+        :param frame: SpreadPublisher 当前帧
+        :return: 快照或差量消息，没有变化时返回 None
+        """
+        rows, order = frame["rows"], frame["order"]
+        if self.rows is None:
+            message = {
+                "type": "snapshot",
+                "seq": frame["seq"],
+                "ts": frame["ts"],
+                "key": frame["key"],
+                "fields": frame["fields"],
+                "rows": [
+                    dict(rows[pair_name], pair_name=pair_name) for pair_name in order
+                ],
+            }
+        else:
+            upsert = {}
+            for pair_name in order:
+                row, last = rows[pair_name], self.rows.get(pair_name)
+                if last is None:
+                    upsert[pair_name] = row
+                    continue
+                changed = {k: v for k, v in row.items() if last[k] != v}
+                if changed:
+                    upsert[pair_name] = changed
+            remove = [pair_name for pair_name in self.rows if pair_name not in rows]
+            if not upsert and not remove and order == self.order:
+                return None
+            message = {"type": "delta", "seq": frame["seq"], "ts": frame["ts"]}
+            if order != self.order:
+                message["order"] = order
+            if upsert:
+                message["upsert"] = upsert
+            if remove:
+                message["remove"] = remove
+        self.rows, self.order = rows, order
+        return json.dumps(message, separators=(",", ":"))
+
+
+class SpreadPublisher:
+    """
+    无界面模式下发布监控的 top-N 快照，一个监控实例可服务任意多个订阅方
+    :param monitor: TickerSpreadMonitor 或 OrderbookSpreadMonitor
+    :param top_n: 发布的交易对数量
+    :param sort_by: 排序字段
+    :param interval: 生成帧的间隔（秒）
+    """
+
+    def __init__(self, monitor, top_n=20, sort_by="spread_pct", interval=1.0):
+        self.monitor = monitor
+        self.top_n = top_n
+        self.sort_by = sort_by
+        self.interval = interval
+        self.fields = [k for k in monitor.empty_row if k != "pair_name"]
+        self.frame = None
+        self.seq = 0
+        self.subscribers = set()
+        self._updated = asyncio.Condition()
+
+    def build_frame(self):
+        rows = {}
+        order = []
+        for row in self.monitor.top(self.top_n, key=self.sort_by):
+            pair_name = row["pair_name"]
+            order.append(pair_name)
+            rows[pair_name] = {k: _value(row[k]) for k in self.fields}
+        self.seq += 1
+        return {
+            "seq": self.seq,
+            "ts": int(time.time() * 1e3),
+            "key": self.sort_by,
+            "fields": self.fields,
+            "order": order,
+            "rows": rows,
+        }
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            frame = self.build_frame()
+            async with self._updated:
+                self.frame = frame
+                self._updated.notify_all()
+
+    async def serve(self, subscriber):
+        """按订阅方的发送间隔推送最新帧，发送较慢时跳过中间帧"""
+        self.subscribers.add(subscriber)
+        try:
+            while True:
+                async with self._updated:
+                    await self._updated.wait_for(
+                        lambda: self.frame is not None
+                        and self.frame["seq"] > subscriber.seq
+                    )
+                    frame = self.frame
+                subscriber.seq = frame["seq"]
+                message = subscriber.encode(frame)
+                if message is not None:
+                    await subscriber.send(message)
+                    subscriber.messages += 1
+                await asyncio.sleep(subscriber.interval)
+        finally:
+            self.subscribers.discard(subscriber)
+
+
+async def publish_stdout(publisher, interval):
+    """以 NDJSON 格式将快照和差量写到标准输出"""
+
+    async def send(message):
+        sys.stdout.write(message + "\n")
+        sys.stdout.flush()
+
+    await publisher.serve(Subscriber(send, interval))
+
+
+async def serve_http(publisher, host="127.0.0.1", port=8765, min_interval=0.1):
+    """
+    启动本地 HTTP/WebSocket 服务：
+    GET /ws?interval=秒 订阅快照和差量，GET /snapshot 获取当前完整快照，
+    GET /batches 获取订阅批次统计
+    :param min_interval: 订阅方允许的最短发送间隔（秒）
+    """
+
+    async def websocket(request):
+        try:
+            interval = float(request.query.get("interval", publisher.interval))
+        except ValueError:
+            raise web.HTTPBadRequest(text="interval must be a number")
+        if not math.isfinite(interval):
+            # max(nan, min_interval) 为 nan，sleep(nan) 立即返回，会绕过限速
+            raise web.HTTPBadRequest(text="interval must be finite")
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        subscriber = Subscriber(ws.send_str, max(interval, min_interval))
+        task = asyncio.create_task(publisher.serve(subscriber))
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            task.cancel()
+        return ws
+
+    async def snapshot(request):
+        if publisher.frame is None:
+            raise web.HTTPServiceUnavailable(text="no data yet")
+        return web.json_response(text=Subscriber(None).encode(publisher.frame))
+
+    async def batches(request):
+        return web.json_response(publisher.monitor.batch_stats())
+
+    app = web.Application()
+    app.router.add_get("/ws", websocket)
+    app.router.add_get("/snapshot", snapshot)
+    app.router.add_get("/batches", batches)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    print(f"Serving spread snapshots on ws://{host}:{port}/ws", file=sys.stderr)
+    return runner
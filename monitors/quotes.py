@@ -0,0 +1,154 @@
+import math
+import asyncio
+
+from monitors.batching import Batch
+
+SIDES = ("a", "b")
+
+
+def parse_quote_rates(specs):
+    """
+    解析固定汇率 QUOTE=RATE，例如 USD=1
+    :return: 计价币 -> 汇率
+    """
+    rates = {}
+    for spec in specs:
+        quote, sep, rate = spec.partition("=")
+        try:
+            rates[quote.strip().upper()] = float(rate)
+        except ValueError:
+            raise ValueError(f"Invalid quote rate: {spec}") from None
+        if not sep or not quote.strip() or not rates[quote.strip().upper()] > 0:
+            raise ValueError(f"Invalid quote rate: {spec}")
+    return rates
+
+
+class QuoteConverter:
+    """
+    计价币换算：把 quotes 中的计价币按汇率折算为 reference，使不同计价币的市场可以一起比较。
+    汇率取自两侧交易所现货市场 QUOTE/REF（或 REF/QUOTE 取倒数）的买一卖一中间价，
+    每个交易所一个订阅任务，与行情在同一事件循环中更新；fixed 中的计价币使用固定汇率。
+    汇率未知时折算后的价格为 NaN，不参与排名；汇率订阅中断时汇率同样视为未知，收到下一次推送后恢复
+    :param reference: 参考计价币，即 quote_currency
+    :param quotes: 需要折算的其他计价币
+    :param fixed: 计价币 -> 固定汇率，例如 {"USD": 1.0}
+    """
+
+    def __init__(self, reference, quotes, fixed=None):
+        self.reference = reference
+        self.quotes = tuple(quote for quote in quotes if quote != reference)
+        self.fixed = dict(fixed or {})
+        self.rates = {quote: self.fixed.get(quote, math.nan) for quote in self.quotes}
+        # 来源 -> 非参考计价币的交易对 -> 计价币
+        self.symbol_quotes = {"a": {}, "b": {}}
+        # 计价币 -> 来源 -> 交易对列表，汇率更新时只处理这些交易对
+        self.quote_symbols = {quote: {"a": [], "b": []} for quote in self.quotes}
+        # 汇率市场：计价币 -> (交易所, 交易对, 是否取倒数)
+        self.sources = {}
+        self.batches = []
+        self.updates = 0
+
+    def build(self, monitor):
+        """按当前交易对映射登记需要折算的交易对，加载或刷新市场目录后调用"""
+        for quote in self.quotes:
+            self.quote_symbols[quote] = {"a": [], "b": []}
+        for index, exchange in (("a", monitor.exchange_a), ("b", monitor.exchange_b)):
+            markets = exchange.markets or {}
+            entries = {}
+            for symbol in monitor.symbol_map[index]:
+                quote = markets.get(symbol, {}).get("quote")
+                if quote in self.quote_symbols:
+                    entries[symbol] = quote
+                    self.quote_symbols[quote][index].append(symbol)
+            self.symbol_quotes[index] = entries
+
+    def find_sources(self, exchanges):
+        """
+        为没有固定汇率的计价币选择汇率市场，优先使用靠前的交易所
+        :return: 找不到汇率市场的计价币
+        """
+        missing = []
+        for quote in self.quotes:
+            if quote in self.fixed:
+                continue
+            for exchange in exchanges:
+                markets = exchange.markets or {}
+                direct = f"{quote}/{self.reference}"
+                inverse = f"{self.reference}/{quote}"
+                if markets.get(direct, {}).get("spot"):
+                    self.sources[quote] = (exchange, direct, False)
+                    break
+                if markets.get(inverse, {}).get("spot"):
+                    self.sources[quote] = (exchange, inverse, True)
+                    break
+            else:
+                missing.append(quote)
+        return missing
+
+    def rate_from_ticker(self, ticker, inverted):
+        bid, ask = ticker.get("bid"), ticker.get("ask")
+        price = (bid + ask) / 2 if bid and ask else ticker.get("last")
+        if not price:
+            return None
+        return 1 / price if inverted else price
+
+    def start(self, monitor):
+        """每个交易所一个汇率订阅任务，由 monitor 的 supervisor 负责重连"""
+        groups = {}
+        for quote, (exchange, symbol, inverted) in self.sources.items():
+            groups.setdefault(id(exchange), (exchange, {}))[1][symbol] = (
+                quote,
+                inverted,
+            )
+        tasks = []
+        for exchange, symbols in groups.values():
+            batch = Batch(exchange.name.lower(), "rates", "tickers", list(symbols))
+            self.batches.append(batch)
+            tasks.append(
+                asyncio.create_task(self.watch(monitor, exchange, batch, symbols))
+            )
+        return tasks
+
+    async def watch(self, monitor, exchange, batch, symbols):
+        def handle(tickers):
+            batch.observe(tickers)
+            for symbol, ticker in tickers.items():
+                entry = symbols.get(symbol)
+                if entry is None:
+                    continue
+                rate = self.rate_from_ticker(ticker, entry[1])
+                if rate is not None:
+                    monitor.update_quote_rate(entry[0], rate)
+
+        def on_error(e):
+            print(f"Quote rate error({exchange.name}): {str(e)}")
+
+        def on_down(reason):
+            # 不以中断前的汇率继续折算，相关交易对的价差为 NaN，直到汇率再次推送
+            for quote in {quote for quote, _ in symbols.values()}:
+                monitor.update_quote_rate(quote, math.nan)
+
+        try:
+            await monitor.supervisor.run(
+                batch,
+                lambda: exchange.watch_tickers(list(symbols)),
+                handle,
+                active=lambda: monitor.running,
+                on_error=on_error,
+                on_down=on_down,
+                on_up=lambda gap: None,
+                unwatch=None,
+            )
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self):
+        return {
+            "rates": dict(self.rates),
+            "updates": self.updates,
+            "sources": {
+                quote: f"{exchange.name}:{symbol}"
+                for quote, (exchange, symbol, _) in self.sources.items()
+            },
+            "feeds": [batch.stats() for batch in self.batches],
+        }
@@ -0,0 +1,64 @@
+from sortedcontainers import SortedList
+
+
+class RankingIndex:
+    """
+    增量排序索引，按指定字段从大到小维护交易对排名
+    :param key: 排序字段，如 spread_pct、spread
+    """
+
+    def __init__(self, key="spread_pct"):
+        self.key = key
+        self._entries = SortedList()
+        self._positions = {}
+        # watch 返回的集合，记录之后更新或移除过的交易对
+        self._watchers = []
+
+    def watch(self):
+        """
+        :return: 集合，之后每次 update 和 discard 的交易对名称都会加入其中（包括取值未变的更新），
+                 读者取出后自行清空
+        """
+        changes = set()
+        self._watchers.append(changes)
+        return changes
+
+    def unwatch(self, changes):
+        self._watchers = [
+            watcher for watcher in self._watchers if watcher is not changes
+        ]
+
+    def touch(self, pair_name):
+        """交易对的行有变化但排名不变，只通知 watch 的读者"""
+        for changes in self._watchers:
+            changes.add(pair_name)
+
+    def update(self, pair_name, value):
+        for changes in self._watchers:
+            changes.add(pair_name)
+        if value != value:  # NaN 排在最后，避免破坏有序性
+            value = float("-inf")
+        entry = (-value, pair_name)
+        old = self._positions.get(pair_name)
+        if old is not None:
+            if old == entry:
+                return
+            self._entries.remove(old)
+        self._entries.add(entry)
+        self._positions[pair_name] = entry
+
+    def discard(self, pair_name):
+        for changes in self._watchers:
+            changes.add(pair_name)
+        old = self._positions.pop(pair_name, None)
+        if old is not None:
+            self._entries.remove(old)
+
+    def top(self, n):
+        return [pair_name for _, pair_name in self._entries.islice(0, n)]
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, pair_name):
+        return pair_name in self._positions
@@ -0,0 +1,306 @@
+import os
+import io
+import json
+import math
+import mmap
+import time
+import struct
+import asyncio
+
+MAGIC = b"SKOPTLOG"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sHHI")
+# kind, side, symbol id, payload length, local receive time (ms)
+RECORD_HEADER = struct.Struct("<BBIId")
+TICKER = struct.Struct("<dd")
+ORDER_BOOK = struct.Struct("<dHH")
+LEVEL = struct.Struct("<dd")
+TIME_DIFF = struct.Struct("<d")
+
+KIND_META = 1
+KIND_SYMBOL = 2
+KIND_TICKER = 3
+KIND_ORDER_BOOK = 4
+KIND_TIME_DIFF = 5
+
+SIDES = ("a", "b")
+NAN = float("nan")
+
+
+def _float(value):
+    return NAN if value is None else value
+
+
+def _optional(value):
+    return None if value != value else value
+
+
+class StreamRecorder:
+    """
+    行情录制：将原始 ticker/订单簿更新和时钟偏移以紧凑的二进制格式追加写入日志，
+    日志可通过 StreamLog 以 mmap 方式读取
+    :param path: 日志文件路径，已存在时继续追加
+    :param flush_interval: 缓冲区最长写盘间隔（秒）
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.symbol_ids = {}
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with StreamLog(path) as log:
+                log.scan()
+                self.symbol_ids = {symbol: i for i, symbol in enumerate(log.symbols)}
+        self.file = open(path, "ab", buffering=1 << 20)
+        if not exists:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, 0))
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        self.records = 0
+
+    def _write(self, kind, index, symbol_id, payload, recv_time):
+        self.file.write(
+            RECORD_HEADER.pack(
+                kind, SIDES.index(index), symbol_id, len(payload), recv_time
+            )
+        )
+        self.file.write(payload)
+        self.records += 1
+        now = time.time()
+        if now - self.last_flush > self.flush_interval:
+            self.file.flush()
+            self.last_flush = now
+
+    def _symbol_id(self, index, symbol, recv_time):
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.symbol_ids[symbol] = len(self.symbol_ids)
+            self._write(KIND_SYMBOL, index, symbol_id, symbol.encode(), recv_time)
+        return symbol_id
+
+    def record_meta(self, meta):
+        """记录回放所需的元数据，如市场参数和交易对列表"""
+        self._write(KIND_META, "a", 0, json.dumps(meta).encode(), time.time() * 1e3)
+
+    def record_tickers(self, index, tickers, recv_time):
+        for symbol, ticker in tickers.items():
+            self._write(
+                KIND_TICKER,
+                index,
+                self._symbol_id(index, symbol, recv_time),
+                TICKER.pack(_float(ticker["last"]), _float(ticker["timestamp"])),
+                recv_time,
+            )
+
+    def record_order_book(self, index, order_book, recv_time):
+        bids, asks = order_book["bids"], order_book["asks"]
+        payload = io.BytesIO()
+        payload.write(
+            ORDER_BOOK.pack(_float(order_book["timestamp"]), len(bids), len(asks))
+        )
+        for level in bids:
+            payload.write(LEVEL.pack(level[0], level[1]))
+        for level in asks:
+            payload.write(LEVEL.pack(level[0], level[1]))
+        self._write(
+            KIND_ORDER_BOOK,
+            index,
+            self._symbol_id(index, order_book["symbol"], recv_time),
+            payload.getvalue(),
+            recv_time,
+        )
+
+    def record_time_diff(self, index, time_diff, recv_time):
+        self._write(KIND_TIME_DIFF, index, 0, TIME_DIFF.pack(time_diff), recv_time)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class StreamLog:
+    """
+    以 mmap 方式顺序读取录制日志，末尾不完整的记录会被忽略
+    :param path: 日志文件路径
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < FILE_HEADER.size:
+            # 空文件无法 mmap，文件头不完整时 unpack 只会抛出 struct.error
+            self.file.close()
+            raise ValueError(f"Not a stream recording or truncated: {path}")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, _ = FILE_HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Unsupported stream log: {path}")
+        self.symbols = []
+        self.meta = None
+
+    def scan(self):
+        """读取全部记录，加载符号表和元数据"""
+        for _ in self:
+            pass
+        return self
+
+    def __iter__(self):
+        """
+        :return: (kind, index, symbol, recv_time, data) 迭代器，
+                 data 为 ticker/订单簿字典、时钟偏移或元数据
+        """
+        buffer, size = self.buffer, len(self.buffer)
+        symbols = self.symbols = []
+        offset = FILE_HEADER.size
+        while offset + RECORD_HEADER.size <= size:
+            kind, side, symbol_id, length, recv_time = RECORD_HEADER.unpack_from(
+                buffer, offset
+            )
+            offset += RECORD_HEADER.size
+            if offset + length > size:
+                break
+            index = SIDES[side]
+
+            if kind == KIND_TICKER:
+                last, timestamp = TICKER.unpack_from(buffer, offset)
+                symbol = symbols[symbol_id]
+                data = {
+                    "symbol": symbol,
+                    "last": _optional(last),
+                    "timestamp": _optional(timestamp),
+                }
+                yield kind, index, symbol, recv_time, data
+            elif kind == KIND_ORDER_BOOK:
+                timestamp, n_bids, n_asks = ORDER_BOOK.unpack_from(buffer, offset)
+                start = offset + ORDER_BOOK.size
+                end = start + LEVEL.size * (n_bids + n_asks)
+                levels = [list(level) for level in LEVEL.iter_unpack(buffer[start:end])]
+                symbol = symbols[symbol_id]
+                data = {
+                    "symbol": symbol,
+                    "timestamp": _optional(timestamp),
+                    "bids": levels[:n_bids],
+                    "asks": levels[n_bids:],
+                }
+                yield kind, index, symbol, recv_time, data
+            elif kind == KIND_TIME_DIFF:
+                yield kind, index, None, recv_time, TIME_DIFF.unpack_from(
+                    buffer, offset
+                )[0]
+            elif kind == KIND_SYMBOL:
+                symbols.append(bytes(buffer[offset : offset + length]).decode())
+            elif kind == KIND_META:
+                self.meta = json.loads(bytes(buffer[offset : offset + length]))
+                yield kind, index, None, recv_time, self.meta
+            offset += length
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class StreamReplayer:
+    """
+    将录制日志回放到监控的 process_ticker/process_order_book，
+    使用录制时的接收时间和时钟偏移，延迟列与录制时一致
+    :param path: 日志文件路径
+    :param speed: 回放倍速，1 为原速，inf 为不限速
+    """
+
+    def __init__(self, path, speed=1.0):
+        if not speed > 0:
+            raise ValueError(f"Replay speed must be positive: {speed}")
+        self.path = path
+        self.speed = speed
+        self.records = 0
+        self.elapsed = 0
+
+    def read_meta(self):
+        """日志开头的元数据：监控类型、两侧市场和交易对列表"""
+        with StreamLog(self.path) as log:
+            meta = next((data for kind, *_, data in log if kind == KIND_META), None)
+        if meta is None:
+            raise ValueError(f"Stream log has no pair list: {self.path}")
+        return meta
+
+    def check_monitor(self, monitor_cls):
+        """日志须由同类监控录制，否则 ticker 和订单簿记录无法处理"""
+        recorded = self.read_meta().get("monitor")
+        if recorded is not None and recorded != monitor_cls.__name__:
+            raise ValueError(
+                f"Stream log was recorded by {recorded}, "
+                f"cannot replay into {monitor_cls.__name__}"
+            )
+
+    def load_routing(self, monitor):
+        """使用日志中的交易对列表构建路由，回放无需加载交易所市场"""
+        self.check_monitor(type(monitor))
+        meta = self.read_meta()
+        monitor.pairs = meta["pairs"]
+        monitor.symbol_map = monitor._build_symbol_map(monitor.pairs)
+        monitor._compile_routing()
+
+    async def run(self, monitor):
+        time_diffs = {"a": 0, "b": 0}
+        exchanges = {"a": "a", "b": "b"}
+        started = time.perf_counter()
+        first_recv_time = None
+        batch_time = None
+        conflate_task = None
+        # 每处理 1000 条记录至少让出一次事件循环，与批次大小无关
+        since_yield = 0
+        if monitor.conflator is not None and monitor.conflator.window:
+            conflate_task = asyncio.create_task(monitor.conflator.run())
+
+        log = StreamLog(self.path)
+        try:
+            for kind, index, symbol, recv_time, data in log:
+                if recv_time != batch_time:
+                    # 同一批次的记录共用接收时间，批次结束后统一计算
+                    if batch_time is not None:
+                        monitor._batch_done()
+                    batch_time = recv_time
+                    if first_recv_time is None:
+                        first_recv_time = recv_time
+                    if not math.isinf(self.speed):
+                        delay = (recv_time - first_recv_time) / 1e3 / self.speed - (
+                            time.perf_counter() - started
+                        )
+                        since_yield = 0
+                        await asyncio.sleep(max(delay, 0))
+                if since_yield >= 1000:
+                    # 批次很大时在批次中途让出，未完成的批次在结束时统一计算
+                    since_yield = 0
+                    await asyncio.sleep(0)
+
+                if kind == KIND_TICKER:
+                    monitor.process_ticker(
+                        symbol, data, index, time_diffs[index], recv_time
+                    )
+                elif kind == KIND_ORDER_BOOK:
+                    monitor.process_order_book(
+                        data, index, time_diffs[index], recv_time
+                    )
+                elif kind == KIND_TIME_DIFF:
+                    # 与 latencies 一致，同名交易所的两侧共用时钟偏移
+                    for side, exchange_name in exchanges.items():
+                        if exchange_name == exchanges[index]:
+                            time_diffs[side] = data
+                elif kind == KIND_META:
+                    exchanges = {
+                        side: data[f"market_{side}"].split(".")[0] for side in SIDES
+                    }
+                self.records += 1
+                since_yield += 1
+            monitor._batch_done()
+        finally:
+            log.close()
+            if conflate_task is not None:
+                conflate_task.cancel()
+            self.elapsed = time.perf_counter() - started
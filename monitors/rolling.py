@@ -0,0 +1,195 @@
+import math
+import time
+from array import array
+from collections import deque
+
+NAN = float("nan")
+
+
+class RollingWindow:
+    """
+    单个交易对的滚动窗口，值和时间保存在定长环形缓冲区中，
+    均值、标准差、最小/最大值、EWMA 均为每次更新 O(1)（最小/最大值为均摊 O(1)）
+    :param size: 窗口最多保留的样本数，同时决定内存占用
+    :param seconds: 时间窗口（秒），为空时只按样本数
+    :param alpha: EWMA 系数
+    """
+
+    __slots__ = (
+        "size",
+        "seconds",
+        "alpha",
+        "values",
+        "times",
+        "head",
+        "count",
+        "shift",
+        "total",
+        "total_sq",
+        "evicted",
+        "mins",
+        "maxs",
+        "ewma",
+    )
+
+    def __init__(self, size, seconds=None, alpha=0.1):
+        self.size = size
+        self.seconds = seconds
+        self.alpha = alpha
+        self.values = array("d", bytes(8 * size))
+        self.times = array("d", bytes(8 * size))
+        # head 为下一个写入的序号，窗口内为 [head - count, head)
+        self.head = 0
+        self.count = 0
+        # 以第一个样本为参考点累加，减小方差计算的抵消误差
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.evicted = 0
+        # 单调队列，保存窗口内可能成为最小/最大值的样本序号
+        self.mins = deque(maxlen=size)
+        self.maxs = deque(maxlen=size)
+        self.ewma = NAN
+
+    def _evict(self):
+        seq = self.head - self.count
+        value = self.values[seq % self.size] - self.shift
+        self.total -= value
+        self.total_sq -= value * value
+        self.count -= 1
+        if self.mins and self.mins[0] == seq:
+            self.mins.popleft()
+        if self.maxs and self.maxs[0] == seq:
+            self.maxs.popleft()
+        self.evicted += 1
+        if self.evicted >= self.size:
+            self._resum()
+
+    def _resum(self):
+        """每淘汰 size 个样本重新累加一次，消除累计的浮点误差，均摊 O(1)"""
+        self.evicted = 0
+        if not self.count:
+            self.shift = None
+            self.total = self.total_sq = 0.0
+            return
+        size, values = self.size, self.values
+        start = self.head - self.count
+        self.shift = values[start % size]
+        total = total_sq = 0.0
+        for seq in range(start, self.head):
+            value = values[seq % size] - self.shift
+            total += value
+            total_sq += value * value
+        self.total, self.total_sq = total, total_sq
+
+    def update(self, value, now):
+        if value != value:
+            return
+        if self.count == self.size:
+            self._evict()
+        if self.seconds is not None:
+            cutoff = now - self.seconds
+            while (
+                self.count and self.times[(self.head - self.count) % self.size] < cutoff
+            ):
+                self._evict()
+        if self.shift is None:
+            self.shift = value
+
+        seq = self.head
+        index = seq % self.size
+        self.values[index] = value
+        self.times[index] = now
+        self.head += 1
+        self.count += 1
+        shifted = value - self.shift
+        self.total += shifted
+        self.total_sq += shifted * shifted
+
+        values, size = self.values, self.size
+        mins = self.mins
+        while mins and values[mins[-1] % size] >= value:
+            mins.pop()
+        mins.append(seq)
+        maxs = self.maxs
+        while maxs and values[maxs[-1] % size] <= value:
+            maxs.pop()
+        maxs.append(seq)
+
+        if self.ewma != self.ewma:
+            self.ewma = value
+        else:
+            self.ewma += self.alpha * (value - self.ewma)
+
+    @property
+    def mean(self):
+        if not self.count:
+            return NAN
+        return self.shift + self.total / self.count
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return NAN
+        mean = self.total / self.count
+        variance = (self.total_sq - self.count * mean * mean) / (self.count - 1)
+        return math.sqrt(variance) if variance > 0 else 0.0
+
+    @property
+    def min(self):
+        return self.values[self.mins[0] % self.size] if self.count else NAN
+
+    @property
+    def max(self):
+        return self.values[self.maxs[0] % self.size] if self.count else NAN
+
+
+class RollingStats:
+    """
+    按槽位保存每个交易对的 spread_pct 滚动窗口，并把统计结果写回行数据，
+    其中 spread_z 为最新价差相对窗口均值的 z 分数，可用于排序
+    :param size: 每个交易对窗口的样本数上限，每个交易对约占 16 * size 字节
+    :param seconds: 时间窗口（秒），为空时只按样本数
+    :param alpha: EWMA 系数，默认 2 / (size + 1)
+    :param min_samples: 计算 z 分数所需的最少样本数
+    """
+
+    rank_keys = ("spread_z",)
+    row = {
+        "spread_mean": NAN,
+        "spread_std": NAN,
+        "spread_min": NAN,
+        "spread_max": NAN,
+        "spread_ewma": NAN,
+        "spread_z": NAN,
+    }
+
+    def __init__(self, size=256, seconds=None, alpha=None, min_samples=10):
+        if size < 2:
+            raise ValueError("Rolling window size must be at least 2")
+        self.size = size
+        self.seconds = seconds
+        self.alpha = 2 / (size + 1) if alpha is None else alpha
+        self.min_samples = min_samples
+        self.windows = {}
+
+    def update(self, slot, data, now=None):
+        window = self.windows.get(slot)
+        if window is None:
+            window = self.windows[slot] = RollingWindow(
+                self.size, self.seconds, self.alpha
+            )
+        value = data["spread_pct"]
+        window.update(value, time.time() if now is None else now)
+
+        mean, std = window.mean, window.std
+        data["spread_mean"] = mean
+        data["spread_std"] = std
+        data["spread_min"] = window.min
+        data["spread_max"] = window.max
+        data["spread_ewma"] = window.ewma
+        data["spread_z"] = (
+            (value - mean) / std
+            if window.count >= self.min_samples and std > 0
+            else NAN
+        )
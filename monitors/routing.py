@@ -0,0 +1,76 @@
+from types import MappingProxyType
+
+
+class RoutingTable:
+    """
+    编译后的不可变路由表：交易所符号 -> 整数交易对槽位元组
+    :param symbol_map: _build_symbol_map 生成的映射
+    :param previous: 上一版路由表，仍存在的交易对保留原槽位，已移除交易对的槽位
+                     优先分配给新交易对，空闲槽位的 pair_names 为 None
+    """
+
+    __slots__ = ("pair_names", "slots", "routes", "pair_symbols")
+
+    def __init__(self, symbol_map, previous=None):
+        # 交易对 -> [A 侧符号, B 侧符号]
+        symbols = {}
+        for i, index in enumerate(("a", "b")):
+            for symbol, entry in symbol_map[index].items():
+                for pair_name in entry["pair_names"]:
+                    symbols.setdefault(pair_name, [None, None])[i] = symbol
+
+        if previous is None:
+            pair_names = list(symbols)
+        else:
+            pair_names = [
+                pair_name if pair_name in symbols else None
+                for pair_name in previous.pair_names
+            ]
+            free = iter([slot for slot, name in enumerate(pair_names) if name is None])
+            for pair_name in symbols:
+                if pair_name in previous.slots:
+                    continue
+                slot = next(free, None)
+                if slot is None:
+                    pair_names.append(pair_name)
+                else:
+                    pair_names[slot] = pair_name
+
+        self.pair_names = tuple(pair_names)
+        self.slots = MappingProxyType(
+            {
+                pair_name: slot
+                for slot, pair_name in enumerate(self.pair_names)
+                if pair_name is not None
+            }
+        )
+        self.pair_symbols = tuple(
+            None if pair_name is None else tuple(symbols[pair_name])
+            for pair_name in self.pair_names
+        )
+        self.routes = MappingProxyType(
+            {
+                index: MappingProxyType(
+                    {
+                        symbol: tuple(
+                            self.slots[pair_name] for pair_name in entry["pair_names"]
+                        )
+                        for symbol, entry in symbol_map[index].items()
+                    }
+                )
+                for index in ("a", "b")
+            }
+        )
+
+    def __len__(self):
+        return len(self.pair_names)
+
+
+def side_fields(*names):
+    """
+    预先解析每一侧的字段名，热路径中不再拼接字符串
+    :return: {"a": ("price_a", ...), "b": ("price_b", ...)}
+    """
+    return MappingProxyType(
+        {index: tuple(f"{name}_{index}" for name in names) for index in ("a", "b")}
+    )
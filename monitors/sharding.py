@@ -0,0 +1,400 @@
+import sys
+import time
+import struct
+import asyncio
+import multiprocessing
+from collections import deque
+from multiprocessing import shared_memory, resource_tracker
+
+from monitors.batching import Batch, release_symbols
+from monitors.spread import create_exchange, exchange_factories
+
+# 写入位置、读取位置（单调递增的记录序号）
+RING_HEADER = struct.Struct("<QQ")
+# kind, symbol id, 本地接收时间（毫秒）, 交易所时间戳, 四个价格/数量字段
+UPDATE = struct.Struct("<B3xIdddddd")
+
+KIND_TICKER = 1
+KIND_ORDER_BOOK = 2
+# 子进程内订阅批次的中断和恢复标记：中断为批次内每个交易对一条记录，
+# f0 为 1 表示静默超时（否则为出错），f1 为 1 表示批次的第一条；恢复为一条记录，f0 为中断时长（秒）
+KIND_DOWN = 3
+KIND_UP = 4
+NAN = float("nan")
+
+
+class UpdateRing:
+    """
+    共享内存中的单生产者单消费者环形缓冲区，保存定长的盘口更新记录
+    :param name: 共享内存名称，为空时新建
+    :param capacity: 记录容量，新建时使用
+    """
+
+    def __init__(self, name=None, capacity=1 << 16):
+        if name is None:
+            size = RING_HEADER.size + UPDATE.size * capacity
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            RING_HEADER.pack_into(self.shm.buf, 0, 0, 0)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.buffer = self.shm.buf
+        self.write_pos, self.read_pos = RING_HEADER.unpack_from(self.buffer, 0)
+
+    def put(self, kind, symbol_id, recv_time, timestamp, f0, f1=NAN, f2=NAN, f3=NAN):
+        """写入一条记录，缓冲区已满时返回 False"""
+        if self.write_pos - self.read_pos >= self.capacity:
+            self.read_pos = RING_HEADER.unpack_from(self.buffer, 0)[1]
+            if self.write_pos - self.read_pos >= self.capacity:
+                return False
+        offset = RING_HEADER.size + UPDATE.size * (self.write_pos % self.capacity)
+        UPDATE.pack_into(
+            self.buffer, offset, kind, symbol_id, recv_time, timestamp, f0, f1, f2, f3
+        )
+        # 记录写完后再发布写入位置
+        self.write_pos += 1
+        struct.pack_into("<Q", self.buffer, 0, self.write_pos)
+        return True
+
+    def drain(self, limit=4096):
+        """读取最多 limit 条记录"""
+        write_pos = RING_HEADER.unpack_from(self.buffer, 0)[0]
+        count = min(write_pos - self.read_pos, limit)
+        if count <= 0:
+            return []
+        start = self.read_pos % self.capacity
+        end = min(start + count, self.capacity)
+        base = RING_HEADER.size
+        records = list(
+            UPDATE.iter_unpack(
+                self.buffer[base + start * UPDATE.size : base + end * UPDATE.size]
+            )
+        )
+        if end - start < count:
+            # 跨过缓冲区末尾
+            records.extend(
+                UPDATE.iter_unpack(
+                    self.buffer[base : base + (count - (end - start)) * UPDATE.size]
+                )
+            )
+        self.read_pos += count
+        struct.pack_into("<Q", self.buffer, 8, self.read_pos)
+        return records
+
+    def close(self):
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _float(value):
+    return NAN if value is None else value
+
+
+def _optional(value):
+    return None if value != value else value
+
+
+async def _run_feed(exchange, stream, symbols, limit, ring, batch_size, supervisor):
+    symbol_ids = {symbol: i for i, symbol in enumerate(symbols)}
+    # 缓冲区已满时暂存的记录，下一次订阅前按顺序写入
+    pending = deque()
+
+    def emit(*record):
+        if pending or not ring.put(*record):
+            pending.append(record)
+
+    async def flush():
+        while pending:
+            if ring.put(*pending[0]):
+                pending.popleft()
+            else:
+                await asyncio.sleep(0.001)
+
+    def handle_tickers(tickers):
+        now = time.time() * 1e3
+        for symbol, ticker in tickers.items():
+            symbol_id = symbol_ids.get(symbol)
+            if symbol_id is not None:
+                emit(
+                    KIND_TICKER,
+                    symbol_id,
+                    now,
+                    _float(ticker["timestamp"]),
+                    _float(ticker["last"]),
+                )
+
+    def handle_order_book(order_book):
+        symbol_id = symbol_ids.get(order_book["symbol"])
+        if symbol_id is None:
+            return
+        now = time.time() * 1e3
+        bids, asks = order_book["bids"], order_book["asks"]
+        bid = bids[0] if len(bids) else (NAN, NAN)
+        ask = asks[0] if len(asks) else (NAN, NAN)
+        emit(
+            KIND_ORDER_BOOK,
+            symbol_id,
+            now,
+            _float(order_book["timestamp"]),
+            bid[0],
+            bid[1],
+            ask[0],
+            ask[1],
+        )
+
+    async def supervise(batch):
+        if stream == "tickers":
+            method, handle = exchange.watch_tickers, handle_tickers
+            kwargs = {}
+        else:
+            method, handle = exchange.watch_order_book_for_symbols, handle_order_book
+            kwargs = {"limit": limit}
+
+        async def watch():
+            await flush()
+            return await method(batch.symbols, **kwargs)
+
+        def on_down(reason):
+            now = time.time() * 1e3
+            for i, symbol in enumerate(batch.symbols):
+                emit(
+                    KIND_DOWN,
+                    symbol_ids[symbol],
+                    now,
+                    NAN,
+                    float(reason == "stall"),
+                    float(i == 0),
+                )
+
+        await supervisor.run(
+            batch,
+            watch,
+            handle,
+            active=lambda: True,
+            on_error=lambda e: print(f"Excpetion(worker {exchange.id}): {str(e)}"),
+            on_down=on_down,
+            on_up=lambda gap: emit(KIND_UP, 0, time.time() * 1e3, NAN, gap),
+            unwatch=lambda: release_symbols(exchange, stream, batch.symbols),
+        )
+
+    try:
+        await asyncio.gather(
+            *[
+                supervise(Batch(exchange.id, None, stream, symbols[i : i + batch_size]))
+                for i in range(0, len(symbols), batch_size)
+            ]
+        )
+    finally:
+        await exchange.close()
+
+
+def feed_worker(
+    exchange_name,
+    factory,
+    markets,
+    currencies,
+    stream,
+    symbols,
+    limit,
+    ring_name,
+    capacity,
+    batch_size,
+    supervisor,
+):
+    """
+    子进程入口：订阅分配到的交易对，将归一化的盘口更新写入共享内存
+    :param factory: 自定义交易所工厂（需可 pickle），None 时使用 ccxt.pro
+    :param markets: 主进程已加载的市场目录，子进程无需重新加载
+    :param supervisor: 主进程监控的 Supervisor，批次中断和恢复以标记记录写入共享内存
+    """
+    if factory is not None:
+        exchange_factories[exchange_name] = factory
+    exchange = create_exchange(exchange_name)
+    exchange.set_markets(markets, currencies)
+    ring = UpdateRing(ring_name, capacity)
+    try:
+        asyncio.run(
+            _run_feed(exchange, stream, symbols, limit, ring, batch_size, supervisor)
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+class ShardedFeed:
+    """
+    多进程行情接入：每侧交易对按 workers 分片到子进程订阅，
+    主进程只从共享内存读取盘口更新、路由并计算价差。
+    接收时间在子进程记录，延迟列不含主进程的排队时间
+    :param monitor: TickerSpreadMonitor 或 OrderbookSpreadMonitor
+    :param workers: 每侧的子进程数量
+    :param capacity: 每个环形缓冲区的记录容量
+    :param batch_size: 子进程内每个订阅任务的交易对数量，None 时由监控的 BatchPlanner 决定
+    :param poll_interval: 无数据时的轮询间隔（秒）
+    """
+
+    def __init__(
+        self, monitor, workers=1, capacity=1 << 16, batch_size=None, poll_interval=0.001
+    ):
+        self.monitor = monitor
+        self.workers = workers
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        # (index, symbols, ring, process)
+        self.shards = []
+        self.records = 0
+        # 主进程处理记录时的异常数，出错的记录被跳过
+        self.errors = 0
+        self.task = None
+
+    def start(self):
+        monitor = self.monitor
+        context = multiprocessing.get_context("spawn")
+        # textual 运行时替换了 sys.stderr，资源跟踪进程需继承原始的标准错误
+        stderr, sys.stderr = sys.stderr, sys.__stderr__
+        try:
+            resource_tracker.ensure_running()
+        finally:
+            sys.stderr = stderr
+        for exchange, name, index in (
+            (monitor.exchange_a, monitor.exchange_a_name, "a"),
+            (monitor.exchange_b, monitor.exchange_b_name, "b"),
+        ):
+            symbols = list(monitor.symbol_map[index])
+            batch_size = self.batch_size or monitor.batching.size(
+                exchange.name.lower(), monitor.stream
+            )
+            for i in range(self.workers):
+                shard = symbols[i :: self.workers]
+                if not shard:
+                    continue
+                ring = UpdateRing(capacity=self.capacity)
+                process = context.Process(
+                    target=feed_worker,
+                    args=(
+                        name,
+                        exchange_factories.get(name),
+                        exchange.markets,
+                        exchange.currencies,
+                        monitor.stream,
+                        shard,
+                        monitor.depth_limit(exchange),
+                        ring.name,
+                        self.capacity,
+                        batch_size,
+                        monitor.supervisor,
+                    ),
+                    daemon=True,
+                )
+                try:
+                    process.start()
+                except BaseException:
+                    ring.close()
+                    raise
+                self.shards.append((index, shard, ring, process))
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            received = 0
+            for index, symbols, ring, _ in self.shards:
+                records = ring.drain()
+                if not records:
+                    continue
+                received += len(records)
+                self.dispatch(index, symbols, records)
+            self.records += received
+            await asyncio.sleep(0 if received else self.poll_interval)
+
+    def _deliver(self, index, method, *args):
+        """把记录交给监控，异常计数并记录后继续，不中断读取所有分片的任务"""
+        try:
+            method(index, *args)
+        except Exception as e:
+            self.errors += 1
+            self.monitor._count_error(index)
+            self.monitor._report_error(index, e)
+
+    def _mark(self, index, symbols, kind, symbol_id, f0, f1):
+        """处理子进程写入的批次中断/恢复标记"""
+        monitor = self.monitor
+        if kind == KIND_UP:
+            monitor._batch_up(index, f0)
+        elif f1:
+            # 中断记录的第一条同时计入静默超时次数
+            monitor._batch_down(index, [symbols[symbol_id]], "stall" if f0 else "error")
+        else:
+            monitor._suspend(index, [symbols[symbol_id]])
+
+    def dispatch(self, index, symbols, records):
+        monitor = self.monitor
+        if monitor.stream == "tickers":
+            # 同一次推送的记录共用接收时间，按批次交给监控
+            tickers, batch_time = {}, None
+            for kind, symbol_id, recv_time, timestamp, last, f1, *_ in records:
+                if tickers and (kind != KIND_TICKER or recv_time != batch_time):
+                    self._deliver(index, monitor.on_tickers, tickers, batch_time)
+                    tickers = {}
+                if kind != KIND_TICKER:
+                    self._deliver(index, self._mark, symbols, kind, symbol_id, last, f1)
+                    batch_time = None
+                    continue
+                batch_time = recv_time
+                symbol = symbols[symbol_id]
+                tickers[symbol] = {
+                    "symbol": symbol,
+                    "timestamp": _optional(timestamp),
+                    "last": _optional(last),
+                }
+            if tickers:
+                self._deliver(index, monitor.on_tickers, tickers, batch_time)
+            return
+
+        for kind, symbol_id, recv_time, timestamp, *level in records:
+            bid_price, bid_volume, ask_price, ask_volume = level
+            if kind != KIND_ORDER_BOOK:
+                self._deliver(
+                    index, self._mark, symbols, kind, symbol_id, bid_price, bid_volume
+                )
+                continue
+            self._deliver(
+                index,
+                monitor.on_order_book,
+                {
+                    "symbol": symbols[symbol_id],
+                    "timestamp": _optional(timestamp),
+                    "bids": [] if bid_price != bid_price else [[bid_price, bid_volume]],
+                    "asks": [] if ask_price != ask_price else [[ask_price, ask_volume]],
+                },
+                recv_time,
+            )
+
+    def stats(self):
+        return [
+            {
+                "index": index,
+                "symbols": len(symbols),
+                "pid": process.pid,
+                "alive": process.is_alive(),
+                "backlog": RING_HEADER.unpack_from(ring.buffer, 0)[0] - ring.read_pos,
+            }
+            for index, symbols, ring, process in self.shards
+        ]
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        for _, _, ring, process in self.shards:
+            process.terminate()
+        for _, _, ring, process in self.shards:
+            await asyncio.to_thread(process.join, 5)
+            ring.close()
+        self.shards = []
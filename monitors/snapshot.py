@@ -0,0 +1,243 @@
+import time
+import asyncio
+import operator
+
+
+class Snapshot:
+    """
+    某一时刻全部交易对的不可变副本，每行为按 fields 顺序取值的元组。
+    发布后不再修改，界面可在任意时刻读取，不与行情处理竞争；
+    排序和筛选结果按 (字段, 方向, 关键字) 缓存在快照上，翻页时不重复排序。
+    ranked 为发布时从监控排名索引取出的前若干行，默认排序（降序、无筛选）落在其中的页不排序
+    """
+
+    __slots__ = ("seq", "ts", "fields", "rows", "positions", "orders", "ranked")
+
+    def __init__(self, seq, ts, fields, rows, ranked=None):
+        self.seq = seq
+        self.ts = ts
+        self.fields = fields
+        self.rows = rows
+        self.positions = {field: i for i, field in enumerate(fields)}
+        self.orders = {}
+        self.ranked = ranked or {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def order(self, key, descending=True, query=""):
+        """
+        按字段排序并按交易对名称筛选后的行号，NaN 和缺失值排在最后
+        :param query: 交易对名称包含的关键字，不区分大小写
+        """
+        cache_key = (key, descending, query)
+        order = self.orders.get(cache_key)
+        if order is not None:
+            return order
+        if key not in self.positions:
+            # 尚无数据的快照只有 pair_name 一列
+            return []
+        rows = self.rows
+        name = self.positions["pair_name"]
+        ids = range(len(rows))
+        if query:
+            query = query.lower()
+            ids = [i for i in ids if query in rows[i][name].lower()]
+        column = self.positions[key]
+        if key == "pair_name":
+            order = sorted(ids, key=lambda i: rows[i][column], reverse=descending)
+        else:
+            sign = -1 if descending else 1
+
+            def sort_key(i):
+                row = rows[i]
+                value = row[column]
+                # NaN 与自身不相等；取值相同时按交易对名称，与排名索引预取的行顺序一致
+                if value is None or value != value:
+                    return (1, 0, row[name])
+                return (0, sign * value, row[name])
+
+            order = sorted(ids, key=sort_key)
+        self.orders[cache_key] = order
+        return order
+
+    def page(self, key, descending=True, query="", offset=0, limit=20):
+        """
+        :return: (筛选后的总行数, 当前页的行字典)，只为当前页构造字典
+        """
+        fields, rows = self.fields, self.rows
+        ranked = self.ranked.get(key)
+        if (
+            ranked is not None
+            and descending
+            and not query
+            and (offset + limit <= len(ranked) or len(ranked) >= len(rows))
+        ):
+            return len(rows), [
+                dict(zip(fields, row)) for row in ranked[offset : offset + limit]
+            ]
+        order = self.order(key, descending, query)
+        return len(order), [
+            dict(zip(fields, rows[i])) for i in order[offset : offset + limit]
+        ]
+
+
+class SnapshotBuffer:
+    """
+    双缓冲快照：后台任务按间隔发布新快照，构建完成后替换 front，读者总是拿到完整的一份，
+    渲染耗时与行情处理解耦。缓冲区按交易对保存上次复制的行元组，通过监控排名索引的 watch
+    得知上次发布以来更新或移除过的交易对，每次发布只复制这些行，其余行元组直接复用；
+    发布时的 Python 层开销与变化的行数成正比，另有一次对全部行引用的 C 层复制（tuple）。
+    批次中断而暂停的交易对组合（monitor.suspended）不进入快照
+    :param monitor: 提供 pair_data 和 rankings 的监控实例
+    :param interval: 发布间隔（秒）
+    :param prefetch: 排名字段按索引顺序预取的行数，0 为不预取；
+                     读者通过 want 指定排序字段后只预取该字段
+    """
+
+    def __init__(self, monitor, interval=1.0, prefetch=0):
+        self.monitor = monitor
+        self.interval = interval
+        self.prefetch = prefetch
+        self.wanted = None
+        self.front = None
+        self.seq = 0
+        self.fields = None
+        self._values = None
+        # 交易对名称 -> 行元组，发布之间只替换变化的行
+        self._rows = {}
+        self._ranking = None
+        self._changes = None
+        self.copied = 0
+        self.task = None
+
+    def want(self, key):
+        """读者当前的排序字段，之后的发布只为该字段预取排名行"""
+        self.wanted = key
+
+    def _bind(self, data):
+        self.fields = tuple(data)
+        self._values = operator.itemgetter(*self.fields)
+
+    def _copy(self, data):
+        try:
+            return tuple(map(self._values, data))
+        except KeyError:
+            return tuple(tuple(row.get(field) for field in self.fields) for row in data)
+
+    def _watch(self):
+        """开始记录排名索引的变化，任一排名字段的索引都会收到每一行的更新和移除"""
+        rankings = self.monitor.rankings
+        if self._ranking is None and rankings:
+            self._ranking = next(iter(rankings.values()))
+            self._changes = self._ranking.watch()
+
+    def _copy_all(self):
+        monitor = self.monitor
+        suspended = monitor.suspended
+        names, data = [], []
+        for pair_name, row in monitor.pair_data.items():
+            if pair_name not in suspended:
+                names.append(pair_name)
+                data.append(row)
+        if data and self._values is None:
+            self._bind(data[0])
+        if not data:
+            self._rows = {}
+            return
+        try:
+            rows = tuple(map(self._values, data))
+        except KeyError:
+            # 部分字段在首次计算价差后才写入行，按全部行的字段并集取值，缺少的为空
+            fields = dict.fromkeys(self.fields)
+            for row in data:
+                fields.update(dict.fromkeys(row))
+            self._bind(fields)
+            rows = self._copy(data)
+        self._rows = dict(zip(names, rows))
+        self.copied += len(rows)
+
+    def _copy_changed(self):
+        monitor = self.monitor
+        pair_data, suspended = monitor.pair_data, monitor.suspended
+        changes = self._changes
+        names = list(changes)
+        changes.clear()
+        self.copied += len(names)
+        rows = self._rows
+        # 列式存储的行视图按名称批量构造行，每列只取一次值
+        get_rows = getattr(pair_data, "rows", None)
+        if get_rows is not None:
+            data = get_rows(names)
+        else:
+            data = list(map(pair_data.get, names))
+        if self._values is not None and not suspended and None not in data:
+            try:
+                rows.update(zip(names, map(self._values, data)))
+                return
+            except KeyError:
+                pass
+        for pair_name, row in zip(names, data):
+            if row is None or pair_name in suspended:
+                rows.pop(pair_name, None)
+                continue
+            if self._values is None:
+                self._bind(row)
+            try:
+                rows[pair_name] = self._values(row)
+            except KeyError:
+                if not set(row) <= set(self.fields):
+                    # 出现新字段，按字段并集重新复制全部行
+                    self._copy_all()
+                    return
+                rows[pair_name] = tuple(row.get(field) for field in self.fields)
+
+    def publish(self):
+        """合并计算待处理的更新，只复制上次发布以来变化的行，替换 front"""
+        monitor = self.monitor
+        if monitor.conflator is not None or monitor.store is not None:
+            monitor.flush()
+        if self._changes is None:
+            self._watch()
+            self._copy_all()
+        elif self._changes:
+            self._copy_changed()
+        rows_by_name = self._rows
+        rows = tuple(rows_by_name.values())
+        ranked = {}
+        if self.prefetch and rows:
+            # 排名索引已排除暂停的组合，前几页直接按索引顺序取已复制的行，不对全部行排序
+            rankings = monitor.rankings
+            keys = rankings if self.wanted is None else (self.wanted,)
+            for key in keys:
+                ranking = rankings.get(key)
+                if ranking is not None:
+                    ranked[key] = tuple(
+                        rows_by_name[pair_name]
+                        for pair_name in ranking.top(self.prefetch)
+                        if pair_name in rows_by_name
+                    )
+        self.seq += 1
+        self.front = Snapshot(
+            self.seq, time.time(), self.fields or ("pair_name",), rows, ranked
+        )
+        return self.front
+
+    def start(self):
+        """启动发布任务，重复调用无副作用"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            self.publish()
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self._ranking is not None:
+            self._ranking.unwatch(self._changes)
+            self._ranking = self._changes = None
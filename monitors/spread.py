@@ -6,6 +6,17 @@ import asyncio
 import ccxt.pro as ccxtpro
 from typing import Dict, Tuple
 from collections import defaultdict
+from monitors.ranking import RankingIndex
+from monitors.columnar import ColumnarTickerStore, ColumnarOrderbookStore
+from monitors.routing import RoutingTable, side_fields
+from monitors.conflation import Conflator
+from monitors.batching import Batch, BatchPlanner, UNWATCH_METHODS, release_symbols
+from monitors.depth import DepthWalker, NAN
+from monitors.rolling import RollingStats
+from monitors.clock import ClockEstimator
+from monitors.costs import CostTable
+from monitors.supervisor import Supervisor
+from monitors.quotes import QuoteConverter
 
 
 params = {
@@ -19,88 +30,519 @@ params = {
 }
 
 
+exchange_factories = {}
+
+
+def register_exchange(name, factory):
+    """
+    注册自定义交易所，create_exchange 遇到该名称时调用 factory 创建实例
+    """
+    exchange_factories[name] = factory
+
+
 def create_exchange(name):
+    factory = exchange_factories.get(name)
+    if factory is not None:
+        return factory()
     return getattr(ccxtpro, name)(params)
 
 
-class SpreadMonitorBase:
-    def __init__(self, market_a, market_b, symbols=None, quote_currency="USDT"):
+def clone_exchange(exchange):
+    """同一交易所的新实例，即一条独立的 websocket 连接，复用已加载的市场目录"""
+    clone = create_exchange(exchange.id)
+    clone.set_markets(exchange.markets, getattr(exchange, "currencies", None))
+    return clone
+
+
+def parse_market(market):
+    """
+    解析 exchange.type[.subtype]
+    :return: (交易所, 类型, 子类型)，子类型可为 None
+    """
+    market_params = market.split(".")
+    if len(market_params) == 2:
+        exchange_name, type_ = market_params
+        return exchange_name, type_, None
+    elif len(market_params) == 3:
+        exchange_name, type_, subtype = market_params
+        return exchange_name, type_, subtype
+    else:
+        raise ValueError(
+            "Market parameter must match format as follows:"
+            "\t- <exchange>.<type> (e.g. binance.spot)"
+            "\t- <exchange>.<type>.<subtype> (e.g. okx.swap.linear)"
+        )
+
+
+def filter_markets(
+    markets, type_, subtype, quote_currency=None, symbols=None, cross_quotes=()
+):
+    """
+    按类型、子类型和计价币筛选市场，quote_currency 为空时按 symbols（BASE-QUOTE）筛选
+    :param cross_quotes: 折算为 quote_currency 的其他计价币，这些市场归入 (base, quote_currency)
+    :return: (base, quote) -> [symbol]
+    """
+    new_markets = defaultdict(list)
+    for m in markets.values():
+        if m["type"] != type_ or (subtype is not None and not m[subtype]):
+            continue
+        if m["quote"] == quote_currency or (
+            quote_currency is None and f"{m['base']}-{m['quote']}" in symbols
+        ):
+            new_markets[m["base"], m["quote"]].append(m["symbol"])
+        elif m["quote"] in cross_quotes:
+            new_markets[m["base"], quote_currency].append(m["symbol"])
+    return new_markets
+
+
+class MonitorLifecycle:
+    """
+    两市场监控与多市场价差矩阵共用的生命周期：市场目录缓存、订阅批次的启动、回收和重新分配、
+    supervisor 下的订阅、排名读取与关闭。
+    使用方提供 _index_exchange（批次来源对应的交易所）、_watch_batch（批次的订阅协程）、
+    _suspend（批次中断时移出排名）和 _close_exchanges
+    """
+
+    async def _fetch_markets(self, exchange, key):
+        """
+        :param key: 写入 startup 的来源名称
+        """
+        cache = self.market_cache
+        if cache is not None and await asyncio.to_thread(cache.load, exchange):
+            self.startup[f"markets_{key}"] = "cache"
+            if self.refresh_markets:
+                self.refresh_tasks.append(
+                    asyncio.create_task(self._refresh_market_cache(exchange))
+                )
+            return
+
+        await exchange.load_markets()
+        self.startup[f"markets_{key}"] = "remote"
+        if cache is not None:
+            await asyncio.to_thread(cache.save, exchange)
+
+    async def _refresh_market_cache(self, exchange):
+        try:
+            await exchange.load_markets(reload=True)
+            await asyncio.to_thread(self.market_cache.save, exchange)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Refresh markets error for {exchange.id}: {str(e)}")
+
+    def mark_first_row(self):
+        """记录从创建监控到首行渲染的耗时（秒）"""
+        if "first_row" not in self.startup:
+            self.startup["first_row"] = time.time() - self.created_at
+        return self.startup["first_row"]
+
+    def _count_error(self, index, name="errors_total"):
+        if self.metrics is not None:
+            self.metrics.inc(
+                name, (("exchange", self.latency_keys[index]), ("stream", self.stream))
+            )
+
+    def _report_error(self, index, e):
+        print(f"Excpetion({index}): {str(e)}")
+
+    def _batch_down(self, index, symbols, reason):
+        """
+        订阅批次中断，进程内批次由 supervisor 回调，--feed-workers 模式由工作进程的标记触发
+        :param reason: stall（静默超时）或 error
+        """
+        self._suspend(index, symbols)
+        if reason == "stall":
+            self._count_error(index, "stalls_total")
+
+    def _batch_up(self, index, gap):
+        """订阅批次恢复推送，gap 为中断时长（秒）"""
+        self._count_error(index, "reconnects_total")
+        if self.metrics is not None:
+            self.metrics.observe(
+                "batch_gap_ms",
+                gap * 1e3,
+                (("exchange", self.latency_keys[index]), ("stream", self.stream)),
+            )
+
+    def _batch_stopped(self, index, batch):
+        """订阅任务结束（批次清空或监控停止）"""
+
+    def top(self, n, key="spread_pct"):
+        if self.metrics is None:
+            return self._top(n, key)
+        started = time.perf_counter()
+        data = self._top(n, key)
+        self.metrics.observe("top_ms", (time.perf_counter() - started) * 1e3)
+        return data
+
+    def _top(self, n, key):
+        ranking = self.rankings.get(key)
+        if ranking is not None:
+            return [self.pair_data[pair_name] for pair_name in ranking.top(n)]
+
+        # 未建立索引的字段退化为全量排序
+        data = [
+            row
+            for row in self.pair_data.values()
+            if row["pair_name"] not in self.suspended
+        ]
+        return sorted(data, key=lambda x: x[key], reverse=True)[: min(n, len(data))]
+
+    def _batch_exchange(self, batch):
+        if batch.connection is not None:
+            return batch.connection
+        return self._index_exchange(batch.index)
+
+    def _start_batch(self, batch):
+        if batch.split and batch.connection is None:
+            batch.connection = clone_exchange(self._batch_exchange(batch))
+        self.batches.append(batch)
+        task = asyncio.create_task(self._watch_batch(batch))
+        self.batch_tasks[batch] = task
+        self.monitor_tasks.append(task)
+
+    def _retire_batch(self, batch):
+        """停止已清空批次的订阅任务，关闭其独立连接"""
+        task = self.batch_tasks.pop(batch, None)
+        if task is not None:
+            task.cancel()
+        connection, batch.connection = batch.connection, None
+        if connection is not None:
+            self.monitor_tasks.append(asyncio.create_task(connection.close()))
+
+    async def _rebalance_batches(self):
+        while self.running:
+            await asyncio.sleep(self.batching.interval)
+            created, moves = self.batching.rebalance(self.batches)
+            for batch in created:
+                self._start_batch(batch)
+            for batch, symbols in moves:
+                if batch.symbols:
+                    await release_symbols(
+                        self._batch_exchange(batch), self.stream, symbols
+                    )
+                else:
+                    self._retire_batch(batch)
+            self.batches = [batch for batch in self.batches if batch.symbols]
+            self.monitor_tasks = [
+                task for task in self.monitor_tasks if not task.done()
+            ]
+
+    async def _supervise(self, exchange, index, batch, watch, handle):
+        """
+        在 supervisor 下运行一个订阅批次
+        :param index: 批次来源，传给 _batch_down、_batch_up 和错误计数
+        :param watch: 无参协程函数，订阅批次内的交易对并返回一次推送
+        :param handle: 处理一次推送
+        """
+        method = UNWATCH_METHODS[self.stream]
+        name = "".join(
+            part.capitalize() if i else part for i, part in enumerate(method.split("_"))
+        )
+
+        def on_error(e):
+            self._count_error(index)
+            self._report_error(index, e)
+
+        try:
+            await self.supervisor.run(
+                batch,
+                watch,
+                handle,
+                active=lambda: self.running and bool(batch.symbols),
+                on_error=on_error,
+                on_down=lambda reason: self._batch_down(
+                    index, list(batch.symbols), reason
+                ),
+                on_up=lambda gap: self._batch_up(index, gap),
+                unwatch=(
+                    (lambda: getattr(exchange, method)(list(batch.symbols)))
+                    if getattr(exchange, "has", {}).get(name)
+                    else None
+                ),
+            )
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._batch_stopped(index, batch)
+
+    def batch_stats(self):
+        """每个订阅批次的交易对数、推送数、更新速率、延迟和错误数"""
+        return [batch.stats() for batch in self.batches]
+
+    async def _close_exchanges(self):
+        raise NotImplementedError("Method is not implemented")
+
+    async def stop(self):
+        """优雅关闭"""
+        self.running = False
+        tasks = self.monitor_tasks + self.refresh_tasks
+        for task in tasks:
+            task.cancel()
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            pass
+
+        await self._close_exchanges()
+        for batch in self.batches:
+            if batch.connection is not None:
+                await batch.connection.close()
+
+
+class SpreadMonitorBase(MonitorLifecycle):
+    stream = None
+    rank_keys = ("spread_pct",)
+    store_cls = None
+    empty_row = {}
+    cost_row = {}
+    cost_rank_keys = ()
+
+    def __init__(
+        self,
+        market_a,
+        market_b,
+        symbols=None,
+        quote_currency="USDT",
+        rank_keys=None,
+        backend="dict",
+        conflation=None,
+        market_cache=None,
+        refresh_markets=True,
+        recorder=None,
+        hub=None,
+        feed_workers=0,
+        batching=None,
+        metrics=None,
+        alerts=None,
+        rolling_size=None,
+        rolling_seconds=None,
+        passive_clock=False,
+        market_refresh=None,
+        stale_ttl=None,
+        history=None,
+        fee_side=None,
+        cost_fixture=None,
+        funding_interval=300,
+        supervisor=None,
+        cross_quotes=None,
+        quote_rates=None,
+    ):
+        """
+        :param conflation: 价差合并计算模式，None 为每次更新立即计算，
+                           其余取值见 Conflator
+        :param market_cache: MarketCache 实例，None 为不使用缓存
+        :param refresh_markets: 命中缓存时是否在后台刷新市场目录
+        :param recorder: StreamRecorder 实例，录制原始行情用于回放
+        :param hub: ExchangeHub 实例，与其他监控共享交易所连接和订阅
+        :param feed_workers: 每侧用于订阅行情的子进程数量，0 为在当前事件循环内订阅
+        :param batching: BatchPlanner 实例，决定订阅批次大小和运行中的重新分配
+        :param metrics: Metrics 实例，记录延迟直方图和错误计数
+        :param alerts: AlertEngine 实例，每次价差计算后判断告警规则
+        :param rolling_size: 每个交易对 spread_pct 滚动窗口的样本数，启用后可按 spread_z 排序
+        :param rolling_seconds: 滚动窗口的时间长度（秒），单独指定时样本数上限为 1024
+        :param passive_clock: 用行情时间戳跟踪时钟漂移，减少 fetch_time 请求，
+                              使用 hub 时由 hub 的同名参数决定
+        :param market_refresh: 重新加载市场目录的间隔（秒），新上架的交易对加入订阅，
+                               下架的交易对取消订阅并释放状态
+        :param stale_ttl: 交易对任一侧超过该时间（秒）没有更新时移出排名并释放状态，
+                          再次收到更新后重新计算
+        :param history: SpreadHistory 实例，记录每次价差更新或按间隔采样全部交易对
+        :param fee_side: taker 或 maker，设置后计算扣除手续费和资金费率的净价差，可用于排序
+        :param cost_fixture: 本地 JSON 文件，提供手续费和资金费率，见 CostTable
+        :param funding_interval: 资金费率刷新间隔（秒）
+        :param supervisor: Supervisor 实例，决定订阅批次的重试退避和静默超时
+        :param cross_quotes: 按实时汇率折算为 quote_currency 后一起比较的其他计价币，
+                             例如 ("USDC", "USD")，见 QuoteConverter
+        :param quote_rates: 计价币 -> 固定汇率，这些计价币不订阅汇率市场
+        """
+        self.created_at = time.time()
+        self.startup = {}
+        self.market_a, self.market_b = market_a, market_b
         self.exchange_a_name, self.type_a, self.subtype_a = self.parse_market(market_a)
         self.exchange_b_name, self.type_b, self.subtype_b = self.parse_market(market_b)
 
-        self.exchange_a: ccxtpro.Exchange = create_exchange(self.exchange_a_name)
-        self.exchange_b: ccxtpro.Exchange = create_exchange(self.exchange_b_name)
+        if hub is not None and feed_workers:
+            raise ValueError("feed_workers cannot be combined with a shared hub")
+        if market_refresh and feed_workers:
+            raise ValueError("market_refresh cannot be combined with feed_workers")
+        self.market_refresh = market_refresh
+        self.stale_ttl = stale_ttl
+        # 来源 -> 交易对 -> 最近一次更新的本地接收时间（毫秒）
+        self.last_seen = {"a": {}, "b": {}}
+        self.supervisor = supervisor or Supervisor()
+        # 所在批次中断后尚未收到新推送的交易对，及其影响的交易对组合 -> 中断侧数
+        self.down_symbols = {"a": set(), "b": set()}
+        self.suspended = {}
+        self.subscribed_at = None
+        self.market_stats = {
+            "refreshes": 0,
+            "added_pairs": 0,
+            "removed_pairs": 0,
+            "evicted": 0,
+        }
+        self.hub = hub
+        self.feed_workers = feed_workers
+        self.feed = None
+        self.batching = batching or BatchPlanner()
+        self.batches = []
+        # 批次 -> 订阅任务，合并或清空批次时取消
+        self.batch_tasks = {}
+        self.metrics = metrics
+        # 合并计算时最早和最近一条未计算更新的接收时间
+        self._dirty_since = None
+        self._last_recv = None
+        if hub is not None:
+            self.exchange_a: ccxtpro.Exchange = hub.exchange(self.exchange_a_name)
+            self.exchange_b: ccxtpro.Exchange = hub.exchange(self.exchange_b_name)
+        else:
+            self.exchange_a: ccxtpro.Exchange = create_exchange(self.exchange_a_name)
+            self.exchange_b: ccxtpro.Exchange = create_exchange(self.exchange_b_name)
+        self.latency_keys = {
+            "a": self.exchange_a.name.lower(),
+            "b": self.exchange_b.name.lower(),
+        }
 
         if symbols is not None:
             self.symbols = symbols
             self.quote_currency = None
         else:
             self.quote_currency = quote_currency
+        self.converter = None
+        if cross_quotes:
+            if self.quote_currency is None:
+                raise ValueError("Cross-quote normalization requires a quote currency")
+            if backend != "dict" or feed_workers:
+                raise ValueError(
+                    "Cross-quote normalization requires the dict backend in-process"
+                )
+            self.converter = QuoteConverter(quote_currency, cross_quotes, quote_rates)
+        # 来源 -> 非参考计价币交易对的原始价格，汇率变化时重新折算
+        self.raw_prices = {"a": {}, "b": {}}
 
         self.symbol_map = defaultdict(dict)
+        self.pairs = []
+        self.routing = None
+        self.routes = {"a": {}, "b": {}}
+        self.pair_rows = []
         self.pair_data: Dict[Tuple[str, str], dict] = {}
+        self.costs = None
+        if fee_side is not None:
+            self.costs = CostTable(fee_side, cost_fixture, funding_interval)
+            self.empty_row = {**self.empty_row, **self.cost_row}
+            rank_keys = (
+                self.rank_keys if rank_keys is None else tuple(rank_keys)
+            ) + self.cost_rank_keys
+        self.rolling = None
+        if rolling_size is not None or rolling_seconds is not None:
+            self.rolling = RollingStats(rolling_size or 1024, rolling_seconds)
+            self.empty_row = {**self.empty_row, **RollingStats.row}
+            if rank_keys is None:
+                rank_keys = self.rank_keys + RollingStats.rank_keys
+            else:
+                rank_keys = tuple(rank_keys) + RollingStats.rank_keys
+        if rank_keys is not None:
+            self.rank_keys = tuple(rank_keys)
+        self.rankings = {key: RankingIndex(key) for key in self.rank_keys}
+        if backend not in ("dict", "columnar"):
+            raise ValueError(f"Unsupported backend: {backend}")
+        self.backend = backend
+        if alerts is not None and backend != "dict":
+            raise ValueError("Alerts require the dict backend")
+        if self.rolling is not None and backend != "dict":
+            raise ValueError("Rolling statistics require the dict backend")
+        if self.costs is not None and backend != "dict":
+            raise ValueError("Net spreads require the dict backend")
+        self.alerts = alerts
+        self.alert_market = f"{market_a}:{market_b}"
+        if history is not None and history.interval is None and backend != "dict":
+            raise ValueError("Per-update history requires the dict backend")
+        self.history = history
+        self.store = None
+        self.conflator = None
+        if conflation is not None:
+            self.conflator = Conflator(self._recompute, conflation)
+        self.market_cache = market_cache
+        self.refresh_markets = refresh_markets
+        self.refresh_tasks = []
+        self.recorder = recorder
         self.monitor_tasks = []
         self.running = False
 
-        self.latencies = defaultdict(dict)
+        self.latencies = hub.latencies if hub is not None else defaultdict(dict)
+        # 交易所名称 -> ClockEstimator，同名交易所的两侧共用
+        if hub is not None:
+            self.clocks = hub.clocks
+        else:
+            self.clocks = {
+                key: ClockEstimator(passive=passive_clock)
+                for key in set(self.latency_keys.values())
+            }
 
     async def sync_time(self, exchange: ccxtpro.Exchange):
-        while self.running:
-            try:
-                start_time = time.time() * 1000
-                server_time = await exchange.fetch_time()
-                end_time = time.time() * 1000
+        """持续估计交易所时钟偏移，写入 latencies"""
+        key = exchange.name.lower()
 
-                rtt = end_time - start_time
-                latency = rtt / 2
-                time_diff = end_time - (server_time + latency)
+        def publish(estimate, now):
+            self.latencies[key] = estimate
+            self.record_time_diff(exchange, estimate["time_diff"], now)
 
-                self.latencies[exchange.name.lower()] = {
-                    "latency": latency,
-                    "time_diff": time_diff,
-                }
-            except Exception as e:
-                print(f"Excpetion: {traceback.format_exc()}")
-            await asyncio.sleep(10)
+        await self.clocks[key].run(exchange, publish)
+
+    @property
+    def exchanges(self):
+        """交易所名称 -> 实例，同名交易所的两侧只出现一次"""
+        exchanges = {self.latency_keys["a"]: self.exchange_a}
+        exchanges.setdefault(self.latency_keys["b"], self.exchange_b)
+        return exchanges
+
+    def _sync_tasks(self):
+        """每个交易所一个校时任务"""
+        return [
+            asyncio.create_task(self.sync_time(exchange))
+            for exchange in self.exchanges.values()
+        ]
+
+    def _observe_clock(self, index, timestamp, now):
+        clock = self.clocks.get(self.latency_keys[index])
+        if clock is not None and clock.passive:
+            clock.observe(now, timestamp)
+
+    def record_time_diff(self, exchange, time_diff, recv_time):
+        if self.recorder is not None:
+            index = "a" if exchange is self.exchange_a else "b"
+            self.recorder.record_time_diff(index, time_diff, recv_time)
 
     def parse_market(self, market):
-        market_params = market.split(".")
-        if len(market_params) == 2:
-            exchange_name, type_ = market_params
-            return exchange_name, type_, None
-        elif len(market_params) == 3:
-            exchange_name, type_, subtype = market_params
-            return exchange_name, type_, subtype
-        else:
-            raise ValueError(
-                "Market parameter must match format as follows:"
-                "\t- <exchange>.<type> (e.g. binance.spot)"
-                "\t- <exchange>.<type>.<subtype> (e.g. okx.swap.linear)"
-            )
+        return parse_market(market)
 
     async def load_markets(self):
-        await self.exchange_a.load_markets()
-        await self.exchange_b.load_markets()
-
-        def format_markets(markets, type_, subtype):
-            new_markets = defaultdict(list)
-            for m in markets.values():
-                if (
-                    m["type"] == type_
-                    and (subtype is None or m[subtype])
-                    and (
-                        m["quote"] == self.quote_currency
-                        or (
-                            self.quote_currency is None
-                            and f"{m['base']}-{m['quote']}" in self.symbols
-                        )
-                    )
-                ):
-                    new_markets[m["base"], m["quote"]].append(m["symbol"])
-            return new_markets
+        started = time.time()
+        await asyncio.gather(
+            self._load_exchange_markets(self.exchange_a, "a"),
+            self._load_exchange_markets(self.exchange_b, "b"),
+        )
+
+        self.pairs = self._match_pairs()
+        self.symbol_map = self._build_symbol_map(self.pairs)
+        self._compile_routing()
+        if self.converter is not None:
+            for quote in self.converter.find_sources(
+                [self.exchange_a, self.exchange_b]
+            ):
+                print(
+                    f"No {quote}/{self.quote_currency} spot market for a conversion "
+                    f"rate, pairs quoted in {quote} stay unranked"
+                )
+        self.startup["load_markets"] = time.time() - started
 
-        markets_a = format_markets(self.exchange_a.markets, self.type_a, self.subtype_a)
-        markets_b = format_markets(self.exchange_b.markets, self.type_b, self.subtype_b)
+    def _match_pairs(self):
+        markets_a = self.format_markets(
+            self.exchange_a.markets, self.type_a, self.subtype_a
+        )
+        markets_b = self.format_markets(
+            self.exchange_b.markets, self.type_b, self.subtype_b
+        )
 
         keys = set(markets_a.keys()).intersection(set(markets_b.keys()))
         pairs = [
@@ -112,7 +554,211 @@ class SpreadMonitorBase:
             }
             for base, quote in keys
         ]
-        self.symbol_map = self._build_symbol_map(pairs)
+        return pairs
+
+    async def reload_markets(self):
+        """
+        重新加载市场目录，增量更新路由和订阅，不中断已有连接
+        :return: 每侧新增和移除的交易对符号
+        """
+        # 使用 hub 时两侧可能是同一个实例
+        exchanges = {id(self.exchange_a): self.exchange_a}
+        exchanges.setdefault(id(self.exchange_b), self.exchange_b)
+        if self.hub is not None:
+            # 各标签页的刷新经由 hub 合并，每个交易所每个刷新间隔只加载一次
+            await asyncio.gather(
+                *(
+                    self.hub.load_markets(
+                        exchange,
+                        lambda exchange: exchange.load_markets(reload=True),
+                        max_age=(self.market_refresh or 0) / 2,
+                    )
+                    for exchange in exchanges.values()
+                )
+            )
+        else:
+            await asyncio.gather(
+                *(exchange.load_markets(reload=True) for exchange in exchanges.values())
+            )
+        pairs = self._match_pairs()
+        return self._apply_symbol_map(pairs, self._build_symbol_map(pairs))
+
+    def _apply_symbol_map(self, pairs, symbol_map):
+        old_map, old_routing = self.symbol_map, self.routing
+        changes = {
+            index: {
+                "added": [s for s in symbol_map[index] if s not in old_map[index]],
+                "removed": [s for s in old_map[index] if s not in symbol_map[index]],
+            }
+            for index in ("a", "b")
+        }
+        routing = RoutingTable(symbol_map, previous=old_routing)
+        removed_pairs = [
+            name for name in old_routing.slots if name not in routing.slots
+        ]
+        for pair_name in removed_pairs:
+            self._evict(old_routing.slots[pair_name])
+
+        self.pairs, self.symbol_map = pairs, symbol_map
+        self.routing = routing
+        self.routes = routing.routes
+        self.pair_rows.extend([None] * (len(routing) - len(self.pair_rows)))
+        if self.store is not None:
+            self.store.resize(routing)
+        if self.costs is not None:
+            self.costs.build(self)
+        if self.converter is not None:
+            self.converter.build(self)
+        for index, change in changes.items():
+            for symbol in change["removed"]:
+                self._forget_symbol(index, symbol)
+
+        self.market_stats["refreshes"] += 1
+        self.market_stats["added_pairs"] += len(routing.slots) - (
+            len(old_routing.slots) - len(removed_pairs)
+        )
+        self.market_stats["removed_pairs"] += len(removed_pairs)
+        if self.running:
+            self._resubscribe(changes)
+        return changes
+
+    def _resubscribe(self, changes):
+        """按市场变化增删订阅，已有批次原地修改，下一次 watch_* 调用时生效"""
+        now = time.time() * 1e3
+        for exchange, index in ((self.exchange_a, "a"), (self.exchange_b, "b")):
+            added, removed = changes[index]["added"], changes[index]["removed"]
+            for symbol in added:
+                self.last_seen[index].setdefault(symbol, now)
+            if self.hub is not None:
+                if removed:
+                    self.hub.unsubscribe(self, index, removed)
+                if added:
+                    self.hub.subscribe(
+                        self,
+                        index,
+                        exchange,
+                        self.stream,
+                        added,
+                        self.depth_limit(exchange),
+                    )
+                continue
+
+            batches = [batch for batch in self.batches if batch.index == index]
+            if removed:
+                removed = set(removed)
+                for batch in batches:
+                    # 清空的批次由订阅循环自行退出
+                    batch.symbols[:] = [s for s in batch.symbols if s not in removed]
+            size = self.batching.size(exchange.name.lower(), self.stream)
+            for batch in batches:
+                if not added:
+                    break
+                if batch.symbols:
+                    room = size - len(batch.symbols)
+                    batch.symbols.extend(added[:room])
+                    added = added[room:]
+            for batch in self.batching.plan(
+                exchange.name.lower(), index, self.stream, added
+            ):
+                self._start_batch(batch)
+        for batch in self.batches:
+            if not batch.symbols:
+                self._retire_batch(batch)
+        self.batches = [batch for batch in self.batches if batch.symbols]
+
+    def _has_row(self, slot):
+        if self.store is not None:
+            return bool(self.store.seen[slot])
+        return self.pair_rows[slot] is not None
+
+    def _evict(self, slot):
+        """释放交易对的行数据和排名、滚动统计、告警状态"""
+        pair_name = self.routing.pair_names[slot]
+        for ranking in self.rankings.values():
+            ranking.discard(pair_name)
+        if self.store is not None:
+            self.store.evict(slot)
+        else:
+            self.pair_rows[slot] = None
+            self.pair_data.pop(pair_name, None)
+        if self.conflator is not None:
+            self.conflator.dirty.discard(slot)
+        if self.rolling is not None:
+            self.rolling.windows.pop(slot, None)
+        if self.alerts is not None:
+            self.alerts.discard(self.alert_market, pair_name)
+        self.suspended.pop(pair_name, None)
+
+    def _forget_symbol(self, index, symbol):
+        """交易对下架后释放按符号保存的状态"""
+        self.last_seen[index].pop(symbol, None)
+        self.down_symbols[index].discard(symbol)
+        self.raw_prices[index].pop(symbol, None)
+        if self.metrics is not None:
+            self.metrics.forget(self.latency_keys[index], symbol)
+
+    def evict_stale(self, now=None):
+        """
+        移除任一侧超过 stale_ttl 没有更新的交易对
+        :return: 移除的交易对数量
+        """
+        if now is None:
+            now = time.time() * 1e3
+        cutoff = now - self.stale_ttl * 1e3
+        seen_a, seen_b = self.last_seen["a"], self.last_seen["b"]
+        # 尚未收到过更新的符号从订阅开始计时
+        since = self.subscribed_at
+        evicted = 0
+        for slot, symbols in enumerate(self.routing.pair_symbols):
+            if symbols is None or not self._has_row(slot):
+                continue
+            symbol_a, symbol_b = symbols
+            if min(seen_a.get(symbol_a, since), seen_b.get(symbol_b, since)) < cutoff:
+                self._evict(slot)
+                evicted += 1
+        self.market_stats["evicted"] += evicted
+        return evicted
+
+    async def _refresh_markets_loop(self):
+        while self.running:
+            await asyncio.sleep(self.market_refresh)
+            try:
+                await self.reload_markets()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Reload markets error: {str(e)}")
+
+    async def _evict_stale_loop(self):
+        while self.running:
+            await asyncio.sleep(min(self.stale_ttl / 4, 10))
+            self.evict_stale()
+
+    async def _load_exchange_markets(self, exchange, index):
+        """优先从本地缓存恢复市场目录，缓存命中时可在后台刷新"""
+        if self.hub is not None:
+            # 共享连接时同一交易所只加载一次
+            loaded = await self.hub.load_markets(
+                exchange, lambda exchange: self._fetch_markets(exchange, index)
+            )
+            if not loaded:
+                self.startup[f"markets_{index}"] = "shared"
+            return
+        await self._fetch_markets(exchange, index)
+
+    def format_markets(self, markets, type_, subtype):
+        return filter_markets(
+            markets,
+            type_,
+            subtype,
+            self.quote_currency,
+            getattr(self, "symbols", None),
+            self.converter.quotes if self.converter is not None else (),
+        )
+
+    def depth_limit(self, exchange):
+        """订阅深度，None 为交易所默认"""
+        return None
 
     def _build_symbol_map(self, pairs):
         symbol_map = defaultdict(dict)
@@ -137,102 +783,397 @@ class SpreadMonitorBase:
                     symbol_map["b"][symbol_b]["pair_names"].append(pair_name)
         return symbol_map
 
+    def _compile_routing(self):
+        self.routing = RoutingTable(self.symbol_map)
+        self.routes = self.routing.routes
+        self.pair_rows = [None] * len(self.routing)
+        if self.backend == "columnar":
+            self.store = self.store_cls(self.routing, self.rankings, self.suspended)
+            self.pair_data = self.store.view
+        if self.costs is not None:
+            self.costs.build(self)
+        if self.converter is not None:
+            self.converter.build(self)
+
+    def _new_row(self, slot):
+        pair_name = self.routing.pair_names[slot]
+        data = dict(self.empty_row, pair_name=pair_name)
+        self.pair_rows[slot] = data
+        self.pair_data[pair_name] = data
+        return data
+
     async def monitor(self, exchange, index, symbols):
         raise NotImplementedError("Method is not implemented")
 
-    def top(self, n):
-        data = list(self.pair_data.values())
-        return sorted(data, key=lambda x: x["spread_pct"], reverse=True)[
-            : min(n, len(data))
-        ]
+    def calculate_spread(self, slot, now=None):
+        """
+        :param now: 触发计算的更新的接收时间（毫秒），滚动窗口按该时间计时，回放时与录制一致
+        """
+        raise NotImplementedError("Method is not implemented")
+
+    def _recompute(self, slots):
+        if self.store is not None:
+            count = self.store.recompute()
+        else:
+            now = self._last_recv
+            for slot in slots:
+                self.calculate_spread(slot, now)
+            count = len(slots)
+        if self._dirty_since is not None:
+            self.metrics.observe(
+                "spread_update_ms", time.time() * 1e3 - self._dirty_since
+            )
+            self._dirty_since = None
+        return count
+
+    def _observe_update(self, now):
+        """记录从接收到价差更新的耗时，合并计算时在 _recompute 中记录"""
+        if self.conflator is None:
+            self.metrics.observe("spread_update_ms", time.time() * 1e3 - now)
+        elif self._dirty_since is None:
+            self._dirty_since = now
+
+    def _spread_updated(self, slot, data, now=None):
+        """价差已计算，更新滚动统计、判断告警并记录历史"""
+        if self.rolling is not None:
+            self.rolling.update(slot, data, None if now is None else now / 1e3)
+        if self.alerts is not None:
+            self.alerts.evaluate(self.alert_market, data["pair_name"], data)
+        if self.history is not None and self.history.interval is None:
+            self.history.record(self.alert_market, data)
+
+    def _updated(self, slots, now=None):
+        """
+        交易对数据已写入，立即计算价差或交给 conflator 合并
+        :param now: 更新的接收时间（毫秒）
+        """
+        if self.conflator is not None:
+            self.conflator.mark(slots)
+            self._last_recv = now
+        elif self.store is None:
+            for slot in slots:
+                self.calculate_spread(slot, now)
+
+    def _batch_done(self):
+        """一批行情处理完毕，未启用合并时列式存储在此统一计算"""
+        if self.conflator is None and self.store is not None:
+            self.store.recompute()
+
+    def flush(self):
+        """立即计算所有待合并的交易对，返回计算数量"""
+        if self.conflator is not None:
+            return self.conflator.flush()
+        if self.store is not None:
+            return self.store.recompute()
+        return 0
+
+    def _suspend(self, index, symbols):
+        """批次中断：相关交易对组合移出排名，直到中断侧的交易对再次收到推送"""
+        down = self.down_symbols[index]
+        suspended = self.suspended
+        pair_names = self.routing.pair_names
+        for symbol in symbols:
+            if symbol in down:
+                continue
+            down.add(symbol)
+            for slot in self.routes[index].get(symbol, ()):
+                pair_name = pair_names[slot]
+                suspended[pair_name] = suspended.get(pair_name, 0) + 1
+                for ranking in self.rankings.values():
+                    ranking.discard(pair_name)
+
+    def _resume(self, index, symbol):
+        """中断侧的交易对收到推送，随后的价差计算将交易对组合重新加入排名"""
+        self.down_symbols[index].discard(symbol)
+        suspended = self.suspended
+        pair_names = self.routing.pair_names
+        for slot in self.routes[index].get(symbol, ()):
+            pair_name = pair_names[slot]
+            count = suspended.get(pair_name)
+            if count is None:
+                continue
+            if count > 1:
+                suspended[pair_name] = count - 1
+            else:
+                del suspended[pair_name]
+                for ranking in self.rankings.values():
+                    ranking.touch(pair_name)
+
+    def _update_rankings(self, pair_name, data):
+        if self.suspended and pair_name in self.suspended:
+            return
+        for key, ranking in self.rankings.items():
+            ranking.update(pair_name, data[key])
+
+    def _top(self, n, key):
+        if self.conflator is not None and self.conflator.dirty:
+            self.conflator.flush()
+        store = self.store
+        if store is None:
+            return super()._top(n, key)
+
+        store.recompute()
+        ranking = self.rankings.get(key)
+        if ranking is not None:
+            slots = store.slots
+            return store.rows([slots[name] for name in ranking.top(n)])
+        rows = store.top(n + len(self.suspended), key)
+        return [row for row in rows if row["pair_name"] not in self.suspended][:n]
 
     def start(self):
         self.running = True
+        self.subscribed_at = time.time() * 1e3
+        if self.alerts is not None:
+            # 告警引擎可被多个监控共享，由创建方调用 close 关闭
+            self.alerts.start()
+        if self.history is not None:
+            self.history.start()
+        if self.recorder is not None:
+            self.recorder.record_meta(
+                {
+                    "monitor": type(self).__name__,
+                    "market_a": self.market_a,
+                    "market_b": self.market_b,
+                    "pairs": self.pairs,
+                }
+            )
 
-        batch_size = 50
-        a_symbols = list(self.symbol_map["a"].keys())
-        b_symbols = list(self.symbol_map["b"].keys())
-        self.monitor_tasks = [
-            asyncio.create_task(self.sync_time(self.exchange_a)),
-            asyncio.create_task(self.sync_time(self.exchange_b)),
-            *[
-                asyncio.create_task(
-                    self.monitor(self.exchange_a, "a", a_symbols[i : i + batch_size])
+        if self.hub is not None:
+            for exchange, index in ((self.exchange_a, "a"), (self.exchange_b, "b")):
+                self.hub.subscribe(
+                    self,
+                    index,
+                    exchange,
+                    self.stream,
+                    list(self.symbol_map[index]),
+                    self.depth_limit(exchange),
                 )
-                for i in range(0, len(a_symbols), batch_size)
-            ],
-            *[
-                asyncio.create_task(
-                    self.monitor(self.exchange_b, "b", b_symbols[i : i + batch_size])
-                )
-                for i in range(0, len(b_symbols), batch_size)
-            ],
-        ]
+            self.monitor_tasks.extend(self._background_tasks())
+            return
 
-    async def stop(self):
-        """优雅关闭"""
-        self.running = False
-        for task in self.monitor_tasks:
-            task.cancel()
-        try:
-            await asyncio.gather(*self.monitor_tasks, return_exceptions=True)
-        except asyncio.CancelledError:
-            pass
+        if self.feed_workers:
+            from monitors.sharding import ShardedFeed
+
+            self.feed = ShardedFeed(self, self.feed_workers)
+            self.feed.start()
+            self.monitor_tasks = self._sync_tasks() + self._background_tasks()
+            return
 
-        await self.exchange_a.close()
-        await self.exchange_b.close()
+        self.monitor_tasks = self._sync_tasks()
+        for exchange, index in ((self.exchange_a, "a"), (self.exchange_b, "b")):
+            batches = self.batching.plan(
+                exchange.name.lower(), index, self.stream, list(self.symbol_map[index])
+            )
+            for batch in batches:
+                self._start_batch(batch)
+        if self.batching.adaptive:
+            self.monitor_tasks.append(asyncio.create_task(self._rebalance_batches()))
+        self.monitor_tasks.extend(self._background_tasks())
+
+    def _background_tasks(self):
+        """合并计算、市场目录刷新、过期清理、历史采样和资金费率任务"""
+        tasks = []
+        if self.conflator is not None and self.conflator.window:
+            tasks.append(asyncio.create_task(self.conflator.run()))
+        if self.market_refresh:
+            tasks.append(asyncio.create_task(self._refresh_markets_loop()))
+        if self.stale_ttl:
+            tasks.append(asyncio.create_task(self._evict_stale_loop()))
+        if self.history is not None and self.history.interval:
+            tasks.append(asyncio.create_task(self._sample_history_loop()))
+        if self.costs is not None:
+            for exchange, _ in self.costs.funding_sides(self).values():
+                if self.hub is not None:
+                    # 共享连接时由 hub 按交易所合并请求，结果分发给各标签页
+                    self.hub.add_funding(self, exchange)
+                else:
+                    tasks.append(asyncio.create_task(self.costs.run(self, exchange)))
+        if self.converter is not None:
+            tasks.extend(self.converter.start(self))
+        return tasks
+
+    def update_quote_rate(self, quote, rate):
+        """
+        计价币汇率更新：只重新折算该计价币的交易对，相关价差一次批量重算
+        :return: 重算的交易对数量
+        """
+        converter = self.converter
+        if converter.rates[quote] == rate:
+            return 0
+        converter.rates[quote] = rate
+        converter.updates += 1
+        slots = []
+        for index in ("a", "b"):
+            raw_prices = self.raw_prices[index]
+            for symbol in converter.quote_symbols[quote][index]:
+                prices = raw_prices.get(symbol)
+                if prices is not None:
+                    slots.extend(self._convert_prices(index, symbol, prices, rate))
+        if slots:
+            # 两侧计价币相同时同一交易对出现两次
+            slots = list(dict.fromkeys(slots))
+            self._updated(slots)
+            self._batch_done()
+        return len(slots)
+
+    def _convert_prices(self, index, symbol, prices, rate):
+        """按新汇率写入已有行的折算价格，返回写入的槽位"""
+        raise NotImplementedError("Method is not implemented")
+
+    async def _sample_history_loop(self):
+        while self.running:
+            await asyncio.sleep(self.history.interval)
+            self.flush()
+            self.history.sample(self.alert_market, list(self.pair_data.values()))
+
+    def batch_stats(self):
+        """
+        每个订阅批次的交易对数、推送数、更新速率、延迟和错误数，
+        共享连接时为 hub 中全部标签页共用的批次
+        """
+        batches = self.batches if self.hub is None else self.hub.batches
+        return [batch.stats() for batch in batches]
+
+    def _lag(self, index, timestamp, now):
+        """交易所时间到本地接收的延迟（毫秒）"""
+        if timestamp is None:
+            return None
+        time_diff = self.latencies[self.latency_keys[index]].get("time_diff", 0)
+        return now - (timestamp + time_diff)
+
+    def _index_exchange(self, index):
+        return self.exchange_a if index == "a" else self.exchange_b
+
+    def _watch_batch(self, batch):
+        return self.monitor(
+            self._batch_exchange(batch), batch.index, batch.symbols, batch=batch
+        )
+
+    def _batch_stopped(self, index, batch):
+        # 批次清空或停止时释放仍处于中断状态的交易对
+        for symbol in batch.symbols:
+            if symbol in self.down_symbols[index]:
+                self._resume(index, symbol)
+
+    async def _close_exchanges(self):
+        if self.feed is not None:
+            await self.feed.stop()
+        if self.hub is not None:
+            # 交易所连接归 hub 所有，由 hub.close 关闭
+            self.hub.unsubscribe(self)
+        else:
+            await self.exchange_a.close()
+            await self.exchange_b.close()
+
+    async def stop(self):
+        await super().stop()
+        if self.recorder is not None:
+            self.recorder.close()
 
 
 class TickerSpreadMonitor(SpreadMonitorBase):
-    async def monitor(self, exchange, index: str, symbols):
+    stream = "tickers"
+    rank_keys = ("spread_pct", "spread")
+    store_cls = ColumnarTickerStore
+    empty_row = {
+        "pair_name": None,
+        "spread": 0,
+        "spread_pct": 0,
+        "price_a": 0,
+        "price_b": 0,
+        "elapsed_time_a": 0,
+        "elapsed_time_b": 0,
+    }
+    cost_row = {"net_spread_pct": NAN}
+    cost_rank_keys = ("net_spread_pct",)
+    fields = side_fields("price", "elapsed_time")
+
+    async def monitor(self, exchange, index: str, symbols, batch=None):
         """
         统一监控方法
         :param exchange: 交易所实例
         :param index: 来源索引 ('a'或'b')
+        :param batch: 订阅批次，记录推送统计和中断状态
         """
-        exchange_name = exchange.name.lower()
-        while self.running:
-            try:
-                tickers = await exchange.watch_tickers(symbols)
-                for symbol, ticker in tickers.items():
-                    await self.process_ticker(
-                        symbol,
-                        ticker,
-                        index,
-                        self.latencies[exchange_name].get("time_diff", 0),
-                    )
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                print(f"Excpetion({index}): {str(e)}")
-                await asyncio.sleep(5)
+        if batch is None:
+            batch = Batch(exchange.name.lower(), index, self.stream, symbols)
+
+        def handle(tickers):
+            now = time.time() * 1e3
+            self.on_tickers(index, tickers, now)
+            if tickers:
+                ticker = next(iter(tickers.values()))
+                batch.observe(tickers, self._lag(index, ticker["timestamp"], now))
 
-    async def process_ticker(self, symbol, ticker, index, time_diff):
-        if symbol not in self.symbol_map[index]:
+        await self._supervise(
+            exchange,
+            index,
+            batch,
+            lambda: exchange.watch_tickers(batch.symbols),
+            handle,
+        )
+
+    def on_tickers(self, index, tickers, now):
+        """
+        处理一批 ticker 推送
+        :param now: 本地接收时间（毫秒）
+        """
+        if self.recorder is not None:
+            self.recorder.record_tickers(index, tickers, now)
+        time_diff = self.latencies[self.latency_keys[index]].get("time_diff", 0)
+        for symbol, ticker in tickers.items():
+            self.process_ticker(symbol, ticker, index, time_diff, now)
+        self._batch_done()
+        if tickers:
+            self._observe_clock(index, next(iter(tickers.values()))["timestamp"], now)
+        if self.metrics is not None:
+            self._observe_update(now)
+
+    def process_ticker(self, symbol, ticker, index, time_diff, now=None):
+        """
+        :param now: 本地接收时间（毫秒），同一批次共用一次 time.time()
+        """
+        slots = self.routes[index].get(symbol)
+        if slots is None:
             return
 
-        pair_map = self.symbol_map[index][symbol]
-        pair_names = pair_map["pair_names"]
-        for pair_name in pair_names:
-            if pair_name not in self.pair_data:
-                self.pair_data[pair_name] = {
-                    "pair_name": pair_name,
-                    "spread": 0,
-                    "spread_pct": 0,
-                    "price_a": 0,
-                    "price_b": 0,
-                    "elapsed_time_a": 0,
-                    "elapsed_time_b": 0,
-                }
-            self.pair_data[pair_name][f"price_{index}"] = ticker["last"]
-            self.pair_data[pair_name][f"elapsed_time_{index}"] = time.time() * 1e3 - (
-                ticker["timestamp"] + time_diff
-            )
+        if now is None:
+            now = time.time() * 1e3
+        self.last_seen[index][symbol] = now
+        down = self.down_symbols[index]
+        if down and symbol in down:
+            self._resume(index, symbol)
+        price = ticker["last"]
+        if self.converter is not None and price is not None:
+            quote = self.converter.symbol_quotes[index].get(symbol)
+            if quote is not None:
+                self.raw_prices[index][symbol] = price
+                price = price * self.converter.rates[quote]
+        timestamp = ticker["timestamp"]
+        if timestamp is None:
+            # 交易所未给出时间戳时延迟未知
+            elapsed_time = NAN
+        else:
+            elapsed_time = now - (timestamp + time_diff)
+            if self.metrics is not None:
+                self.metrics.delay(self.latency_keys[index], symbol, elapsed_time)
+        if self.store is not None:
+            self.store.update(index, symbol, price, ticker["timestamp"], elapsed_time)
+            self._updated(slots)
+            return
 
-            await self.calculate_spread(pair_name)
+        price_field, elapsed_field = self.fields[index]
+        rows = self.pair_rows
+        for slot in slots:
+            data = rows[slot]
+            if data is None:
+                data = self._new_row(slot)
+            data[price_field] = price
+            data[elapsed_field] = elapsed_time
+        self._updated(slots, now)
 
-    async def calculate_spread(self, pair_key):
-        data = self.pair_data[pair_key]
+    def calculate_spread(self, slot, now=None):
+        data = self.pair_rows[slot]
         try:
             if data["price_a"] and data["price_b"]:
                 min_price = min(data["price_a"], data["price_b"])
@@ -240,95 +1181,288 @@ class TickerSpreadMonitor(SpreadMonitorBase):
                 spread_pct = spread / min_price
                 data["spread"] = spread
                 data["spread_pct"] = spread_pct
+                if self.costs is not None:
+                    # 买入价格较低的一侧，A 侧做多时支付 A 侧资金费率、收取 B 侧资金费率
+                    funding = self.costs.funding_diff[slot]
+                    if data["price_a"] > data["price_b"]:
+                        funding = -funding
+                    data["net_spread_pct"] = (
+                        spread_pct - self.costs.fees[slot] - funding
+                    )
+                self._spread_updated(slot, data, now)
         except (TypeError, ZeroDivisionError) as e:
-            print(f"Calculate spread error for {pair_key}: {str(e)}")
+            print(f"Calculate spread error for {data['pair_name']}: {str(e)}")
+        self._update_rankings(data["pair_name"], data)
+
+    def _convert_prices(self, index, symbol, prices, rate):
+        price_field = self.fields[index][0]
+        rows = self.pair_rows
+        slots = []
+        for slot in self.routes[index].get(symbol, ()):
+            data = rows[slot]
+            if data is not None:
+                data[price_field] = prices * rate
+                slots.append(slot)
+        return slots
 
 
 class OrderbookSpreadMonitor(SpreadMonitorBase):
+    stream = "order_book"
+    rank_keys = ("spread_pct", "buy_a_sell_b_spread_pct", "buy_b_sell_a_spread_pct")
+    store_cls = ColumnarOrderbookStore
+    empty_row = {
+        "pair_name": None,
+        "spread_pct": 0,
+        "buy_a_sell_b_spread_pct": 0,
+        "buy_b_sell_a_spread_pct": 0,
+        "bid_price_a": 0,
+        "bid_volume_a": 0,
+        "ask_price_a": 0,
+        "ask_volume_a": 0,
+        "bid_price_b": 0,
+        "bid_volume_b": 0,
+        "ask_price_b": 0,
+        "ask_volume_b": 0,
+        "elapsed_time_a": 0,
+        "elapsed_time_b": 0,
+    }
+    cost_row = {
+        "net_spread_pct": NAN,
+        "net_buy_a_sell_b_spread_pct": NAN,
+        "net_buy_b_sell_a_spread_pct": NAN,
+    }
+    cost_rank_keys = tuple(cost_row)
+    fields = side_fields(
+        "bid_price", "bid_volume", "ask_price", "ask_volume", "elapsed_time"
+    )
+
     support_depths = {
         "binance": [5],
         "bybit": [1, 50],
         "okx": [1, 50],
     }
+    depth_rank_keys = (
+        "exec_spread_pct",
+        "exec_buy_a_sell_b_spread_pct",
+        "exec_buy_b_sell_a_spread_pct",
+    )
+    depth_row = {
+        "vwap_bid_a": NAN,
+        "vwap_ask_a": NAN,
+        "vwap_bid_b": NAN,
+        "vwap_ask_b": NAN,
+        "exec_spread_pct": NAN,
+        "exec_buy_a_sell_b_spread_pct": NAN,
+        "exec_buy_b_sell_a_spread_pct": NAN,
+    }
+    depth_fields = side_fields("vwap_bid", "vwap_ask")
+
+    def __init__(
+        self,
+        *args,
+        depth_notional=None,
+        depth_quantity=None,
+        rank_keys=None,
+        **kwargs,
+    ):
+        """
+        :param depth_notional: 按该金额（计价币）吃单计算两个方向的可成交价差
+        :param depth_quantity: 按该数量（基础币）吃单计算可成交价差，与 depth_notional 二选一
+        """
+        self.depth = None
+        if depth_notional is not None or depth_quantity is not None:
+            self.depth = DepthWalker(depth_notional, depth_quantity)
+            self.empty_row = {**self.empty_row, **self.depth_row}
+            if rank_keys is None:
+                rank_keys = self.rank_keys + self.depth_rank_keys
+        super().__init__(*args, rank_keys=rank_keys, **kwargs)
+        if self.depth is not None and (self.backend != "dict" or self.feed_workers):
+            raise ValueError("Depth-aware spreads require the dict backend in-process")
+        if self.depth is not None and self.converter is not None:
+            raise ValueError("Depth-aware spreads do not support cross-quote pairs")
+        self.contract_sizes = {"a": {}, "b": {}}
 
-    async def monitor(self, exchange: ccxtpro.Exchange, index: str, symbols):
+    async def monitor(
+        self, exchange: ccxtpro.Exchange, index: str, symbols, batch=None
+    ):
         """
         统一监控方法
         :param exchange: 交易所实例
         :param index: 来源索引 ('a'或'b')
+        :param batch: 订阅批次，记录推送统计和中断状态
         """
-        exchange_name = exchange.name.lower()
-        limit = self.support_depths.get(exchange_name, [None])[0]
-        while self.running:
-            try:
-                order_book = await exchange.watch_order_book_for_symbols(
-                    symbols, limit=limit
-                )
-                await self.process_order_book(
-                    order_book, index, self.latencies[exchange_name].get("time_diff", 0)
-                )
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                print(f"Excpetion({index}): {traceback.format_exc()}")
-                await asyncio.sleep(5)
+        limit = self.depth_limit(exchange)
+        if batch is None:
+            batch = Batch(exchange.name.lower(), index, self.stream, symbols)
+
+        def handle(order_book):
+            now = time.time() * 1e3
+            self.on_order_book(index, order_book, now)
+            batch.observe(
+                (order_book["symbol"],),
+                self._lag(index, order_book["timestamp"], now),
+            )
+
+        await self._supervise(
+            exchange,
+            index,
+            batch,
+            lambda: exchange.watch_order_book_for_symbols(batch.symbols, limit=limit),
+            handle,
+        )
+
+    def _report_error(self, index, e):
+        print(f"Excpetion({index}): {traceback.format_exc()}")
+
+    def depth_limit(self, exchange):
+        return self.support_depths.get(exchange.name.lower(), [None])[0]
 
-    async def process_order_book(self, order_book, index, time_diff):
+    def on_order_book(self, index, order_book, now):
+        """
+        处理一次订单簿推送
+        :param now: 本地接收时间（毫秒）
+        """
+        if self.recorder is not None:
+            self.recorder.record_order_book(index, order_book, now)
+        self.process_order_book(
+            order_book,
+            index,
+            self.latencies[self.latency_keys[index]].get("time_diff", 0),
+            now,
+        )
+        self._batch_done()
+        self._observe_clock(index, order_book["timestamp"], now)
+        if self.metrics is not None:
+            self._observe_update(now)
+
+    def process_order_book(self, order_book, index, time_diff, now=None):
+        """
+        :param now: 本地接收时间（毫秒）
+        """
         symbol = order_book["symbol"]
-        if symbol not in self.symbol_map[index]:
+        slots = self.routes[index].get(symbol)
+        if slots is None:
             return
 
-        pair_map = self.symbol_map[index][symbol]
-        pair_names = pair_map["pair_names"]
-        for pair_name in pair_names:
-            if pair_name not in self.pair_data:
-                self.pair_data[pair_name] = {
-                    "pair_name": pair_name,
-                    "spread_pct": 0,
-                    "buy_a_sell_b_spread_pct": 0,
-                    "buy_b_sell_a_spread_pct": 0,
-                    "bid_price_a": 0,
-                    "bid_volume_a": 0,
-                    "ask_price_a": 0,
-                    "ask_volume_a": 0,
-                    "bid_price_b": 0,
-                    "bid_volume_b": 0,
-                    "ask_price_b": 0,
-                    "ask_volume_b": 0,
-                    "elapsed_time_a": 0,
-                    "elapsed_time_b": 0,
-                }
+        if now is None:
+            now = time.time() * 1e3
+        bids, asks = order_book["bids"], order_book["asks"]
+        self.last_seen[index][symbol] = now
+        down = self.down_symbols[index]
+        if down and symbol in down:
+            self._resume(index, symbol)
+        bid = bids[0] if len(bids) else None
+        ask = asks[0] if len(asks) else None
+        if self.converter is not None:
+            quote = self.converter.symbol_quotes[index].get(symbol)
+            if quote is not None:
+                rate = self.converter.rates[quote]
+                # 空的一侧保留上一次的原始价格，与行中保留的折算价格一致
+                raw_bid, raw_ask = self.raw_prices[index].get(symbol, (None, None))
+                self.raw_prices[index][symbol] = (
+                    raw_bid if bid is None else bid[0],
+                    raw_ask if ask is None else ask[0],
+                )
+                bid = None if bid is None else (bid[0] * rate, bid[1])
+                ask = None if ask is None else (ask[0] * rate, ask[1])
+        timestamp = order_book["timestamp"]
+        if timestamp is None:
+            # 交易所未给出时间戳时延迟未知
+            elapsed_time = NAN
+        else:
+            elapsed_time = now - (timestamp + time_diff)
+            if self.metrics is not None:
+                self.metrics.delay(self.latency_keys[index], symbol, elapsed_time)
+        if self.store is not None:
+            self.store.update(
+                index, symbol, bid, ask, order_book["timestamp"], elapsed_time
+            )
+            self._updated(slots)
+            return
+
+        (
+            bid_price_field,
+            bid_volume_field,
+            ask_price_field,
+            ask_volume_field,
+            elapsed_field,
+        ) = self.fields[index]
+        rows = self.pair_rows
+        for slot in slots:
+            data = rows[slot]
+            if data is None:
+                data = self._new_row(slot)
+            if bid is not None:
+                data[bid_price_field] = bid[0]
+                data[bid_volume_field] = bid[1]
+            if ask is not None:
+                data[ask_price_field] = ask[0]
+                data[ask_volume_field] = ask[1]
+            data[elapsed_field] = elapsed_time
+        if self.depth is not None:
+            self._update_vwap(index, symbol, bids, asks, slots)
+        self._updated(slots, now)
 
-            if len(order_book["bids"]):
-                self.pair_data[pair_name][f"bid_price_{index}"] = order_book["bids"][0][
-                    0
-                ]
-                self.pair_data[pair_name][f"bid_volume_{index}"] = order_book["bids"][
-                    0
-                ][1]
-
-            if len(order_book["asks"]):
-                self.pair_data[pair_name][f"ask_price_{index}"] = order_book["asks"][0][
-                    0
-                ]
-                self.pair_data[pair_name][f"ask_volume_{index}"] = order_book["asks"][
-                    0
-                ][1]
-
-            self.pair_data[pair_name][f"elapsed_time_{index}"] = time.time() * 1e3 - (
-                order_book["timestamp"] + time_diff
+    def _forget_symbol(self, index, symbol):
+        super()._forget_symbol(index, symbol)
+        self.contract_sizes[index].pop(symbol, None)
+        if self.depth is not None:
+            self.depth.discard((index, symbol, "bids"))
+            self.depth.discard((index, symbol, "asks"))
+
+    def _convert_prices(self, index, symbol, prices, rate):
+        bid_price_field, _, ask_price_field, _, _ = self.fields[index]
+        raw_bid, raw_ask = prices
+        rows = self.pair_rows
+        slots = []
+        for slot in self.routes[index].get(symbol, ()):
+            data = rows[slot]
+            if data is None:
+                continue
+            if raw_bid is not None:
+                data[bid_price_field] = raw_bid * rate
+            if raw_ask is not None:
+                data[ask_price_field] = raw_ask * rate
+            slots.append(slot)
+        return slots
+
+    def _contract_size(self, index, symbol):
+        """(合约面值, 是否反向合约)"""
+        size = self.contract_sizes[index].get(symbol)
+        if size is None:
+            exchange = self.exchange_a if index == "a" else self.exchange_b
+            market = exchange.markets.get(symbol, {}) if exchange.markets else {}
+            size = self.contract_sizes[index][symbol] = (
+                market.get("contractSize") or 1,
+                bool(market.get("inverse")),
             )
-            await self.calculate_spread(pair_name)
+        return size
 
-    async def calculate_spread(self, pair_name):
-        data = self.pair_data[pair_name]
+    def _update_vwap(self, index, symbol, bids, asks, slots):
+        contract_size, inverse = self._contract_size(index, symbol)
+        vwap_bid = self.depth.vwap(
+            (index, symbol, "bids"), bids, contract_size, inverse
+        )
+        vwap_ask = self.depth.vwap(
+            (index, symbol, "asks"), asks, contract_size, inverse
+        )
+        bid_field, ask_field = self.depth_fields[index]
+        rows = self.pair_rows
+        for slot in slots:
+            data = rows[slot]
+            data[bid_field] = NAN if vwap_bid is None else vwap_bid
+            data[ask_field] = NAN if vwap_ask is None else vwap_ask
+
+    def calculate_spread(self, slot, now=None):
+        data = self.pair_rows[slot]
         try:
-            if (
+            ready = (
                 data["ask_price_a"]
                 and data["bid_price_a"]
                 and data["ask_price_b"]
                 and data["bid_price_b"]
-            ):
+            )
+            if ready:
                 data["buy_b_sell_a_spread"] = data["bid_price_a"] - data["ask_price_b"]
                 data["buy_b_sell_a_spread_pct"] = (
                     data["buy_b_sell_a_spread"] / data["ask_price_b"]
@@ -340,8 +1474,39 @@ class OrderbookSpreadMonitor(SpreadMonitorBase):
                 data["spread_pct"] = max(
                     data["buy_b_sell_a_spread_pct"], data["buy_a_sell_b_spread_pct"]
                 )
+                if self.costs is not None:
+                    fee = self.costs.fees[slot]
+                    funding = self.costs.funding_diff[slot]
+                    data["net_buy_a_sell_b_spread_pct"] = (
+                        data["buy_a_sell_b_spread_pct"] - fee - funding
+                    )
+                    data["net_buy_b_sell_a_spread_pct"] = (
+                        data["buy_b_sell_a_spread_pct"] - fee + funding
+                    )
+                    data["net_spread_pct"] = max(
+                        data["net_buy_a_sell_b_spread_pct"],
+                        data["net_buy_b_sell_a_spread_pct"],
+                    )
+            if self.depth is not None:
+                # 深度不足时均价为 NaN，可成交价差同为 NaN，排序时排在最后
+                data["exec_buy_b_sell_a_spread_pct"] = (
+                    data["vwap_bid_a"] - data["vwap_ask_b"]
+                ) / data["vwap_ask_b"]
+                data["exec_buy_a_sell_b_spread_pct"] = (
+                    data["vwap_bid_b"] - data["vwap_ask_a"]
+                ) / data["vwap_ask_a"]
+                buy_b_sell_a = data["exec_buy_b_sell_a_spread_pct"]
+                buy_a_sell_b = data["exec_buy_a_sell_b_spread_pct"]
+                data["exec_spread_pct"] = (
+                    buy_a_sell_b
+                    if buy_b_sell_a != buy_b_sell_a or buy_a_sell_b > buy_b_sell_a
+                    else buy_b_sell_a
+                )
+            if ready:
+                self._spread_updated(slot, data, now)
         except (TypeError, ZeroDivisionError) as e:
-            print(f"Calculate spread error for {pair_name}: {str(e)}")
+            print(f"Calculate spread error for {data['pair_name']}: {str(e)}")
+        self._update_rankings(data["pair_name"], data)
 
 
 async def run_monitor(market_a, market_b, symbols=None):
@@ -0,0 +1,82 @@
+import time
+import random
+import asyncio
+
+
+class Backoff:
+    """
+    带抖动的指数退避：第 n 次连续失败后等待 [delay/2, delay] 内的随机时间，
+    delay = base * factor^n，上限 cap，避免同时断开的批次同时重连
+    """
+
+    def __init__(self, base=1.0, cap=60.0, factor=2.0, rng=None):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.random = rng or random.Random()
+        self.attempts = 0
+
+    def next(self):
+        delay = min(self.cap, self.base * self.factor**self.attempts)
+        self.attempts += 1
+        return delay * self.random.uniform(0.5, 1)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class Supervisor:
+    """
+    订阅批次的监督：watch_* 出错时按带抖动的指数退避重试，超过 watchdog 秒没有推送时
+    视为静默中断，取消该批次的订阅（交易所支持 un_watch_* 时）并立即重新订阅，
+    不影响同一连接上的其他批次。处理推送出错与订阅出错相同，计入错误并退避重试。
+    中断和恢复记入 Batch，并回调监控标记受影响的交易对
+    :param watchdog: 批次无推送的最长时间（秒），None 为不检测
+    :param backoff_base: 首次重试的最长等待（秒）
+    :param backoff_cap: 重试等待上限（秒）
+    """
+
+    def __init__(self, watchdog=60.0, backoff_base=1.0, backoff_cap=60.0):
+        self.watchdog = watchdog or None
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    async def run(
+        self, batch, watch, handle, active, on_error, on_down, on_up, unwatch
+    ):
+        """
+        :param watch: 无参协程函数，返回一次推送
+        :param handle: 处理一次推送，抛出的异常按订阅出错处理
+        :param active: 返回是否继续订阅
+        :param on_error: 记录异常，参数为异常实例
+        :param on_down: 批次中断时调用，参数为 stall（静默超时）或 error
+        :param on_up: 批次恢复时调用，参数为中断时长（秒）
+        :param unwatch: 无参协程函数，取消该批次的订阅，None 为不支持
+        """
+        backoff = Backoff(self.backoff_base, self.backoff_cap)
+        while active():
+            try:
+                message = await asyncio.wait_for(watch(), self.watchdog)
+                if batch.down_since is not None:
+                    backoff.reset()
+                    on_up(batch.mark_up(time.time()))
+                handle(message)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                batch.stalls += 1
+                if batch.mark_down():
+                    on_down("stall")
+                if unwatch is not None:
+                    try:
+                        await unwatch()
+                    except Exception as e:
+                        on_error(e)
+                batch.reconnects += 1
+            except Exception as e:
+                batch.errors += 1
+                on_error(e)
+                if batch.mark_down():
+                    on_down("error")
+                await asyncio.sleep(backoff.next())
+                batch.reconnects += 1